@@ -0,0 +1,255 @@
+# Built-in AI opponent
+# 3x3: perfect play answered from a table of every reachable position, solved once at first use.
+#      Positions that are rotations or mirror images of each other share one entry (627 positions to solve instead of 4520).
+# Larger boards (e.g. 15x15 five in a row): iterative-deepening alpha-beta search within a time budget,
+#      with a bounded transposition table that forgets the least recently used entries.
+import time
+from collections import OrderedDict
+from threading import Thread
+from game import win_masks
+import protocol
+from protocol import FrameReader, FrameWriter
+
+MOVE_TIME = 1.0                         # Default seconds the search may spend on one move
+TABLE_SIZE = 200000                     # Transposition table entries kept per search AI
+WIN_SCORE = 1000000                     # Score of a won position in the search
+
+# The 8 symmetries of the 3x3 board as cell permutations: SYMMETRIES[s][i] is where cell i goes
+_ROTATE = [6, 3, 0, 7, 4, 1, 8, 5, 2]
+_MIRROR = [2, 1, 0, 5, 4, 3, 8, 7, 6]
+
+
+def _compose(first, then):
+    return [then[first[i]] for i in range(9)]
+
+
+SYMMETRIES = [list(range(9))]
+for _ in range(3):
+    SYMMETRIES.append(_compose(SYMMETRIES[-1], _ROTATE))
+SYMMETRIES += [_compose(perm, _MIRROR) for perm in SYMMETRIES[:4]]
+
+# TRANSFORM[s][bits] is the bitmask bits moved by symmetry s; INVERSE[s][cell] undoes s for one cell
+TRANSFORM = []
+for _perm in SYMMETRIES:
+    TRANSFORM.append([sum(1 << _perm[i] for i in range(9) if bits >> i & 1) for bits in range(512)])
+INVERSE = [[perm.index(cell) for cell in range(9)] for perm in SYMMETRIES]
+
+_book = None                            # Canonical (x, o) -> (score, best cell in the canonical frame)
+
+
+# Smallest equivalent of a position and the symmetry that produces it
+def canonical(x, o):
+    best, best_s = None, 0
+    for s, table in enumerate(TRANSFORM):
+        key = (table[x], table[o])
+        if best is None or key < best:
+            best, best_s = key, s
+    return best, best_s
+
+
+# Solve every position reachable from the empty board (runs once, takes a fraction of a second)
+def _build_book():
+    win_table = win_masks(3, 3)[2]
+    book = {}
+
+    # Score for the player to move: 1 + empty cells left for a win (faster is better), 0 draw, negative loss
+    def solve(x, o):
+        key = (x, o)
+        if key in book:
+            return book[key][0]
+        x_to_move = bin(x).count("1") == bin(o).count("1")
+        mine, theirs = (x, o) if x_to_move else (o, x)
+        occupied = x | o
+        best_score, best_cell = None, None
+        for cell in range(9):
+            if occupied >> cell & 1:
+                continue
+            after = mine | (1 << cell)
+            empties = 8 - bin(occupied).count("1")
+            if win_table[after]:
+                score = 1 + empties
+            elif empties == 0:
+                score = 0
+            else:
+                child = (after, theirs) if x_to_move else (theirs, after)
+                score = -solve(*canonical(*child)[0])
+            if best_score is None or score > best_score:
+                best_score, best_cell = score, cell
+        book[key] = (best_score, best_cell)
+        return best_score
+
+    solve(0, 0)
+    return book
+
+
+# Best move on a 3x3 board, looked up in the table
+def perfect_move(game):
+    global _book
+    if _book is None:
+        _book = _build_book()
+    key, s = canonical(game.bits["X"], game.bits["O"])
+    return INVERSE[s][_book[key][1]]
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+# Alpha-beta search for boards too big to solve in advance
+class SearchAI:
+    # Points for a line holding n of one player's stones and none of the other's
+    WEIGHTS = [0, 1, 8, 64, 512, 4096, 32768]
+
+    def __init__(self, size, k, table_size=TABLE_SIZE):
+        self.size = size
+        self.k = k
+        self.lines, self.lines_by_cell, _ = win_masks(size, k)
+        self.weights = [self.WEIGHTS[min(n, len(self.WEIGHTS) - 1)] for n in range(k + 1)]
+        self.table = OrderedDict()      # (mine, theirs) -> (depth, score, flag, best cell), in LRU order
+        self.table_size = table_size
+        self.neighbours = [self._neighbour_mask(i) for i in range(size * size)]
+        self.nodes = 0
+
+    def _neighbour_mask(self, i):
+        row, col = divmod(i, self.size)
+        mask = 0
+        for r in range(max(0, row - 1), min(self.size, row + 2)):
+            for c in range(max(0, col - 1), min(self.size, col + 2)):
+                mask |= 1 << (r * self.size + c)
+        return mask
+
+    # Pick a move for the player to move in game within budget seconds
+    def choose(self, game, budget=MOVE_TIME):
+        mine, theirs = game.bits[game.current], game.bits["O" if game.current == "X" else "X"]
+        moves = self._moves(mine | theirs)
+        best = moves[0]
+        self.deadline = time.monotonic() + budget
+        self.nodes = 0
+        depth = 1
+        empties = game.cells - len(game.moves)
+        try:
+            while depth <= empties:
+                score, cell = self._negamax(mine, theirs, depth, -WIN_SCORE * 2, WIN_SCORE * 2)
+                if cell is not None:
+                    best = cell
+                if abs(score) >= WIN_SCORE // 2:    # Forced result found, searching deeper changes nothing
+                    break
+                depth += 1
+        except _OutOfTime:
+            pass
+        return best
+
+    # Empty cells next to a stone (the centre on an empty board), best remembered move first
+    def _moves(self, occupied, first=None):
+        if not occupied:
+            return [(self.size // 2) * self.size + self.size // 2]
+        cells = [i for i in range(self.size * self.size)
+                 if not occupied >> i & 1 and occupied & self.neighbours[i]]
+        if first in cells:
+            cells.remove(first)
+            cells.insert(0, first)
+        return cells
+
+    # Static evaluation from the point of view of the player to move
+    def _evaluate(self, mine, theirs):
+        weights = self.weights
+        score = 0
+        for mask in self.lines:
+            a = mine & mask
+            b = theirs & mask
+            if a and not b:
+                score += weights[a.bit_count()]
+            elif b and not a:
+                score -= weights[b.bit_count()]
+        return score
+
+    def _negamax(self, mine, theirs, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.monotonic() > self.deadline:
+            raise _OutOfTime
+        key = (mine, theirs)
+        entry = self.table.get(key)
+        first = None
+        if entry is not None:
+            self.table.move_to_end(key)
+            entry_depth, entry_score, flag, first = entry
+            if entry_depth >= depth:
+                if flag == 0 or (flag < 0 and entry_score <= alpha) or (flag > 0 and entry_score >= beta):
+                    return entry_score, first
+        if depth == 0:
+            return self._evaluate(mine, theirs), None
+        occupied = mine | theirs
+        moves = self._moves(occupied, first)
+        if not moves:
+            return 0, None              # Board full: draw
+        original_alpha = alpha
+        best_score, best_cell = -WIN_SCORE * 2, None
+        for cell in moves:
+            after = mine | (1 << cell)
+            if any(after & mask == mask for mask in self.lines_by_cell[cell]):
+                score = WIN_SCORE + depth       # Prefer the quickest win
+            else:
+                score = -self._negamax(theirs, after, depth - 1, -beta, -alpha)[0]
+            if score > best_score:
+                best_score, best_cell = score, cell
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        flag = 0 if original_alpha < best_score < beta else (-1 if best_score <= original_alpha else 1)
+        self.table[key] = (depth, best_score, flag, best_cell)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)      # Forget the least recently used position
+        return best_score, best_cell
+
+
+# One AI player: perfect table for 3x3, search otherwise
+class AIPlayer:
+    def __init__(self, size=3, k=3, move_time=MOVE_TIME):
+        self.move_time = move_time
+        self.search = None if (size, k) == (3, 3) else SearchAI(size, k)
+
+    def choose(self, game):
+        if self.search is None:
+            return perfect_move(game)
+        return self.search.choose(game, self.move_time)
+
+
+# Built-in opponent for the Tk peers: talks the normal protocol over one end of a socket pair,
+# so server.py / client.py play against it exactly as against a remote player
+class BotPeer:
+    def __init__(self, sock, symbol, name="Bot", move_time=MOVE_TIME):
+        from game import TicTacToeGame
+        self.reader = FrameReader(sock)
+        self.writer = FrameWriter(sock)
+        self.symbol = symbol            # "X" moves first after every reset, "O" answers
+        self.name = name
+        self.game = TicTacToeGame()
+        self.ai = AIPlayer(move_time=move_time)
+
+    def start(self):
+        Thread(target=self.run, name="bot-peer", daemon=True).start()
+        return self
+
+    def run(self):
+        self.writer.send(protocol.NAME, self.name)
+        if self.symbol == "X":
+            self.move()
+        while True:
+            try:
+                msg_type, value = self.reader.recv()
+            except (ConnectionError, OSError):
+                return
+            if msg_type == protocol.MOVE:
+                if self.game.is_valid_move(value, self.game.current):
+                    self.game.play(value, self.game.current)
+                    if not self.game.over:
+                        self.move()
+            elif msg_type == protocol.RESET:
+                self.game.reset()
+                if self.symbol == "X":
+                    self.move()
+
+    def move(self):
+        i = self.ai.choose(self.game)
+        self.game.play(i, self.symbol)
+        self.writer.send(protocol.MOVE, i)
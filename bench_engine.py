@@ -0,0 +1,80 @@
+# Microbenchmark: move + win check operations per second of the game engine
+# Plays pre-generated random games on 3x3 and 15x15 (five in a row) and compares 3x3
+# with the old list-of-strings check_winner that scanned every winning line after each move.
+#   python3 bench_engine.py --games 200000
+import argparse
+import random
+import time
+from game import TicTacToeGame, CONTINUE
+
+# The old 3x3 logic from server.py / client.py
+WINS = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)]
+
+
+def legacy_check_winner(board, symbol):
+    for a, b, c in WINS:
+        if board[a] == board[b] == board[c] == symbol:
+            return True
+    return False
+
+
+# Random move orders, generated up front so only the engine is timed
+def random_games(count, cells, seed):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        order = list(range(cells))
+        rng.shuffle(order)
+        games.append(order)
+    return games
+
+
+def bench_engine(games, size, k):
+    game = TicTacToeGame(size, k)
+    moves = 0
+    start = time.perf_counter()
+    for order in games:
+        game.reset()
+        symbol = "X"
+        for i in order:
+            moves += 1
+            if game.play(i, symbol) != CONTINUE:
+                break
+            symbol = "O" if symbol == "X" else "X"
+    return moves, time.perf_counter() - start
+
+
+def bench_legacy(games):
+    moves = 0
+    start = time.perf_counter()
+    for order in games:
+        board = [""] * 9
+        symbol = "X"
+        for i in order:
+            moves += 1
+            board[i] = symbol
+            if legacy_check_winner(board, symbol) or "" not in board:
+                break
+            symbol = "O" if symbol == "X" else "X"
+    return moves, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Game engine move + check throughput")
+    parser.add_argument("--games", type=int, default=200000, help="3x3 games to play")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    small = random_games(args.games, 9, args.seed)
+    large = random_games(max(args.games // 100, 1), 225, args.seed)
+    results = [
+        ("3x3 legacy list scan", bench_legacy(small)),
+        ("3x3 bitboard", bench_engine(small, 3, 3)),
+        ("15x15 five in a row", bench_engine(large, 15, 5)),
+    ]
+    for label, (moves, elapsed) in results:
+        print(f"{label:>22}: {moves} moves, {moves / elapsed:,.0f} move+check/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark: messages per second of the old text protocol vs. the framed protocol
+# Both run over a local socket pair with a sender thread and a receiving loop, like the peers do.
+#   python3 bench_protocol.py --messages 200000 --batch 16
+import argparse
+import socket
+import time
+from threading import Thread
+import protocol
+from protocol import FrameDecoder, FrameWriter
+
+
+# The traffic we send: mostly moves with some chat in between
+def workload(count):
+    for n in range(count):
+        if n % 4 == 3:
+            yield protocol.CHAT, f"message number {n}"
+        else:
+            yield protocol.MOVE, n % 9
+
+
+# Old protocol: one sendall per command, one recv(1024) treated as one command
+def run_text(count):
+    a, b = socket.socketpair()
+
+    def sender():
+        for msg_type, value in workload(count):
+            if msg_type == protocol.MOVE:
+                a.sendall(f"MOVE {value}".encode())
+            else:
+                a.sendall(f"CHAT {value}".encode())
+        a.close()
+
+    parsed = 0
+    start = time.perf_counter()
+    Thread(target=sender, daemon=True).start()
+    while True:
+        data = b.recv(1024).decode()
+        if not data:
+            break
+        if data.startswith("MOVE"):     # Same dispatch as receive_data: merged commands are lost
+            try:
+                int(data.split()[1])
+            except ValueError:          # e.g. "MOVE 3MOVE 4" arrived in one read
+                continue
+            parsed += 1
+        elif data.startswith("CHAT"):
+            parsed += 1
+    elapsed = time.perf_counter() - start
+    b.close()
+    return parsed, elapsed
+
+
+# New protocol: frames batched by FrameWriter, split again by FrameDecoder
+def run_framed(count, batch):
+    a, b = socket.socketpair()
+    writer = FrameWriter(a)
+
+    def sender():
+        messages = list(workload(count))
+        for pos in range(0, count, batch):
+            with writer.batch():
+                for msg_type, value in messages[pos:pos + batch]:
+                    writer.send(msg_type, value)
+        a.close()
+
+    decoder = FrameDecoder()
+    parsed = 0
+    start = time.perf_counter()
+    Thread(target=sender, daemon=True).start()
+    while True:
+        data = b.recv(65536)
+        if not data:
+            break
+        parsed += len(decoder.feed(data))
+    elapsed = time.perf_counter() - start
+    b.close()
+    return parsed, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Text vs. framed protocol throughput")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=16, help="messages per sendall for the framed protocol")
+    args = parser.parse_args(argv)
+
+    for label, (parsed, elapsed) in (("text", run_text(args.messages)),
+                                     ("framed", run_framed(args.messages, args.batch))):
+        print(f"{label:>7}: sent {args.messages}, understood {parsed} "
+              f"({args.messages - parsed} lost), {parsed / elapsed:,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
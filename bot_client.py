@@ -0,0 +1,334 @@
+# Headless simulated player for the match server (no Tk window, no name dialog)
+# A bot connects, sends its name, and plays random or scripted moves as soon as it is its turn.
+# It can chat every few moves and, after a game ends, the X player starts the next one with RESET.
+# With --watch it spectates a match instead and prints the board after every move.
+# With --drop-every n it cuts its own connection after every n-th move (that move is lost too)
+# and resumes the session, to exercise reconnecting.
+#   python3 bot_client.py --name bot1 --games 5
+#   python3 bot_client.py --watch 3
+import argparse
+import asyncio
+import json
+import random
+import time
+from game import TicTacToeGame
+import protocol
+import ai
+from protocol import FrameDecoder
+from session import resume_payload, parse_resync, RUNNING
+
+HOST = '127.0.0.1'
+PORT = 5000
+
+
+# Pick a random empty cell
+def random_strategy(rng):
+    def choose(game):
+        return rng.choice([i for i in range(game.cells) if not game.occupied >> i & 1])
+    return choose
+
+
+# Play the cells of a fixed list in order, skipping taken ones; random once the list is used up
+def scripted_strategy(cells, rng):
+    fallback = random_strategy(rng)
+
+    def choose(game):
+        for i in cells:
+            if not game.occupied >> i & 1:
+                return i
+        return fallback(game)
+    return choose
+
+
+# Perfect play from the built-in AI (see ai.py)
+def ai_strategy():
+    return ai.AIPlayer().choose
+
+
+# Records when each move and chat was sent so the receiving bot can compute one-way latency.
+# Shared by all bots of one process (they read the same clock).
+class LatencyTracker:
+    def __init__(self):
+        self.sent = {}                  # (sender name, key) -> time.perf_counter() at send
+        self.samples = {"move": [], "chat": [], "wait": []}     # Latencies and lobby waits in seconds
+        self.counts = {"move": 0, "chat": 0, "game": 0}
+
+    def on_send(self, kind, sender, key):
+        self.sent[(sender, key)] = time.perf_counter()
+        self.counts[kind] += 1
+
+    def on_receive(self, kind, sender, key):
+        sent = self.sent.pop((sender, key), None)
+        if sent is not None:
+            self.samples[kind].append(time.perf_counter() - sent)
+
+
+# One simulated player
+class BotClient:
+    def __init__(self, name, host=HOST, port=PORT, strategy=None, games=1, chat_every=0, tracker=None, rating=None,
+                 drop_every=0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.strategy = strategy or random_strategy(random.Random())
+        self.games = games              # Games to play before disconnecting
+        self.chat_every = chat_every    # Send a chat after every n-th own move (0 = never)
+        self.tracker = tracker
+        self.rating = rating            # Sent to the lobby before the name, None = unrated
+        self.joined_at = None           # When we asked the lobby for an opponent
+        self.game = TicTacToeGame()
+        self.symbol = None
+        self.opponent = None
+        self.played = 0                 # Games finished so far
+        self.moves_sent = 0
+        self.chats_sent = 0
+        self.reader = None
+        self.writer = None
+        self.token = None               # Session token for resuming after a dropped connection
+        self.game_no = 0                # Number of the current game in the match (counted like the server)
+        self.drop_every = drop_every    # Cut the connection after every n-th own move (0 = never)
+        self.dropped = False            # Connection cut on purpose; sends are lost until we resume
+        self.resumes = 0
+
+    # Connect, play the requested number of games and disconnect
+    async def run(self):
+        await self.connect()
+        await self.play()
+
+    # Open the connection and introduce ourselves
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        if self.rating is not None:
+            self.send(protocol.RATING, str(self.rating))
+        self.send(protocol.NAME, self.name)
+        self.joined_at = time.perf_counter()
+
+    # Play until the requested number of games is done
+    async def play(self):
+        decoder = FrameDecoder()
+        try:
+            while self.played < self.games:
+                data = await self.reader.read(65536)
+                if not data:
+                    if self.token and await self.reconnect():   # Dropped by the network: take our seat back
+                        decoder = FrameDecoder()
+                        continue
+                    break
+                for msg_type, value in decoder.feed(data):
+                    if not self.handle(msg_type, value):
+                        return
+                if self.dropped:
+                    if not await self.reconnect():
+                        return
+                    decoder = FrameDecoder()
+                    continue
+                await self.writer.drain()
+        finally:
+            if self.played >= self.games:
+                self.send(protocol.LEFT)        # Done: tell the server not to hold our seat
+            self.writer.close()
+
+    # Open a new connection and RESUME the session; False if that fails
+    async def reconnect(self):
+        self.writer.transport.abort()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            return False
+        self.dropped = False
+        self.resumes += 1
+        self.send(protocol.RESUME, resume_payload(self.token, self.game_no, len(self.game.moves)))
+        return True
+
+    def send(self, msg_type, value=None):
+        if not self.dropped:
+            self.writer.write(protocol.encode(msg_type, value))
+
+    # React to one message; returns False when the bot should stop
+    def handle(self, msg_type, value):
+        if msg_type == protocol.NAME:
+            self.opponent = value
+        elif msg_type == protocol.START:
+            self.symbol = value
+            if self.tracker and self.joined_at is not None:
+                self.tracker.samples["wait"].append(time.perf_counter() - self.joined_at)
+                self.joined_at = None
+            self.game.reset()
+            self.game_no = 1
+            if self.symbol == "X":
+                self.move()
+        elif msg_type == protocol.TOKEN:
+            self.token = value
+        elif msg_type == protocol.RESYNC:
+            return self.resync(value)
+        elif msg_type == protocol.MOVE:
+            ply = len(self.game.moves)
+            self.game.play(value, self.game.current)
+            if self.tracker:
+                self.tracker.on_receive("move", self.opponent, (self.played, ply))
+            if not self.game.over:
+                self.move()
+        elif msg_type == protocol.CHAT:
+            if self.tracker:
+                for line in value.split("\n"):     # Flood control sends chats that came too fast together
+                    self.tracker.on_receive("chat", self.opponent, line)
+        elif msg_type == protocol.RESET:
+            self.game.reset()
+            self.game_no += 1
+        elif msg_type in (protocol.WINNER, protocol.DRAW, protocol.TIMEOUT):
+            return self.game_over()
+        elif msg_type in (protocol.INVALID, protocol.LEFT, protocol.EXPIRED):
+            return False
+        return True
+
+    # Make our move and maybe chat
+    def move(self):
+        i = self.strategy(self.game)
+        ply = len(self.game.moves)
+        self.game.play(i, self.symbol)
+        if self.tracker:
+            self.tracker.on_send("move", self.name, (self.played, ply))
+        if self.drop_every and (self.moves_sent + 1) % self.drop_every == 0:
+            self.dropped = True         # This move never reaches the server
+        self.send(protocol.MOVE, i)
+        self.moves_sent += 1
+        if self.chat_every and self.moves_sent % self.chat_every == 0:
+            text = f"{self.name} {self.chats_sent}"     # Unique per sender, used as the latency key
+            self.chats_sent += 1
+            if self.tracker:
+                self.tracker.on_send("chat", self.name, text)
+            self.send(protocol.CHAT, text)
+
+    # A game ended: count it and let X start the next one
+    def game_over(self):
+        self.played += 1
+        if self.tracker and self.symbol == "X":     # Count every game once
+            self.tracker.counts["game"] += 1
+        if self.played >= self.games:
+            return False
+        if self.symbol == "X":
+            self.send(protocol.RESET)
+            self.game.reset()
+            self.game_no += 1
+            self.move()
+        return True
+
+    # Catch up after a reconnect; the server told us its game number, move count and result
+    def resync(self, value):
+        game, have, result, cells = parse_resync(value)
+        if game < self.game_no:         # Our RESET was lost: repeat it and our moves since
+            self.send(protocol.RESET)
+            for i in self.game.moves:
+                self.send(protocol.MOVE, i)
+            return True
+        if game > self.game_no:         # The opponent started a new game while we were away
+            self.game.reset()
+            self.game_no = game
+        for i in cells:                 # Moves we missed
+            self.game.play(i, self.game.current)
+        if result != RUNNING:           # The game ended while we were away (its result message was lost)
+            return self.game_over()
+        lost = self.game.moves[have:]   # Our moves the server never got
+        for i in lost:
+            self.send(protocol.MOVE, i)
+        if not lost and not self.game.over and self.game.current == self.symbol:
+            self.move()
+        return True
+
+
+# Spectator: follows one match from its SNAPSHOT and the live updates after it
+class Watcher:
+    def __init__(self, host=HOST, port=PORT, match_id="", on_update=None):
+        self.host = host
+        self.port = port
+        self.match_id = match_id        # "" watches the newest match
+        self.on_update = on_update      # Called with (watcher, msg_type, value) after every message
+        self.game = None
+        self.names = {}
+        self.frames = 0                 # Messages received
+        self.snapshots = 0              # 1 + the times the server skipped us ahead
+
+    async def run(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(protocol.encode(protocol.WATCH, str(self.match_id)))
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for msg_type, value in decoder.feed(data):
+                    self.frames += 1
+                    if not self.handle(msg_type, value):
+                        return
+        finally:
+            writer.close()
+
+    # Keep our copy of the board in step; returns False when the match is over for good
+    def handle(self, msg_type, value):
+        if msg_type == protocol.SNAPSHOT:
+            state = json.loads(value)
+            self.snapshots += 1
+            self.names = {"X": state["x"], "O": state["o"]}
+            self.game = TicTacToeGame(state["size"], state["k"])
+            for i in state["moves"]:    # Replay instead of shipping the board
+                self.game.play(i, self.game.current)
+        elif msg_type == protocol.MOVE:
+            self.game.play(value, self.game.current)
+        elif msg_type == protocol.RESET:
+            self.game.reset()
+        if self.on_update:
+            self.on_update(self, msg_type, value)
+        return msg_type not in (protocol.LEFT, protocol.INVALID)
+
+
+# Print the board after each move of a watched match
+def print_update(watcher, msg_type, value):
+    if msg_type in (protocol.SNAPSHOT, protocol.MOVE):
+        board = watcher.game.board
+        print("\n".join(" ".join(c or "." for c in board[r:r + watcher.game.size])
+                        for r in range(0, len(board), watcher.game.size)) + "\n")
+    elif msg_type == protocol.CHAT:
+        print(value)
+    elif msg_type == protocol.WINNER:
+        print(f"{value} wins")
+    elif msg_type == protocol.DRAW:
+        print("Draw")
+    elif msg_type == protocol.TIMEOUT:
+        print(f"{value} ran out of time")
+    elif msg_type == protocol.INVALID:
+        print("No such match")
+    elif msg_type == protocol.LEFT:
+        print("A player left, the match is over")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Tic Tac Toe bot")
+    parser.add_argument("--name", default="bot")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--rating", type=float, help="rating the lobby matches us on")
+    parser.add_argument("--drop-every", type=int, default=0, help="cut the connection after every n-th move and resume")
+    parser.add_argument("--script", help="comma separated cells to play in order, e.g. 4,0,8")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ai", action="store_true", help="play perfectly with the built-in AI")
+    parser.add_argument("--watch", nargs="?", const="", metavar="MATCH", help="spectate a match (default: the newest)")
+    args = parser.parse_args(argv)
+    if args.watch is not None:
+        asyncio.run(Watcher(args.host, args.port, args.watch, print_update).run())
+        return
+    rng = random.Random(args.seed)
+    strategy = random_strategy(rng)
+    if args.script:
+        strategy = scripted_strategy([int(c) for c in args.script.split(",")], rng)
+    elif args.ai:
+        strategy = ai_strategy()
+    bot = BotClient(args.name, args.host, args.port, strategy, args.games, rating=args.rating,
+                    drop_every=args.drop_every)
+    asyncio.run(bot.run())
+    print(f"{args.name}: played {bot.played} games as {bot.symbol} against {bot.opponent}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Bounded chat view for the Tk peers
+# The chat widget holds at most MAX_LINES lines, a ring buffer of the newest ones: the oldest lines leave
+# the widget as new ones arrive, so a long or flooded chat costs the same memory and redraw time as a
+# short one. Every chat line is in the event log on disk already, so the lines that left are not kept
+# anywhere in memory. "Older" reads them back from the log, PAGE_LINES at a time, and they leave again
+# once new lines push them out. Lines arriving in the same UI tick are inserted with one widget update.
+# Only the widget's own methods are used, so this module does not need tkinter itself.
+import json
+import os
+from collections import deque
+
+MAX_LINES = 200                         # Lines kept in the chat widget
+PAGE_LINES = 50                         # Older lines read back from the event log per click on "Older"
+
+
+class ChatView:
+    def __init__(self, text, ui, log_path, me, older_button=None, max_lines=MAX_LINES, page_lines=PAGE_LINES):
+        self.text = text                # The tk.Text widget
+        self.ui = ui                    # UIPump of the window
+        self.log_path = log_path        # Event log that records every chat line
+        self.me = me                    # Our name: our own lines read back show as "You"
+        self.older_button = older_button
+        self.max_lines = max_lines
+        self.page_lines = page_lines
+        self.pending = deque(maxlen=max_lines)  # (line, logged) waiting for the next tick; a flood keeps the newest
+        self.shown = deque()            # (widget lines, logged) of every entry in the widget, oldest first
+        self.shown_lines = 0
+        self.game_id = None             # The chat of this game is in the log under this id
+        self.offset = 0                 # Size of the log when the game started; its chat comes after this
+        self.inode = None               # Which file that offset belongs to (the log may be rotated since)
+        self.hidden = 0                 # Logged lines of this game older than the widget's first line
+
+    # Empty the view for a new game
+    def clear(self, game_id):
+        self.pending.clear()
+        self.shown.clear()
+        self.shown_lines = 0
+        self.game_id = game_id
+        try:
+            stat = os.stat(self.log_path)
+            self.offset, self.inode = stat.st_size, stat.st_ino
+        except OSError:                 # No log yet: it starts with this game
+            self.offset, self.inode = 0, None
+        self.hidden = 0
+        self.text.config(state='normal')
+        self.text.delete("1.0", "end")
+        self.text.config(state='disabled')
+        self.update_button()
+
+    # Show a line on the next UI tick (logged: it is a chat line the event log has, so it can be read back)
+    def add(self, line, logged=True):
+        if len(self.pending) == self.pending.maxlen and self.pending[0][1]:
+            self.hidden += 1            # Pushed out before it was ever shown
+        self.pending.append((line, logged))
+        self.ui.post_latest("chat", self.flush)
+
+    # Insert all pending lines with one widget update, then drop the oldest beyond max_lines
+    def flush(self):
+        if not self.pending:
+            return
+        entries = list(self.pending)
+        self.pending.clear()
+        self.text.config(state='normal')
+        self.text.insert("end", "".join(line + "\n" for line, _ in entries))
+        for line, logged in entries:
+            lines = line.count("\n") + 1          # A coalesced chat message spans several lines
+            self.shown.append((lines, logged))
+            self.shown_lines += lines
+        removed = 0
+        while self.shown_lines > self.max_lines and len(self.shown) > 1:
+            lines, logged = self.shown.popleft()
+            self.shown_lines -= lines
+            removed += lines
+            self.hidden += logged
+        if removed:
+            self.text.delete("1.0", f"{removed + 1}.0")
+        self.text.config(state='disabled')
+        self.update_button()
+
+    # Put the page of chat lines before the first one shown back at the top, from the event log
+    def older(self):
+        count = min(self.page_lines, self.hidden)
+        if not count:
+            return
+        lines = [self.render(record) for record in self.read_chat(self.hidden - count, self.hidden)]
+        self.hidden -= count
+        self.text.config(state='normal')
+        self.text.insert("1.0", "".join(line + "\n" for line in lines))
+        self.text.config(state='disabled')
+        for line in reversed(lines):
+            self.shown.appendleft((line.count("\n") + 1, True))
+            self.shown_lines += line.count("\n") + 1
+        self.update_button()
+
+    # Chat records start..stop-1 of the current game, counted from its first, read from the log
+    def read_chat(self, start, stop):
+        records = []
+        index = 0
+        for path, offset in self.log_files():
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if self.game_id not in line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if record.get("game") != self.game_id or record.get("event") != "chat":
+                            continue
+                        if index >= start:
+                            records.append(record)
+                        index += 1
+                        if index >= stop:
+                            return records
+            except OSError:
+                pass
+        return records
+
+    # (file, offset) pairs holding the log written since the game started. If the log was rotated since,
+    # the start of the game is at our offset in the rotated file (path.1, unless it was compressed) and
+    # the rest is in the new file from its beginning.
+    def log_files(self):
+        try:
+            stat = os.stat(self.log_path)
+        except OSError:
+            return []
+        if self.inode is None or (stat.st_ino == self.inode and stat.st_size >= self.offset):
+            return [(self.log_path, self.offset)]
+        files = []
+        try:
+            if os.stat(f"{self.log_path}.1").st_ino == self.inode:
+                files.append((f"{self.log_path}.1", self.offset))
+        except OSError:
+            pass
+        files.append((self.log_path, 0))
+        return files
+
+    def render(self, record):
+        sender = record.get("sender")
+        return f"{'You' if sender == self.me else sender}: {record.get('text', '')}"
+
+    def update_button(self):
+        if self.older_button is not None:
+            self.older_button.config(state="normal" if self.hidden else "disabled")
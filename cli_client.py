@@ -0,0 +1,318 @@
+# Terminal client: plays one seat of a game from the command line, without Tk (client.py --headless)
+# It talks to a Tk host (server.py, we play O) or to the headless match server (which tells us our
+# symbol with START and referees the game). Everything comes from the arguments, so nothing waits for
+# a dialog or a display, and it starts in a few tens of milliseconds: scripts and servers can launch
+# many of them. Commands are read from standard input, one per line:
+#   4           play cell 4 (queued until it is our turn, so a script can pipe all its moves at once)
+#   /reset      start a new game
+#   /quit       leave
+#   anything    else is sent as chat
+# When the input ends, the client stays until the current game is over, then leaves.
+#   python3 client.py --headless --name siva --host 192.168.1.20 --port 5000
+#   printf '4\n0\n8\n' | python3 client.py --headless --name script
+import argparse
+import socket
+import sys
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+from game import TicTacToeGame
+from scheduler import get_scheduler
+from protocol import FrameReader, FrameWriter, ProtocolError
+from session import resume_payload, parse_resync, RESUME_WINDOW, RECONNECT_INTERVAL, RUNNING
+import protocol
+
+HOST = '127.0.0.1'
+PORT = 5000
+TURN_TIME = 60                          # Seconds we have for a move when playing a Tk host
+
+
+# Board as rows of "X . O"
+def render(game):
+    board = game.board
+    return "\n".join(" ".join(c or "." for c in board[r:r + game.size]) for r in range(0, len(board), game.size))
+
+
+class CLIClient:
+    def __init__(self, name, host=HOST, port=PORT, turn_time=TURN_TIME, bot=False, out=sys.stdout):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.turn_time = turn_time
+        self.bot = bot                  # Play the built-in AI over a socket pair instead of a server
+        self.out = out
+        self.game = TicTacToeGame()
+        self.symbol = "O"               # A Tk host always plays X; the match server may say otherwise (START)
+        self.refereed = False           # True once a match server sent START: it keeps the time, not us
+        self.opponent = "Opponent"
+        self.token = None               # Session token, needed to reconnect
+        self.games = 1                  # Number of the current game (counted like the server, for resume)
+        self.over = False               # The current game has ended (by a line, a draw or the clock)
+        self.queued = deque()           # Cells typed before it was our turn
+        self.input_done = False         # Standard input has ended
+        self.lock = Lock()              # The receiver, input and timer threads all change the game
+        self.finished = Event()
+        self.turn_timer = None
+        self.scheduler = get_scheduler()
+        self.sock = None
+        self.reader = None
+        self.writer = None
+
+    def say(self, text):
+        print(text, file=self.out, flush=True)
+
+    # Connect, then play until the game is over and the input has ended (or we are told to stop)
+    def run(self, lines=sys.stdin):
+        started = time.perf_counter()
+        if self.bot:
+            import ai
+            self.sock, bot_end = socket.socketpair()
+            ai.BotPeer(bot_end, "X", move_time=min(ai.MOVE_TIME, self.turn_time / 2)).start()
+        else:
+            self.sock = socket.create_connection((self.host, self.port))
+        self.reader = FrameReader(self.sock)
+        self.writer = FrameWriter(self.sock)
+        self.writer.send(protocol.NAME, self.name)
+        where = "the built-in AI" if self.bot else f"{self.host}:{self.port}"
+        self.say(f"Connected to {where} as {self.name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        Thread(target=self.receive_data, name="receiver", daemon=True).start()
+        Thread(target=self.read_input, args=(lines,), name="input", daemon=True).start()
+        self.finished.wait()
+        with self.lock:
+            self.stop_turn_timer()
+            if self.refereed:
+                self.send(protocol.LEFT)        # Do not make the server hold our seat
+        self.sock.close()
+
+    # Standard input, one command per line (runs on its own thread)
+    def read_input(self, lines):
+        for line in lines:
+            line = line.strip()
+            if line:
+                with self.lock:
+                    self.command(line)
+            if self.finished.is_set():
+                return
+        with self.lock:
+            self.input_done = True
+            self.check_finished()
+
+    def command(self, line):
+        if line.isdecimal():            # (isdigit() also takes '²', which int() rejects)
+            cell = int(line)
+            if cell >= self.game.cells:
+                self.say(f"No cell {cell} (0-{self.game.cells - 1})")
+                return
+            self.queued.append(cell)
+            self.play_queued()
+        elif line == "/reset":
+            self.send(protocol.RESET)
+            self.say(f"{self.name} reset the game")
+            self.new_game()
+        elif line == "/quit":
+            self.finished.set()
+        else:
+            self.send(protocol.CHAT, line)
+
+    def send(self, msg_type, value=None):
+        try:
+            self.writer.send(msg_type, value)
+        except OSError:                 # The receiver notices the lost connection and reconnects
+            pass
+
+    # Play the first queued cell that is still free, if it is our turn
+    def play_queued(self):
+        while self.queued and not self.over and self.game.current == self.symbol:
+            cell = self.queued.popleft()
+            if not self.game.is_valid_move(cell, self.symbol):
+                self.say(f"Cell {cell} is taken")
+                continue
+            self.game.play(cell, self.symbol)
+            self.stop_turn_timer()
+            self.send(protocol.MOVE, cell)
+            self.say(f"{self.name} ({self.symbol}) played {cell}\n{render(self.game)}")
+            if self.game.over:
+                self.end_game("Draw!" if self.game.winner is None else f"{self.name} wins!")
+            return
+
+    # Called whenever the turn may have passed to us
+    def our_turn(self):
+        if self.over or self.game.current != self.symbol:
+            return
+        self.play_queued()
+        if self.game.current == self.symbol and not self.over:
+            self.start_turn_timer()
+            if not self.queued:
+                self.say(f"Your turn ({self.symbol}), cell 0-{self.game.cells - 1}:")
+
+    def new_game(self):
+        self.game.reset()
+        self.games += 1
+        self.over = False
+        self.stop_turn_timer()
+        self.our_turn()
+
+    def end_game(self, text):
+        self.over = True
+        self.queued.clear()
+        self.stop_turn_timer()
+        self.say(text)
+        self.check_finished()
+
+    def check_finished(self):
+        if self.input_done and self.over:
+            self.finished.set()
+
+    # Against a Tk host we keep our own clock and report our own timeout, like the Tk client
+    def start_turn_timer(self):
+        if not self.refereed and self.turn_timer is None:
+            self.turn_timer = self.scheduler.call_later(self.turn_time, self.turn_timed_out, self.game.moves[:])
+
+    def stop_turn_timer(self):
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+
+    # Runs on the scheduler thread; moves is the board the timer was armed for
+    def turn_timed_out(self, moves):
+        with self.lock:
+            if self.over or self.game.moves != moves:
+                return
+            self.turn_timer = None
+            self.send(protocol.TIMEOUT, self.name)
+            self.end_game("Time up! You lose.")
+
+    # Receive messages until the connection is gone for good (runs on its own thread)
+    def receive_data(self):
+        while not self.finished.is_set():
+            try:
+                msg_type, value = self.reader.recv()
+            except (ConnectionError, OSError, ProtocolError):
+                if self.finished.is_set() or not self.reconnect():
+                    break
+                continue
+            with self.lock:
+                self.handle(msg_type, value)
+        self.finished.set()
+
+    # Reconnect and send RESUME, retrying until RESUME_WINDOW runs out
+    def reconnect(self):
+        if self.token is None:
+            self.say("Connection closed")
+            return False
+        self.say("Connection lost, reconnecting...")
+        deadline = time.monotonic() + RESUME_WINDOW
+        while time.monotonic() < deadline and not self.finished.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=RECONNECT_INTERVAL)
+            except OSError:
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            sock.settimeout(None)
+            with self.lock:
+                self.sock, self.reader, self.writer = sock, FrameReader(sock), FrameWriter(sock)
+                self.send(protocol.RESUME, resume_payload(self.token, self.games, len(self.game.moves)))
+            return True
+        self.say("Disconnected")
+        return False
+
+    # Apply one message (the lock is held)
+    def handle(self, msg_type, value):
+        if msg_type == protocol.MOVE:
+            mover = "X" if self.symbol == "O" else "O"
+            if not self.game.is_valid_move(value, mover):
+                return
+            self.game.play(value, mover)
+            self.say(f"{self.opponent} ({mover}) played {value}\n{render(self.game)}")
+            if self.game.over:          # A Tk host leaves it to each side to see the end of the game
+                self.end_game("Draw!" if self.game.winner is None else f"{self.opponent} wins!")
+            else:
+                self.our_turn()
+        elif msg_type == protocol.CHAT:
+            self.say(f"{self.opponent}: {value}")
+        elif msg_type == protocol.NAME:
+            self.opponent = value
+        elif msg_type == protocol.WAIT:
+            self.say("Waiting for an opponent...")
+        elif msg_type == protocol.START:
+            self.symbol = value
+            self.refereed = True
+            self.game.reset()
+            self.games = 1
+            self.over = False
+            self.say(f"Playing {self.opponent} as {self.symbol}")
+            self.our_turn()
+        elif msg_type == protocol.TOKEN:
+            self.token = value
+        elif msg_type == protocol.RESYNC:
+            self.resync(value)
+        elif msg_type == protocol.RESET:
+            self.say(f"{self.opponent} reset the game")
+            self.new_game()
+        elif msg_type in (protocol.WINNER, protocol.DRAW, protocol.TIMEOUT):
+            if not self.over:           # Already announced if our own move ended it
+                self.end_game(f"{value} wins!" if msg_type == protocol.WINNER else
+                              "Draw!" if msg_type == protocol.DRAW else f"{value} timed out")
+        elif msg_type == protocol.INVALID:
+            self.say("Move rejected")
+        elif msg_type == protocol.LEFT:
+            self.say(f"{self.opponent} left")
+            self.finished.set()
+        elif msg_type == protocol.EXPIRED:
+            self.say("Nobody to play against, try again later")
+            self.finished.set()
+
+    # Catch up after a reconnect: replay the moves we missed and resend ours the other side never got
+    def resync(self, value):
+        try:
+            game, have, result, cells = parse_resync(value)
+        except ProtocolError:
+            return self.lost_track()
+        self.say("Reconnected")
+        if game < self.games:           # Our RESET was lost: repeat it and our moves since
+            self.send(protocol.RESET)
+            for i in self.game.moves:
+                self.send(protocol.MOVE, i)
+            return
+        if game > self.games:           # A new game was started while we were away
+            self.game.reset()
+            self.games = game
+            self.over = False
+        for i in cells:
+            if not self.game.is_valid_move(i, self.game.current):   # Our board and the server's disagree
+                return self.lost_track()
+            self.game.play(i, self.game.current)
+        for i in self.game.moves[have:]:
+            self.send(protocol.MOVE, i)
+        if cells:
+            self.say(render(self.game))
+        if result != RUNNING and not self.over:     # It ended while we were away
+            self.end_game("Draw!" if self.game.winner is None else f"{self.game.winner} wins!")
+        else:
+            self.our_turn()
+
+    # The server's RESYNC does not fit our board: there is no game left to resume
+    def lost_track(self):
+        self.say("Lost track of the game, disconnecting")
+        self.finished.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tic Tac Toe in the terminal (moves, /reset, /quit or chat on stdin)")
+    parser.add_argument("--name", required=True, help="player name")
+    parser.add_argument("--host", default=HOST, help="server address")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--turn-time", type=float, default=TURN_TIME, help="seconds per move against a Tk host")
+    parser.add_argument("--bot", action="store_true", help="play against the built-in AI instead of a server")
+    args = parser.parse_args(argv)
+    client = CLIClient(args.name, args.host, args.port, args.turn_time, args.bot)
+    try:
+        client.run()
+    except OSError as e:
+        parser.exit(1, f"cannot connect to {args.host}:{args.port}: {e}\n")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
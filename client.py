@@ -1,31 +1,97 @@
 # Import necessary libraries similar to server code
 import socket
-import tkinter as tk
-from tkinter import simpledialog
-from threading import Thread
+import sys
+import argparse
+from threading import Event, Thread
 import time
-from datetime import datetime
+import math
+import uuid
+from game import TicTacToeGame
+from scheduler import get_scheduler
+from ui_pump import UIPump
+from event_log import EventLog
+from chat_view import ChatView
+from protocol import FrameReader, FrameWriter, ProtocolError, NAME, MOVE, CHAT, RESET, WINNER, DRAW, TIMEOUT, TOKEN, RESUME, RESYNC
+from session import resume_payload, parse_resync, RESUME_WINDOW, RECONNECT_INTERVAL
+import metrics
+import protocol
 
-# Define constants for host and port for the server connection
+# Default host and port of the server (override with --host/--port)
 HOST = '127.0.0.1'
 PORT = 5000
+TURN_TIME = 60                          # Default seconds each player has for a move
+EVENT_LOG_PATH = "client_events.log"    # Chat and game events of this player (one JSON object per line)
+tk = None                               # tkinter and its dialogs, imported when the window is opened
+simpledialog = None
+
+# Import tkinter only for the GUI, so --headless starts quickly and runs without a display
+def load_tk():
+    global tk, simpledialog
+    import tkinter as tk
+    from tkinter import simpledialog
 
 # Class for the client-side logic of Tic Tac Toe
 class TicTacToeClient:
-    def __init__(self):
+    def __init__(self, turn_time=TURN_TIME, bot=False, host=HOST, port=PORT, name=None):   # bot: play the built-in AI (it moves first as X)
+        self.turn_time = turn_time                                                   # Seconds allowed per move
+        self.host = host
+        self.port = port
+        self.writer = None                                                           # Set once connected; Send and Reset stay disabled until then
+        self.ready = Event()                                                         # The window is up and the player has a name
+        if bot:                                                          # Single player: the AI plays the server's side of a socket pair
+            import ai
+            self.sock, bot_end = socket.socketpair()
+            ai.BotPeer(bot_end, "X", move_time=min(ai.MOVE_TIME, turn_time / 2)).start()
+            Thread(target=self.start_session, daemon=True).start()
+        else:                                                            # Connect while the window is being built
+            Thread(target=self.connect, daemon=True).start()
+        load_tk()
+        self.scheduler = get_scheduler()                                             # Drives the turn deadline and the clocks
+        self.turn_timer = None                                                       # Pending turn deadline on the scheduler
+        self.turn_deadline = None                                                    # time.monotonic() at which the current turn expires
+        self.clock_timer = None                                                      # Once-a-second clock refresh on the scheduler
         self.window = tk.Tk()                                                        # Initialize the Tkinter window and set the title
-        self.window.title("Client - Tic Tac Toe (O)")
-        self.player_name = simpledialog.askstring("Player Name", "Enter your name:") # Prompt the user to input their name
+        self.window.title("Client - Tic Tac Toe (O) - connecting...")
+        self.player_name = name or simpledialog.askstring("Player Name", "Enter your name:")   # Prompt the user to input their name
         self.server_name = "Server"                                                  # The server will be referred to as "Server"
+        self.game = TicTacToeGame()                                                  # Board, turn and win logic (no GUI)
         self.create_widgets()                                                        # Call the method to create the user interface widgets
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)    # Create a socket to connect to the server using IPv4 and TCP
-        self.sock.connect((HOST, PORT))                                  # Connect to the server using the defined host and port
-        self.send_name()                                                 # Send the player's name to the server
-        self.chat_log_path = "chatlog.txt"                              # Define the file path to save the chat log
-        self.reset_game()                                               # Reset the game to initial settings
-        self.start_game_timer()                                         # Start the game timer
-        Thread(target=self.receive_data).start()                        # Start a new thread to receive data from the server (like moves or messages)
+        self.ui = UIPump(self.window)                                                # Other threads post widget updates here
+        self.messages = metrics.REGISTRY.per_type("client", protocol.NAMES)          # Count and time received messages by type
+        self.games = 0                                                               # Games started, counted like the server does (for resume)
+        self.token = None                                                            # Session token from the server, needed to reconnect
+        self.events = EventLog(EVENT_LOG_PATH)                          # Chat and game event log (written by its own thread)
+        self.chat = ChatView(self.chat_log, self.ui, EVENT_LOG_PATH, self.player_name, self.older_button)  # Newest chat lines, older ones paged back from the log
+        self.reset_game()                                               # Reset the game to initial settings (also starts the game timer)
+        self.ready.set()                                                # The network thread may introduce us now
         self.window.mainloop()                                          # Start the Tkinter event loop to display the GUI
+        self.events.close()                                             # Write out any events still queued
+
+    # Connect to the server (runs on the network thread, while the window is built)
+    def connect(self):
+        try:
+            self.sock = socket.create_connection((self.host, self.port))
+        except OSError as e:
+            self.ready.wait()
+            self.ui.post(self.window.title, f"Client - Tic Tac Toe (O) - cannot connect to {self.host}:{self.port} ({e.strerror})")
+            return
+        self.start_session()
+
+    # Introduce ourselves once the player has a name, then receive until the connection is gone
+    def start_session(self):
+        self.ready.wait()
+        self.reader = FrameReader(self.sock)                             # Splits the byte stream back into messages
+        writer = FrameWriter(self.sock)                                  # Frames outgoing messages and batches them
+        writer.send(NAME, self.player_name)                              # Send the player's name to the server
+        self.ui.post(self.connected, writer)
+        self.receive_data()                                              # Receive data from the server (like moves or messages)
+
+    # The server has our name: chat and reset work from now on (runs on the Tk thread)
+    def connected(self, writer):
+        self.writer = writer
+        self.window.title("Client - Tic Tac Toe (O)")
+        self.send_button.config(state="normal")
+        self.reset_button.config(state="normal")
 
     # Create and place widgets (buttons, labels, etc.) for the game interface
     def create_widgets(self):
@@ -45,13 +111,17 @@ class TicTacToeClient:
         self.status.pack()
 
         # Create a label to show the remaining time for the current move
-        self.timer_label = tk.Label(self.window, text="Time left: 60", font=("Arial", 12), bg="#f0f0f0")
+        self.timer_label = tk.Label(self.window, text=f"Time left: {math.ceil(self.turn_time)}", font=("Arial", 12), bg="#f0f0f0")
         self.timer_label.pack()
 
         # Create a label to show the total game time elapsed
         self.game_time_label = tk.Label(self.window, text="Game time: 0s", font=("Arial", 12), bg="#f0f0f0")
         self.game_time_label.pack()
 
+        # Create a button that brings back older chat lines (the chat log keeps only the newest)
+        self.older_button = tk.Button(self.window, text="Older messages", command=lambda: self.chat.older(), state="disabled")
+        self.older_button.pack()
+
         # Create a text area to display the chat log (disabled by default to prevent editing)
         self.chat_log = tk.Text(self.window, height=10, width=50, state='disabled', bg="#e6f2ff")
         self.chat_log.pack(pady=5)
@@ -61,190 +131,275 @@ class TicTacToeClient:
         self.chat_entry.pack(side=tk.LEFT, padx=5)
 
         # Create a button to send chat messages
-        self.send_button = tk.Button(self.window, text="Send Msg", command=self.send_chat)
+        self.send_button = tk.Button(self.window, text="Send Msg", command=self.send_chat, state="disabled")
         self.send_button.pack(side=tk.LEFT)
 
         # Create a button to reset the game
-        self.reset_button = tk.Button(self.window, text="Reset Game", command=self.send_reset)
+        self.reset_button = tk.Button(self.window, text="Reset Game", command=self.send_reset, state="disabled")
         self.reset_button.pack(pady=5)
 
-    # Send the player's name to the server
-    def send_name(self):
-        self.sock.sendall(f"NAME {self.player_name}".encode())
-
     # Reset the game to the initial state
-        self.timer_thread = None  # NEW: Thread reference for timer
-        self.timer_running = False  # NEW: Control flag for timer
-
     def reset_game(self):
-        self.board = [""] * 9               # Initialize the board (empty spaces)
+        self.game.reset()                   # Initialize the board (empty spaces)
+        self.games += 1                     # Number of this game (the move log of a resume refers to it)
         self.turn = False                   # Set the initial turn to False (opponent's turn first)
-        self.time_left = 60                 # Set the time left for the current move (60 seconds)
+        self.stop_turn_timer()              # No turn timer until the opponent has moved
+        self.game_start_time = time.time()  # Get the start time of the game
+        self.game_id = uuid.uuid4().hex[:8] # Id of this game in the event log
+        self.log_event("start", player=self.player_name, opponent=self.server_name)
         self.stop_timers = False            # Stop the timers when resetting
         for btn in self.buttons:            # Reset the board buttons to empty and re-enable them
             btn.config(text="", state="normal")
 
         self.status.config(text="Waiting for opponent move", fg="red")  # Set the status text to "waiting for opponent move"
-        self.chat_log.config(state='normal')                            # Clear the chat log
-        self.chat_log.delete("1.0", tk.END)
-        self.chat_log.config(state='disabled')
+        self.chat.clear(self.game_id)                                   # Clear the chat log
         self.start_game_timer()                                         # Start the game timer
 
     # Handle a player's move (place 'O' on the board)
+    @metrics.timed("client_make_move_us")
     def make_move(self, i):
         # Only allow a move if it's the player's turn and the spot is empty
-        if self.turn and self.board[i] == "":
+        if self.turn and self.game.is_valid_move(i, "O"):
             # Update the board and the button with the player's symbol ('O')
-            self.board[i] = "O"
+            self.game.play(i, "O")
             self.buttons[i].config(text="O", state="disabled")
-            self.sock.sendall(f"MOVE {i}".encode())             # Send the move to the server
-            
-            # Change the turn to the opponent's and update the status
-            self.turn = False
-            self.timer_running = False                          # Stop timer
-            self.status.config(text="Waiting for opponent move", fg="red")
-            self.check_winner("O")                              # Check if the player won after this move
+            with self.writer.batch():                               # Send the move and any result in one packet
+                self.writer.send(MOVE, i)                           # Send the move to the server
+                self.log_event("move", symbol="O", cell=i)          # Record the move
+
+                # Change the turn to the opponent's and update the status
+                self.turn = False
+                self.stop_turn_timer()                              # Stop timer
+                self.status.config(text="Waiting for opponent move", fg="red")
+                self.check_winner("O")                              # Check if the player won after this move
 
     # Method to continuously receive data from the server (e.g., moves, chat, game reset)
     def receive_data(self):
         while True:
             try:
-                data = self.sock.recv(1024).decode()            # Receive data from the server (up to 1024 bytes)
-                
-                # If the data starts with "MOVE", it indicates the opponent's move
-                if data.startswith("MOVE"):
-                    i = int(data.split()[1])                            # Get the index of the opponent's move
-                    self.board[i] = "X"                                 # Update the board with the opponent's symbol ('X')
-                    self.buttons[i].config(text="X", state="disabled")  # Update the button
-                    self.turn = True                                    # It's now the player's turn
-                    self.timer_running = True                              # Start timer
-                    self.timer_thread = Thread(target=self.start_turn_timer)
-                    self.timer_thread.start()
-                    self.time_left = 60                                 # Reset the move timer
-                    self.status.config(text="Your turn", fg="blue")     # Update the status
-                    self.check_winner("X")                              # Check if the opponent won
-                    Thread(target=self.start_turn_timer).start()        # Start the move timer in a separate thread
-
-                # If the data starts with "CHAT", it indicates a chat message
-                elif data.startswith("CHAT"):
-                    msg = data[5:]                                      # Extract the chat message
-                    self.append_chat(f"{self.server_name}: {msg}")      # Display the message in the chat log
-
-                # If the data starts with "RESET", it indicates that the game is being reset
-                elif data.startswith("RESET"):
-                    self.save_chat()                                    # Save the chat log to file
-                    self.reset_game()                                   # Reset the game board
-
-                # If the data starts with "NAME", it indicates the server's name
-                elif data.startswith("NAME"):
-                    self.server_name = data[5:]                         # Set the server's name
-
-                # If the data starts with "WINNER", it indicates who won the game
-                elif data.startswith("WINNER"):
-                    winner = data.split()[1]                                    # Extract the winner's name
-                    self.status.config(text=f"{winner} wins!", fg="green")      # Update the status
-                    for btn in self.buttons:                                    # Disable all buttons
-                        btn.config(state="disabled")
-                    self.stop_timers = True                                     # Stop the timers
-                    self.save_chat()                                            # Save the chat log
-
-                # If the data starts with "DRAW", it indicates a draw game
-                elif data.startswith("DRAW"):
-                    self.status.config(text="Draw!", fg="purple")               # Update the status to show draw
-                    self.stop_timers = True                                     # Stop the timers
-                    self.save_chat()                                            # Save the chat log
-
-                # If the data starts with "TIMEOUT", it indicates that the game timed out
-                elif data.startswith("TIMEOUT"):
-                    loser = data.split()[1]                                     # Get the name of the player who timed out
-                    winner = self.player_name if loser != self.player_name else self.server_name
-                    self.status.config(text=f"{winner} wins! ({loser} timed out)", fg="orange")
-                    for btn in self.buttons:                                    # Disable all buttons
-                        btn.config(state="disabled")
-                    self.stop_timers = True             # Stop the timers
-                    self.save_chat()                    # Save the chat log
-            except:
-                break
+                msg_type, value = self.reader.recv()            # Wait for the next complete message from the server
+            except (ConnectionError, OSError, ProtocolError):   # Connection lost: try to get our seat back
+                if not self.reconnect():
+                    break
+                continue
+            self.ui.post(self.messages.call, self.handle_message, msg_type, value)  # Apply it on the Tk thread, never from this one
+
+    # Reconnect and send RESUME, retrying until RESUME_WINDOW runs out (runs on the receiver thread)
+    def reconnect(self):
+        if self.token is None:                                  # Game against the built-in AI, or no session yet
+            return False
+        self.ui.post(self.window.title, "Client - Tic Tac Toe (O) - connection lost, reconnecting...")
+        self.log_event("disconnect", player=self.player_name)
+        deadline = time.monotonic() + RESUME_WINDOW
+        while time.monotonic() < deadline:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=RECONNECT_INTERVAL)
+            except OSError:
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            sock.settimeout(None)
+            writer = FrameWriter(sock)
+            # RESUME must be the first frame, so it goes out before the Tk thread can use the new writer
+            writer.send(RESUME, resume_payload(self.token, self.games, len(self.game.moves)))
+            self.sock = sock
+            self.reader = FrameReader(sock)
+            self.writer = writer
+            return True
+        self.ui.post(self.window.title, "Client - Tic Tac Toe (O) - disconnected")
+        return False
+
+    # Catch up after a reconnect: replay the moves we missed and resend ours the server never got
+    def apply_resync(self, value):
+        game, have, result, cells = parse_resync(value)
+        self.window.title("Client - Tic Tac Toe (O)")
+        self.log_event("resume", missed=len(cells))
+        if game < self.games:                                   # Our RESET was lost: send it again
+            self.writer.send(RESET)
+            return
+        if game > self.games:                                   # The server started a new game meanwhile
+            self.reset_game()
+            self.games = game
+        for i in cells:                                         # Only the server's moves can be missing
+            self.handle_message(MOVE, i)
+        for i in self.game.moves[have:]:                        # Our moves that were lost on the way
+            self.writer.send(MOVE, i)
+
+    # Apply one message from the server (runs on the Tk thread)
+    def handle_message(self, msg_type, value):
+        # A MOVE message carries the opponent's move
+        if msg_type == MOVE:
+            i = value                                           # Get the index of the opponent's move
+            if not self.game.is_valid_move(i, "X"):             # Ignore moves the rules do not allow
+                return
+            self.game.play(i, "X")                              # Update the board with the opponent's symbol ('X')
+            self.log_event("move", symbol="X", cell=i)          # Record the move
+            self.buttons[i].config(text="X", state="disabled")  # Update the button
+            self.turn = True                                    # It's now the player's turn
+            self.start_turn_timer()                             # Start the move timer (resets the time left)
+            self.status.config(text="Your turn", fg="blue")     # Update the status
+            self.check_winner("X")                              # Check if the opponent won
+
+        # A CHAT message carries a chat line
+        elif msg_type == CHAT:
+            msg = value                                         # Extract the chat message
+            self.log_event("chat", sender=self.server_name, text=msg)   # Record the message once, as it arrives
+            self.append_chat(f"{self.server_name}: {msg}")      # Display the message in the chat log
+
+        # A RESET message indicates that the game is being reset
+        elif msg_type == RESET:
+            self.log_event("reset", by=self.server_name)        # Record who reset the game
+            self.reset_game()                                   # Reset the game board
+
+        # A NAME message carries the server's name
+        elif msg_type == NAME:
+            self.server_name = value                            # Set the server's name
+
+        # A TOKEN lets us take our seat back after a dropped connection
+        elif msg_type == TOKEN:
+            self.token = value
+
+        # A RESYNC answers our RESUME after a reconnect
+        elif msg_type == RESYNC:
+            self.apply_resync(value)
+
+        # A WINNER message indicates who won the game
+        elif msg_type == WINNER:
+            winner = value                                              # Extract the winner's name
+            self.status.config(text=f"{winner} wins!", fg="green")      # Update the status
+            for btn in self.buttons:                                    # Disable all buttons
+                btn.config(state="disabled")
+            self.stop_timers = True                                     # Stop the timers
+            if not self.game.over:                                      # Already recorded if our own board saw it
+                self.log_event("win", winner=winner)
+
+        # A DRAW message indicates a draw game
+        elif msg_type == DRAW:
+            self.status.config(text="Draw!", fg="purple")               # Update the status to show draw
+            self.stop_timers = True                                     # Stop the timers
+            if not self.game.over:                                      # Already recorded if our own board saw it
+                self.log_event("draw")
+
+        # A TIMEOUT message indicates that the game timed out
+        elif msg_type == TIMEOUT:
+            loser = value                                               # Get the name of the player who timed out
+            winner = self.player_name if loser != self.player_name else self.server_name
+            self.status.config(text=f"{winner} wins! ({loser} timed out)", fg="orange")
+            for btn in self.buttons:                                    # Disable all buttons
+                btn.config(state="disabled")
+            self.stop_timers = True             # Stop the timers
+            self.log_event("timeout", loser=loser)  # Record the result
 
     # Check if there's a winner after each move
+    @metrics.timed("client_check_winner_us")
     def check_winner(self, symbol):
-        # List of possible winning combinations (3 in a row)
-        wins = [(0, 1, 2), (3, 4, 5), (6, 7, 8),(0, 3, 6), (1, 4, 7), (2, 5, 8),(0, 4, 8), (2, 4, 6)]
-        for a, b, c in wins:
-            # If all three positions in a winning combination are the same as the player's symbol
-            if self.board[a] == self.board[b] == self.board[c] == symbol:
-                # Determine the winner's name based on the symbol
-                winner = self.player_name if symbol == "O" else self.server_name
-                self.status.config(text=f"{winner} wins!", fg="green")      # Display winner message
-                self.sock.sendall(f"WINNER {winner}".encode())              # Send winner info to the server
-                for btn in self.buttons:                                    # Disable all buttons
-                    btn.config(state="disabled")
-                self.stop_timers = True                                     # Stop the timers
-                self.save_chat()                                            # Save the chat log
-                return
+        # If the last move completed a line for the player's symbol
+        if self.game.winner == symbol:
+            # Determine the winner's name based on the symbol
+            winner = self.player_name if symbol == "O" else self.server_name
+            self.status.config(text=f"{winner} wins!", fg="green")      # Display winner message
+            self.writer.send(WINNER, winner)                            # Send winner info to the server
+            for btn in self.buttons:                                    # Disable all buttons
+                btn.config(state="disabled")
+            self.stop_timers = True                                     # Stop the timers
+            self.log_event("win", winner=winner)                        # Record the result
+            return
         
         # If no winner and the board is full, it's a draw
-        if "" not in self.board:
+        if self.game.is_full():
             self.status.config(text="Draw!", fg="purple")               # Display draw message
-            self.sock.sendall("DRAW".encode())                          # Notify the server of the draw
+            self.writer.send(DRAW)                                      # Notify the server of the draw
             self.stop_timers = True                                     # Stop the timers
-            self.save_chat()                                            # Save the chat log
+            self.log_event("draw")                                      # Record the result
 
     # Method to send a chat message to the server
     def send_chat(self):
         msg = self.chat_entry.get()                     # Get the message from the entry field
         if msg:                                         # If the message is not empty
-            self.sock.sendall(f"CHAT {msg}".encode())   # Send the message to the server
+            self.writer.send(CHAT, msg)                 # Send the message to the server
+            self.log_event("chat", sender=self.player_name, text=msg)   # Record the message once
             self.append_chat(f"You: {msg}")             # Display the message in the chat log
             self.chat_entry.delete(0, tk.END)           # Clear the entry field
 
     # Method to append a message to the chat log
+    # (lines arriving in the same UI tick are inserted together; only the newest MAX_LINES are kept, see chat_view.py)
     def append_chat(self, msg):
-        self.chat_log.config(state='normal')
-        self.chat_log.insert(tk.END, msg + "\n")
-        self.chat_log.config(state='disabled')
+        self.chat.add(msg)
 
     # Method to send a reset command to the server
     def send_reset(self):
-        self.sock.sendall("RESET".encode())     # Notify the server to reset the game
-        self.save_chat()                        # Save the chat log
+        self.writer.send(RESET)                 # Notify the server to reset the game
+        self.log_event("reset", by=self.player_name)    # Record who reset the game
         self.reset_game()                        # Reset the game locally
 
-    # Method to save the chat log to a file
-    def save_chat(self):
-        with open(self.chat_log_path, "a") as f:
-            f.write(f"\n--- Chat at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")
-            chat_text = self.chat_log.get("1.0", tk.END).strip()
-            f.write(chat_text + "\n")
+    # Method to queue an event for the log writer (never blocks on disk)
+    def log_event(self, event, **fields):
+        self.events.log(self.game_id, event, **fields)
 
-    # Method to handle the turn timer (60 seconds for each player)
+    # Method to arm the turn timer (turn_time seconds for each player) on the shared scheduler
     def start_turn_timer(self):
-        while self.time_left > 0 and not self.stop_timers and self.timer_running:
-            self.timer_label.config(text=f"Time left: {self.time_left}")                # Update the timer display
-            time.sleep(1)                                                               # Wait for 1 second
-            self.time_left -= 1                                                         # Decrease the time left
+        self.stop_turn_timer()                                                          # Replace any deadline still armed
+        self.turn_deadline = time.monotonic() + self.turn_time
+        self.turn_timer = self.scheduler.call_later(self.turn_time, self.ui.post, self.turn_timed_out)
+        self.timer_label.config(text=f"Time left: {math.ceil(self.turn_time)}")         # Update the timer display
+
+    # Method to cancel the pending turn deadline
+    def stop_turn_timer(self):
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        self.turn_deadline = None
+
+    # Posted by the scheduler when the turn expires
+    def turn_timed_out(self):
+        if self.turn_deadline is None or time.monotonic() < self.turn_deadline:
+            return                                                                      # A move was made or the timer re-armed meanwhile
+        self.turn_timer = None
+        self.turn_deadline = None
         # If the time runs out, declare the player as losing
-        if self.time_left == 0 and not self.stop_timers:
+        if not self.stop_timers:
+            self.timer_label.config(text="Time left: 0")
             self.status.config(text="Time up! You lose.", fg="red")
-            self.sock.sendall(f"TIMEOUT {self.player_name}".encode())                   # Notify the server of the timeout
+            self.writer.send(TIMEOUT, self.player_name)                                 # Notify the server of the timeout
             for btn in self.buttons:                                                    # Disable all buttons
                 btn.config(state="disabled")
             self.stop_timers = True                                                     # Stop the timers
-            self.save_chat()                                                            # Save the chat log
+            self.log_event("timeout", loser=self.player_name)                           # Record the result
 
     # Method to start the game timer (tracks total game time)
     def start_game_timer(self):
-        def update_game_timer():
-            self.game_start_time = time.time()                              # Get the start time of the game
-            while not self.stop_timers:
-                elapsed = int(time.time() - self.game_start_time)           # Calculate the elapsed time
-                self.game_time_label.config(text=f"Game time: {elapsed}s")  # Update the game time label
-                time.sleep(1)                                               # Wait for 1 second
-        
-        # Start the game timer in a separate thread
-        Thread(target=update_game_timer, daemon=True).start()
+        if self.clock_timer is None:                                        # One repeating timer refreshes both clocks
+            self.clock_timer = self.scheduler.call_every(1, self.ui.post_latest, "clocks", self.update_clocks)
+
+    # Posted by the scheduler once a second to refresh the game time and the time left
+    def update_clocks(self):
+        if self.stop_timers:                                                # The game is over: freeze the clocks
+            return
+        elapsed = int(time.time() - self.game_start_time)                   # Calculate the elapsed time
+        self.game_time_label.config(text=f"Game time: {elapsed}s")          # Update the game time label
+        deadline = self.turn_deadline
+        if deadline is not None:                                            # Only the player on turn counts down
+            time_left = max(0, math.ceil(deadline - time.monotonic()))
+            self.timer_label.config(text=f"Time left: {time_left}")         # Update the timer display
 
 
 # Start the TicTacToeClient when the script is run
 if __name__ == "__main__":
-    TicTacToeClient()
+    if "--headless" in sys.argv[1:]:            # Play in the terminal, without Tk (see cli_client.py)
+        import cli_client
+        cli_client.main([arg for arg in sys.argv[1:] if arg != "--headless"])
+    else:
+        parser = argparse.ArgumentParser(description="Tic Tac Toe client (plays O)",
+                                         epilog="With --headless it plays in the terminal instead (see cli_client.py).")
+        parser.add_argument("--name", help="player name (asked in a dialog if not given)")
+        parser.add_argument("--host", default=HOST, help="server address")
+        parser.add_argument("--port", type=int, default=PORT)
+        parser.add_argument("--turn-time", type=float, default=TURN_TIME, help="seconds per move")
+        parser.add_argument("--bot", action="store_true", help="play against the built-in AI instead of a server")
+        parser.add_argument("--metrics-port", type=int, help="serve metrics and the profiler on this local port")
+        parser.add_argument("--metrics-dump", help="write all metrics to this JSON file on exit")
+        args = parser.parse_args()
+        if args.metrics_port is not None:
+            metrics.serve(args.metrics_port)
+        if args.metrics_dump:
+            metrics.dump_on_exit(args.metrics_dump)
+        TicTacToeClient(args.turn_time, args.bot, args.host, args.port, args.name)
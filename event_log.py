@@ -0,0 +1,136 @@
+# Append-only chat and game event log written by a background thread
+# Each chat line and game event is logged once, when it happens, as one JSON object per line:
+#   {"ts": "2025-05-09T16:50:51.123", "game": "3f9c2a1b", "event": "chat", "sender": "siva", "text": "Hello"}
+# log() only puts the event on a queue, so the game never waits for the disk. The writer thread
+# writes whatever has queued up in one go, fsyncs every few seconds, and rotates the file when it
+# grows past max_bytes (keeping a few old files, optionally gzip-compressed). If the disk fails it
+# (full, permissions, ...), the batch is dropped and reported on stderr, and the writer keeps draining
+# the queue and tries the file again with the next batch, so memory stays bounded.
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import time
+from datetime import datetime
+from threading import Thread
+import metrics
+
+FLUSH_INTERVAL = 0.5                    # Seconds between writes when events trickle in
+FSYNC_INTERVAL = 2.0                    # Seconds between fsync calls
+MAX_BYTES = 10 * 1024 * 1024            # Rotate the file once it grows past this size
+BACKUPS = 5                             # Rotated files to keep (path.1 is the newest)
+MAX_BATCH = 10000                       # Most events written in one batch
+
+_STOP = object()                        # Queued by close() to stop the writer thread
+
+
+# The EventLog owns the log file and its writer thread
+class EventLog:
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS, compress=False,
+                 flush_interval=FLUSH_INTERVAL, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress        # gzip rotated files
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.write_time = metrics.histogram("event_log_write_us", "time to write one batch of events")
+        self.written = metrics.counter("event_log_events", "events written")
+        self.dropped = metrics.counter("event_log_dropped", "events dropped because the log could not be written")
+        self.failing = None             # The error that stopped the last write, until one succeeds again
+        metrics.gauge("event_log_queued", self.queue.qsize, "events waiting for the writer thread")
+        self.thread = Thread(target=self._run, name="event-log", daemon=True)
+        self.thread.start()
+
+    # Record one event; returns immediately (safe to call from any thread)
+    def log(self, game_id, event, **fields):
+        if self.closed:
+            return
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "game": game_id, "event": event}
+        record.update(fields)
+        self.queue.put(record)
+
+    # Write everything still queued and stop the writer thread
+    def close(self, timeout=5):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+
+    def _run(self):
+        f = None                        # (Re)opened by the first batch, and after a failure
+        last_sync = time.monotonic()
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < MAX_BATCH:   # Take everything that queued up while we waited
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(record is _STOP for record in batch):
+                running = False
+            lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in batch if record is not _STOP]
+            pending = len(lines)        # Not written yet
+            try:
+                if f is None:
+                    f = open(self.path, "a", encoding="utf-8")
+                if lines:
+                    started = time.perf_counter_ns()
+                    f.write("".join(lines))
+                    f.flush()
+                    self.write_time.since(started)
+                    self.written.inc(pending)
+                    pending = 0
+                now = time.monotonic()
+                if now - last_sync >= self.fsync_interval or not running:
+                    os.fsync(f.fileno())
+                    last_sync = now
+                if f.tell() >= self.max_bytes:
+                    os.fsync(f.fileno())
+                    f.close()
+                    f = None
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                if self.failing is not None:
+                    print(f"event log {self.path}: writing again", file=sys.stderr, flush=True)
+                    self.failing = None
+            except OSError as e:
+                self.dropped.inc(pending)
+                if str(e) != self.failing:     # Report each new problem once, not every batch
+                    self.failing = str(e)
+                    print(f"event log {self.path}: {e}, dropping events", file=sys.stderr, flush=True)
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                    f = None
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    # path -> path.1 -> path.2 ... dropping the oldest
+    def _rotate(self):
+        suffix = ".gz" if self.compress else ""
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}{suffix}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}{suffix}")
+        if self.backups <= 0:
+            os.remove(self.path)
+        elif self.compress:
+            with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, f"{self.path}.1")
@@ -0,0 +1,143 @@
+# Shared Tic Tac Toe rules used by the Tk peers (server.py / client.py) and the headless match server
+# Nothing in this module touches tkinter or sockets, so the same rules run with or without a GUI
+#
+# Each player's stones are kept as one integer bitmask (bit i = cell i). Every line of k cells
+# is precomputed as a mask, grouped by the cells it passes through, so checking a move only
+# tests the few lines through the cell just played (at most 4*k masks). Boards of up to 16 cells
+# (3x3, 4x4) go one step further: a table indexed by the player's bitmask says if it holds a line.
+# The same engine plays 3x3 Tic Tac Toe and larger games such as 15x15 five-in-a-row (gomoku).
+
+# Possible results of a move
+CONTINUE = "CONTINUE"                   # The game goes on
+WIN = "WIN"                             # The player who moved has won
+DRAW = "DRAW"                           # The board is full and nobody won
+
+# Directions a line can run in: right, down, down-right, down-left
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+MAX_TABLE_CELLS = 16                    # Largest board that gets a win lookup table (2**16 entries)
+
+_line_cache = {}                        # (size, k) -> (all line masks, line masks per cell, win table)
+
+
+# Return the symbol of the other player
+def other(symbol):
+    return "O" if symbol == "X" else "X"
+
+
+# Build every k-in-a-row mask on a size x size board, the masks that pass through each cell
+# and, for small boards, a table with a 1 for every bitmask that contains a complete line
+def win_masks(size, k):
+    key = (size, k)
+    if key not in _line_cache:
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for dr, dc in DIRECTIONS:
+                    end_row, end_col = row + dr * (k - 1), col + dc * (k - 1)
+                    if not (0 <= end_row < size and 0 <= end_col < size):
+                        continue
+                    mask = 0
+                    for step in range(k):
+                        mask |= 1 << ((row + dr * step) * size + col + dc * step)
+                    lines.append(mask)
+        cells = size * size
+        by_cell = tuple(tuple(m for m in lines if m >> i & 1) for i in range(cells))
+        table = None
+        if cells <= MAX_TABLE_CELLS:
+            table = bytearray(1 << cells)
+            for mask in lines:
+                table[mask] = 1
+            for bits in range(1 << cells):      # A position wins if removing any one stone still wins
+                if not table[bits]:
+                    rest = bits
+                    while rest:
+                        low = rest & -rest
+                        if table[bits ^ low]:
+                            table[bits] = 1
+                            break
+                        rest ^= low
+        _line_cache[key] = (tuple(lines), by_cell, table)
+    return _line_cache[key]
+
+
+# The TicTacToeGame class holds the board, whose turn it is and the win/draw logic
+class TicTacToeGame:
+    def __init__(self, size=3, k=3):
+        if not 1 <= k <= size:
+            raise ValueError(f"Cannot play {k} in a row on a {size}x{size} board")
+        self.size = size                        # Board is size x size cells
+        self.k = k                              # Stones in a row needed to win
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1       # Mask with every cell set
+        self.lines, self.lines_by_cell, self.win_table = win_masks(size, k)
+        self.reset()
+
+    # Reset the game to the initial state (X always moves first)
+    def reset(self):
+        self.bits = {"X": 0, "O": 0}            # Stones of each player as bitmasks
+        self.occupied = 0                       # Union of both players' stones
+        self.current = "X"                      # Symbol of the player whose turn it is
+        self.winner = None                      # Symbol of the winner once the game is won
+        self.over = False                       # True once the game is won or drawn
+        self.moves = []                         # Sequence of cell indexes played so far
+
+    # Board as a list of "X", "O" or "" per cell (for display; the engine itself uses the bitmasks)
+    @property
+    def board(self):
+        x, o = self.bits["X"], self.bits["O"]
+        return ["X" if x >> i & 1 else "O" if o >> i & 1 else "" for i in range(self.cells)]
+
+    # Check if a player may place their symbol on cell i
+    def is_valid_move(self, i, symbol):
+        return (not self.over and symbol == self.current
+                and 0 <= i < self.cells and not self.occupied >> i & 1)
+
+    # Place the symbol on cell i and return CONTINUE, WIN or DRAW
+    # (this is the hot path of the server, so the validity checks are inlined)
+    def play(self, i, symbol):
+        if self.over or symbol != self.current or not 0 <= i < self.cells or self.occupied >> i & 1:
+            raise ValueError(f"Invalid move {i} for {symbol}")
+        bit = 1 << i
+        bits = self.bits
+        mine = bits[symbol] | bit               # Mark the spot with the player's symbol
+        bits[symbol] = mine
+        occupied = self.occupied | bit
+        self.occupied = occupied
+        self.moves.append(i)
+        table = self.win_table
+        if table is not None:
+            if table[mine]:
+                self.winner = symbol
+                self.over = True
+                return WIN
+        else:
+            for mask in self.lines_by_cell[i]:  # Only lines through the new stone can have been completed
+                if mine & mask == mask:
+                    self.winner = symbol
+                    self.over = True
+                    return WIN
+        if occupied == self.full:               # No empty spots left, it's a draw
+            self.over = True
+            return DRAW
+        self.current = "O" if symbol == "X" else "X"    # Hand the turn to the other player
+        return CONTINUE
+
+    # Check if the given symbol has k in a row anywhere on the board
+    def check_winner(self, symbol):
+        mine = self.bits[symbol]
+        if self.win_table is not None:
+            return bool(self.win_table[mine])
+        for mask in self.lines:
+            if mine & mask == mask:
+                return True
+        return False
+
+    # Check if there are no empty spots left
+    def is_full(self):
+        return self.occupied == self.full
+
+    # End the game without a move (e.g. a player timed out or left)
+    def forfeit(self, loser):
+        self.winner = other(loser)
+        self.over = True
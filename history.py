@@ -0,0 +1,196 @@
+# Match history: one row per finished game in an SQLite database
+# record() only puts the game on a queue. A writer thread inserts whatever has queued up in one
+# transaction, so the game loop never waits for the database. WAL mode lets queries read while
+# the writer writes. The moves are stored as a blob with one byte per cell (two on boards > 256 cells).
+# Indexes on (player, end time) keep "last N games of a player" and head-to-head queries to a few
+# index lookups however many games are stored.
+#   python3 history.py match_history.db --player siva
+#   python3 history.py match_history.db --player siva --against manoj
+import argparse
+import queue
+import sqlite3
+import time
+from array import array
+from threading import Event, Lock, Thread
+import metrics
+
+FLUSH_INTERVAL = 0.5                    # Seconds between inserts when games trickle in
+MAX_BATCH = 5000                        # Most games inserted in one transaction
+LOCK_TIMEOUT = 30                       # Seconds to wait while another process writes (sharded workers share the file)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    game_id TEXT,                       -- Id used in the event log
+    player_x TEXT NOT NULL,
+    player_o TEXT NOT NULL,
+    result TEXT NOT NULL,               -- 'X' or 'O' (the winner) or 'draw'
+    reason TEXT NOT NULL,               -- 'line', 'full', 'timeout' or 'left'
+    started REAL NOT NULL,              -- Unix time
+    ended REAL NOT NULL,
+    duration REAL NOT NULL,             -- Seconds
+    size INTEGER NOT NULL,
+    moves BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_x ON games (player_x, ended);
+CREATE INDEX IF NOT EXISTS games_o ON games (player_o, ended);
+CREATE INDEX IF NOT EXISTS games_xo ON games (player_x, player_o, ended);
+CREATE INDEX IF NOT EXISTS games_ended ON games (ended);
+"""
+
+COLUMNS = ("game_id", "player_x", "player_o", "result", "reason", "started", "ended", "duration", "size", "moves")
+
+
+def pack_moves(moves, cells):
+    return array("B" if cells <= 256 else "H", moves).tobytes()
+
+
+def unpack_moves(blob, cells):
+    moves = array("B" if cells <= 256 else "H")
+    moves.frombytes(blob)
+    return list(moves)
+
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last commits can be lost on power failure
+    return conn
+
+
+class MatchHistory:
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        conn = _open(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.reader = _open(path)       # Queries, from any thread
+        self.reader.row_factory = sqlite3.Row
+        self.read_lock = Lock()
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.insert_time = metrics.histogram("history_insert_us", "time to insert one batch of games")
+        self.inserted = metrics.counter("history_games", "games stored")
+        metrics.gauge("history_queued", self.queue.qsize, "games waiting for the history writer")
+        self.thread = Thread(target=self._run, name="history", daemon=True)
+        self.thread.start()
+
+    # Queue one finished game; returns immediately (safe to call from any thread).
+    # game is a TicTacToeGame, result "X"/"O"/"draw", reason "line"/"full"/"timeout"/"left",
+    # started and ended are time.time() values.
+    def record(self, game_id, player_x, player_o, game, result, reason, started, ended=None):
+        if self.closed:
+            return
+        ended = time.time() if ended is None else ended
+        self.queue.put((game_id, player_x, player_o, result, reason, started, ended, round(ended - started, 3),
+                        game.size, pack_moves(game.moves, game.cells)))
+
+    # Wait until everything queued so far is in the database
+    def flush(self, timeout=10):
+        done = Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.reader.close()
+
+    def _run(self):
+        conn = _open(self.path)
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < MAX_BATCH:   # Take everything that queued up while we waited
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if isinstance(item, tuple)]
+            if rows:
+                started = time.perf_counter_ns()
+                with conn:                  # One transaction per batch
+                    conn.executemany(f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                                     rows)
+                self.insert_time.since(started)
+                self.inserted.inc(len(rows))
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, Event):
+                    item.set()
+        conn.close()
+
+    def _query(self, sql, args):
+        with self.read_lock:
+            rows = self.reader.execute(sql, args).fetchall()
+        games = []
+        for row in rows:
+            game = dict(row)
+            game["moves"] = unpack_moves(game["moves"], game["size"] * game["size"])
+            games.append(game)
+        return games
+
+    # The player's last n games, newest first (each half walks one index backwards from the newest)
+    def last_games(self, player, n=10):
+        return self._query(
+            "SELECT * FROM (SELECT * FROM games WHERE player_x = ? ORDER BY ended DESC LIMIT ?) "
+            "UNION ALL SELECT * FROM (SELECT * FROM games WHERE player_o = ? ORDER BY ended DESC LIMIT ?) "
+            "ORDER BY ended DESC LIMIT ?", (player, n, player, n, n))
+
+    # Games between a and b (either side), newest first
+    def head_to_head(self, a, b, n=10):
+        return self._query(
+            "SELECT * FROM (SELECT * FROM games WHERE player_x = ? AND player_o = ? ORDER BY ended DESC LIMIT ?) "
+            "UNION ALL SELECT * FROM (SELECT * FROM games WHERE player_x = ? AND player_o = ? ORDER BY ended DESC LIMIT ?) "
+            "ORDER BY ended DESC LIMIT ?", (a, b, n, b, a, n, n))
+
+    # Wins of a, wins of b and draws over all their games (games_xo finds the games; the result is read
+    # from each row, so this costs one row lookup per game they played)
+    def head_to_head_score(self, a, b):
+        with self.read_lock:
+            rows = self.reader.execute(
+                "SELECT player_x, player_o, result, COUNT(*) FROM games WHERE (player_x = ? AND player_o = ?) "
+                "OR (player_x = ? AND player_o = ?) GROUP BY player_x, result", (a, b, b, a)).fetchall()
+        score = {a: 0, b: 0, "draw": 0}
+        for player_x, player_o, result, count in rows:
+            winner = {"X": player_x, "O": player_o}.get(result, "draw")
+            score[winner] += count
+        return score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the match history")
+    parser.add_argument("path", nargs="?", default="match_history.db")
+    parser.add_argument("--player", required=True)
+    parser.add_argument("--against", help="show only games against this player, with the score")
+    parser.add_argument("-n", type=int, default=10, help="number of games")
+    args = parser.parse_args(argv)
+    history = MatchHistory(args.path)
+    started = time.perf_counter()
+    if args.against:
+        games = history.head_to_head(args.player, args.against, args.n)
+        score = history.head_to_head_score(args.player, args.against)
+    else:
+        games = history.last_games(args.player, args.n)
+        score = None
+    elapsed = (time.perf_counter() - started) * 1000
+    for g in games:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(g["ended"]))
+        outcome = "draw" if g["result"] == "draw" else f"{g['player_' + g['result'].lower()]} won"
+        print(f"{when}  {g['player_x']} (X) vs {g['player_o']} (O): {outcome} by {g['reason']}, "
+              f"{g['duration']:.0f}s, moves {','.join(map(str, g['moves']))}")
+    if score is not None:
+        print(f"score: {args.player} {score[args.player]}, {args.against} {score[args.against]}, draws {score['draw']}")
+    print(f"({elapsed:.1f} ms)")
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
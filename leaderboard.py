@@ -0,0 +1,181 @@
+# Elo leaderboard, updated game by game
+# Every result moves both players' ratings right away. The ratings are also kept in one list sorted best
+# first, so the top K is a slice and a player's rank is a binary search; nothing is recomputed from the
+# history. Moving a player in the list shifts memory in C, a few microseconds even with 100k players.
+# checkpoint() writes the ratings to a JSON file (atomically, from a thread if asked). load() reads the
+# checkpoint and replays only the games the match history stored after it, so a restart takes a moment
+# instead of replaying every game ever played.
+# Under supervisor.py every worker stores its games in the shared history. The supervisor alone writes the
+# checkpoint, and every process builds its ratings from the same history in the same order, so they all
+# agree. Games that ended in the last SETTLE_TIME seconds are left for the next replay: another worker may
+# still be about to store one that ended before them.
+#   python3 leaderboard.py leaderboard.json --top 20
+#   python3 leaderboard.py leaderboard.json --player siva
+import argparse
+import bisect
+import json
+import os
+import sqlite3
+import time
+from threading import Thread
+import metrics
+
+INITIAL_RATING = 1200                   # Rating of a player's first game
+K_FACTOR = 32                           # Most points one game can move a rating
+CHECKPOINT_INTERVAL = 60                # Seconds between checkpoints of a running server
+REPLAY_BATCH = 100000                   # History rows fetched at a time when catching up
+SETTLE_TIME = 10                        # Seconds a game may take to reach a shared history
+
+
+# Points the first player is expected to score against the second (1 = certain win)
+def expected(rating_a, rating_b):
+    return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+
+
+class Leaderboard:
+    def __init__(self, k_factor=K_FACTOR, initial=INITIAL_RATING):
+        self.k_factor = k_factor
+        self.initial = initial
+        self.ratings = {}               # name -> rating
+        self.records = {}               # name -> (wins, draws, losses)
+        self.order = []                 # (-rating, name) for every player, best first
+        self.last_ended = 0.0           # End time of the newest game applied (where a replay resumes)
+        self.dirty = False              # Changed since the last checkpoint
+        self.writer = None              # Thread writing the last background checkpoint
+        self.update_time = metrics.histogram("leaderboard_update_us", "time to apply one result to the ratings")
+        metrics.gauge("leaderboard_players", lambda: len(self.ratings), "players on the leaderboard")
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def __contains__(self, name):
+        return name in self.ratings
+
+    # A player's rating, or default if they have not played yet
+    def get(self, name, default=None):
+        return self.ratings.get(name, default)
+
+    def _set(self, name, rating):
+        old = self.ratings.get(name)
+        if old is not None:
+            del self.order[bisect.bisect_left(self.order, (-old, name))]
+        self.ratings[name] = rating
+        bisect.insort(self.order, (-rating, name))
+
+    # Apply one finished game: result is "X", "O" or "draw". Returns the new ratings of X and O.
+    def update(self, player_x, player_o, result, ended=None):
+        started = time.perf_counter_ns()
+        rating_x = self.ratings.get(player_x, self.initial)
+        rating_o = self.ratings.get(player_o, self.initial)
+        score_x = 1.0 if result == "X" else 0.0 if result == "O" else 0.5
+        change = self.k_factor * (score_x - expected(rating_x, rating_o))
+        if player_x != player_o:        # Playing yourself proves nothing
+            self._set(player_x, rating_x + change)
+            self._set(player_o, rating_o - change)
+            for name, score in ((player_x, score_x), (player_o, 1 - score_x)):
+                wins, draws, losses = self.records.get(name, (0, 0, 0))
+                self.records[name] = (wins + (score == 1), draws + (score == 0.5), losses + (score == 0))
+        self.last_ended = max(self.last_ended, ended or time.time())
+        self.dirty = True
+        self.update_time.since(started)
+        return self.ratings.get(player_x, rating_x), self.ratings.get(player_o, rating_o)
+
+    # The best k players as (rank, name, rating, (wins, draws, losses))
+    def top(self, k=10):
+        return [(rank, name, -negative, self.records[name])
+                for rank, (negative, name) in enumerate(self.order[:k], 1)]
+
+    # 1 for the best player; None if the player has not played
+    def rank(self, name):
+        rating = self.ratings.get(name)
+        if rating is None:
+            return None
+        return bisect.bisect_left(self.order, (-rating, name)) + 1
+
+    # Write the ratings to path (write a temporary file, then rename, so a crash never leaves half a file).
+    # background=True takes the snapshot now and writes it from a thread.
+    def checkpoint(self, path, background=False):
+        state = {"k_factor": self.k_factor, "initial": self.initial, "last_ended": self.last_ended,
+                 "players": {name: [rating, *self.records[name]] for name, rating in self.ratings.items()}}
+        self.dirty = False
+        if self.writer is not None:     # One write at a time (they share path.tmp), and never an older one last
+            self.writer.join()
+            self.writer = None
+        if background:
+            self.writer = Thread(target=self._write, args=(path, state), name="leaderboard", daemon=True)
+            self.writer.start()
+        else:
+            self._write(path, state)
+
+    @staticmethod
+    def _write(path, state):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    # Read the checkpoint at path (if any), then apply the games the history database at history_path
+    # stored after it (up to the end time until, if given)
+    @classmethod
+    def load(cls, path, history_path=None, k_factor=K_FACTOR, initial=INITIAL_RATING, until=None):
+        board = cls(k_factor, initial)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            board.k_factor, board.initial = state["k_factor"], state["initial"]
+            board.last_ended = state["last_ended"]
+            for name, (rating, wins, draws, losses) in state["players"].items():
+                board.ratings[name] = rating
+                board.records[name] = (wins, draws, losses)
+            board.order = sorted((-rating, name) for name, rating in board.ratings.items())
+        if history_path and os.path.exists(history_path):
+            board.replay(history_path, until)
+        board.dirty = False
+        return board
+
+    # Apply every game in the history that ended after the newest one already applied (and not after
+    # until, if given), oldest first
+    def replay(self, history_path, until=None):
+        conn = sqlite3.connect(history_path)
+        try:
+            cursor = conn.execute("SELECT player_x, player_o, result, ended FROM games WHERE ended > ? AND ended <= ? "
+                                  "ORDER BY ended, id", (self.last_ended, float("inf") if until is None else until))
+        except sqlite3.OperationalError:    # No games table yet
+            conn.close()
+            return 0
+        applied = 0
+        while True:
+            rows = cursor.fetchmany(REPLAY_BATCH)
+            if not rows:
+                break
+            for player_x, player_o, result, ended in rows:
+                self.update(player_x, player_o, result, ended)
+            applied += len(rows)
+        conn.close()
+        return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the Elo leaderboard")
+    parser.add_argument("path", nargs="?", default="leaderboard.json")
+    parser.add_argument("--history", help="also apply the games this match history stored after the checkpoint")
+    parser.add_argument("--top", type=int, default=10, help="number of players to list")
+    parser.add_argument("--player", help="show this player's rank instead")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    board = Leaderboard.load(args.path, args.history)
+    print(f"{len(board)} players, loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+    if args.player:
+        rank = board.rank(args.player)
+        if rank is None:
+            print(f"{args.player} has not played")
+        else:
+            wins, draws, losses = board.records[args.player]
+            print(f"#{rank} {args.player} {board.get(args.player):.0f} ({wins}-{draws}-{losses})")
+        return
+    for rank, name, rating, (wins, draws, losses) in board.top(args.top):
+        print(f"{rank:4d}. {name:20s} {rating:6.0f}  {wins}-{draws}-{losses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Load generator and latency benchmark for the headless match server
+# Starts N bots (see bot_client.py) against a local match server, lets every pair play a number
+# of games, and reports throughput plus p50/p99/p99.9 latency of moves and chat messages.
+# Results are written as JSON so runs of different versions can be compared.
+# --spectators N adds N watchers spread over the matches, to measure the fan-out to spectators.
+#   python3 loadtest.py --players 1000 --games 20 --chat-every 3 --out results.json
+#   python3 loadtest.py --players 1000 --games 20 --compare results.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from bot_client import BotClient, Watcher, LatencyTracker, random_strategy, scripted_strategy, ai_strategy
+
+CONNECT_CONCURRENCY = 256               # Connections opened at the same time while ramping up
+
+
+# Nearest-rank percentile of a sorted list
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# Latency summary in milliseconds
+def summarize(samples):
+    values = sorted(samples)
+    result = {"count": len(values)}
+    for label, p in (("p50", 50), ("p99", 99), ("p999", 99.9)):
+        value = percentile(values, p)
+        result[label] = None if value is None else round(value * 1000, 3)
+    result["max"] = round(values[-1] * 1000, 3) if values else None
+    return result
+
+
+# Find a free local port for the server we start
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Start match_server.py in its own process (so the bots do not share its event loop),
+# or supervisor.py with that many workers
+def spawn_server(port, turn_time, vs_bot=False, wait_timeout=5, history="", leaderboard="", workers=0, chat_rate=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = ["supervisor.py", "--workers", str(workers)] if workers else ["match_server.py"]
+    process = subprocess.Popen([sys.executable, os.path.join(here, script[0])] + script[1:] + [
+                                "--port", str(port), "--turn-time", str(turn_time), "--log", "",
+                                "--wait-timeout", str(wait_timeout), "--history", history, "--leaderboard", leaderboard]
+                               + (["--vs-bot"] if vs_bot else [])
+                               + (["--chat-rate", str(chat_rate)] if chat_rate is not None else []))
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:     # Wait until it accepts connections
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("match server did not start")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+async def run_bots(args, host, port):
+    tracker = LatencyTracker()
+    rng = random.Random(args.seed)
+    script = [int(c) for c in args.script.split(",")] if args.script else None
+    bots = []
+    for n in range(args.players):
+        bot_rng = random.Random(rng.random())
+        if script:
+            strategy = scripted_strategy(script, bot_rng)
+        elif args.ai:
+            strategy = ai_strategy()
+        else:
+            strategy = random_strategy(bot_rng)
+        rating = round(rng.uniform(1000, 2000)) if args.ratings else None
+        bots.append(BotClient(f"bot{n}", host, port, strategy, args.games, args.chat_every, tracker, rating,
+                              args.drop_every))
+
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    all_connected = asyncio.Event()
+    connected = [0]
+
+    async def start(bot):
+        async with gate:                # Only the connect is limited, playing is fully concurrent
+            await bot.connect()
+        connected[0] += 1
+        if connected[0] == len(bots):
+            all_connected.set()
+        await bot.play()
+
+    # Watchers join once every bot is in a match, spread round-robin over the matches
+    matches = len(bots) if args.vs_bot else len(bots) // 2
+    watchers = [Watcher(host, port, str(n % matches + 1)) for n in range(args.spectators)]
+
+    async def spectate():
+        await all_connected.wait()
+        await asyncio.sleep(0.1)        # Let the server pair the last bots
+        for n in range(0, len(watchers), CONNECT_CONCURRENCY):
+            await asyncio.gather(*(asyncio.create_task(w.run()) for w in watchers[n:n + CONNECT_CONCURRENCY]),
+                                 return_exceptions=True)
+
+    started = time.perf_counter()
+    watching = asyncio.create_task(spectate()) if watchers else None
+    results = await asyncio.gather(*(start(bot) for bot in bots), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    if watching is not None:
+        await asyncio.wait_for(watching, 30)
+    errors = [repr(r) for r in results if isinstance(r, Exception)]
+    tracker.counts["resume"] = sum(bot.resumes for bot in bots)
+    return tracker, watchers, elapsed, errors
+
+
+# Print the relative change of each number against an earlier result file
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"compared with {previous_path} ({previous.get('revision', '?')}):")
+    for section in ("throughput", "move_latency_ms", "chat_latency_ms", "lobby_wait_ms", "spectators"):
+        for key, value in current[section].items():
+            old = previous.get(section, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {section}.{key}: {old} -> {value} ({(value - old) / old * 100:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for match_server.py")
+    parser.add_argument("--players", type=int, default=200, help="simulated players (pairs play each other)")
+    parser.add_argument("--games", type=int, default=10, help="games per pair")
+    parser.add_argument("--chat-every", type=int, default=3, help="each bot chats after every n-th move (0 = never)")
+    parser.add_argument("--script", help="comma separated cells every bot tries first, e.g. 4,0,8,2")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ai", action="store_true", help="bots play perfectly with the built-in AI")
+    parser.add_argument("--vs-bot", action="store_true", help="every bot plays the server's built-in AI")
+    parser.add_argument("--spectators", type=int, default=0, help="watchers spread over the matches")
+    parser.add_argument("--ratings", action="store_true", help="give bots random ratings (lobby rating buckets)")
+    parser.add_argument("--wait-timeout", type=float, default=5, help="lobby wait limit of the started server")
+    parser.add_argument("--history", default="", help="match history database of the started server (default: none)")
+    parser.add_argument("--leaderboard", default="", help="ratings checkpoint of the started server (default: none)")
+    parser.add_argument("--workers", type=int, default=0, help="start supervisor.py with this many workers instead")
+    parser.add_argument("--chat-rate", type=float, help="chat flood limit of the started server (messages/s per player)")
+    parser.add_argument("--drop-every", type=int, default=0,
+                        help="each bot cuts its connection after every n-th move and resumes")
+    parser.add_argument("--host", help="use a server that is already running instead of starting one")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--turn-time", type=float, default=60)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+    if args.players % 2 and not args.vs_bot:
+        parser.error("--players must be even")
+
+    server = None
+    host, port = args.host, args.port
+    if host is None:
+        host, port = "127.0.0.1", free_port()
+        server = spawn_server(port, args.turn_time, args.vs_bot, args.wait_timeout, args.history,
+                              args.leaderboard, args.workers, args.chat_rate)
+    try:
+        tracker, watchers, elapsed, errors = asyncio.run(run_bots(args, host, port))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    counts = tracker.counts
+    result = {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {"players": args.players, "games": args.games, "chat_every": args.chat_every,
+                   "script": args.script, "seed": args.seed, "ai": args.ai, "vs_bot": args.vs_bot,
+                   "spectators": args.spectators, "ratings": args.ratings, "drop_every": args.drop_every,
+                   "workers": args.workers, "chat_rate": args.chat_rate},
+        "elapsed_s": round(elapsed, 3),
+        "errors": errors[:20],
+        "throughput": {
+            "games": counts["game"],
+            "moves": counts["move"],
+            "chats": counts["chat"],
+            "resumes": counts.get("resume", 0),
+            "games_per_s": round(counts["game"] / elapsed, 1),
+            "moves_per_s": round(counts["move"] / elapsed, 1),
+            "chats_per_s": round(counts["chat"] / elapsed, 1),
+        },
+        "move_latency_ms": summarize(tracker.samples["move"]),
+        "chat_latency_ms": summarize(tracker.samples["chat"]),
+        "lobby_wait_ms": summarize(tracker.samples["wait"]),
+        "spectators": {
+            "count": len(watchers),
+            "frames": sum(w.frames for w in watchers),
+            "frames_per_s": round(sum(w.frames for w in watchers) / elapsed, 1),
+            "skipped_ahead": sum(max(0, w.snapshots - 1) for w in watchers),
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Matchmaking lobby for the headless match server
+# Waiting players sit in one queue per rating bucket (all unrated players share bucket None).
+# Every queue is an OrderedDict in arrival order, so joining, leaving, pairing with the longest
+# waiting player and expiring the oldest are all O(1) - nothing ever scans the whole lobby.
+# A rated player is paired within their own bucket first, then with the neighbouring buckets.
+# Unrated players play anyone: an unrated player who finds no other unrated one takes the rated player
+# who waited longest, and a rated player with nobody in range takes a waiting unrated one.
+# Nobody stays stuck in a sparse bucket: every WIDEN_INTERVAL seconds a player waits, they accept an
+# opponent one bucket further away (widen(), called once a second by the server).
+import time
+from collections import OrderedDict, deque
+
+BUCKET_WIDTH = 200                      # Rating points per bucket (0 = ignore ratings, pair everyone)
+WAIT_TIMEOUT = 120                      # Seconds a player may wait for an opponent (0 = forever)
+WAIT_SAMPLES = 10000                    # Recent wait times kept for the stats
+WIDEN_INTERVAL = 10                     # Seconds of waiting per extra bucket a player accepts (0 = never widen)
+
+
+class Lobby:
+    def __init__(self, bucket_width=BUCKET_WIDTH, wait_timeout=WAIT_TIMEOUT, widen_interval=WIDEN_INTERVAL,
+                 clock=time.monotonic):
+        self.bucket_width = bucket_width
+        self.wait_timeout = wait_timeout
+        self.widen_interval = widen_interval
+        self.clock = clock
+        self.queues = {}                # bucket -> OrderedDict(player -> time joined)
+        self.bucket_of = {}             # player -> bucket, for O(1) leave()
+        self.waits = deque(maxlen=WAIT_SAMPLES)     # Seconds the last paired players waited
+        self.joined = 0
+        self.paired = 0
+        self.expired = 0
+
+    def _bucket(self, rating):
+        if rating is None or not self.bucket_width:
+            return None
+        return int(rating // self.bucket_width)
+
+    # Add a player; returns the opponent to pair with right away (who waited longer), or None
+    def join(self, player, rating=None):
+        now = self.clock()
+        self.joined += 1
+        bucket = self._bucket(rating)
+        if bucket is not None:
+            candidates = (bucket, bucket - 1, bucket + 1, None)
+        elif None in self.queues or not self.queues:
+            candidates = (None,)
+        else:                           # Every queue holds one player here (see widen()), so this looks at a few
+            candidates = (min(self.queues, key=lambda b: next(iter(self.queues[b].values()))),)
+        for b in candidates:
+            queue = self.queues.get(b)
+            if queue:
+                opponent, since = queue.popitem(last=False)     # Longest waiting first
+                del self.bucket_of[opponent]
+                if not queue:
+                    del self.queues[b]
+                self._paired(now, since, now)
+                return opponent
+        self.queues.setdefault(bucket, OrderedDict())[player] = now
+        self.bucket_of[player] = bucket
+        return None
+
+    # Remove a waiting player (disconnected); does nothing if they are not waiting
+    def leave(self, player):
+        if player not in self.bucket_of:
+            return False
+        bucket = self.bucket_of.pop(player)
+        queue = self.queues[bucket]
+        del queue[player]
+        if not queue:
+            del self.queues[bucket]
+        return True
+
+    def _paired(self, now, *joined):
+        self.paired += len(joined)
+        self.waits.extend(now - since for since in joined)
+
+    # Pair rated players whose widened range now reaches another waiting player; returns (X, O) pairs,
+    # whoever waited longer first. A rated bucket never holds more than one player (a second one is
+    # paired on joining), so this walks the few occupied buckets, not the players.
+    def widen(self):
+        if not self.widen_interval:
+            return []
+        now = self.clock()
+        waiting = sorted((b, *next(iter(q.items()))) for b, q in self.queues.items() if b is not None)
+        pairs = []
+        previous = None
+        for bucket, player, since in waiting:
+            if previous is not None:
+                reach = 1 + int((now - min(since, previous[2])) // self.widen_interval)
+                if bucket - previous[0] <= reach:
+                    first, second = sorted((previous, (bucket, player, since)), key=lambda w: w[2])
+                    self.leave(first[1])
+                    self.leave(second[1])
+                    self._paired(now, first[2], second[2])
+                    pairs.append((first[1], second[1]))
+                    previous = None
+                    continue
+            previous = (bucket, player, since)
+        return pairs
+
+    def __contains__(self, player):
+        return player in self.bucket_of
+
+    def __len__(self):
+        return len(self.bucket_of)
+
+    # Take out and return everyone who has waited longer than wait_timeout
+    def expire(self):
+        if not self.wait_timeout:
+            return []
+        cutoff = self.clock() - self.wait_timeout
+        expired = []
+        for bucket in list(self.queues):
+            queue = self.queues[bucket]
+            while queue:                # Oldest first, so stop at the first one still in time
+                player, since = next(iter(queue.items()))
+                if since > cutoff:
+                    break
+                del queue[player]
+                del self.bucket_of[player]
+                expired.append(player)
+            if not queue:
+                del self.queues[bucket]
+        self.expired += len(expired)
+        return expired
+
+    # Take out and return everyone still waiting (the server is shutting down)
+    def clear(self):
+        waiting = list(self.bucket_of)
+        self.queues.clear()
+        self.bucket_of.clear()
+        return waiting
+
+    # Queue depth and wait times (milliseconds) of recently paired players
+    def stats(self):
+        waits = sorted(self.waits)
+
+        def pick(p):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))] * 1000, 1) if waits else None
+
+        return {"waiting": len(self.bucket_of), "buckets": len(self.queues), "joined": self.joined,
+                "paired": self.paired, "expired": self.expired,
+                "wait_p50_ms": pick(50), "wait_p99_ms": pick(99), "wait_max_ms": pick(100)}
@@ -0,0 +1,767 @@
+# Headless match server: hosts many Tic Tac Toe games at once on asyncio, without any GUI
+# Every connection is a player; the lobby pairs players as they arrive and each pair gets its own match.
+# A connection that sends WATCH instead of NAME becomes a spectator of a running match.
+# supervisor.py runs one of these per core, all on the same port (SO_REUSEPORT). A player who reconnects
+# may then reach another worker than the one holding their seat: session tokens start with the owner's
+# pid, and the connection is passed to the owner over a Unix socket (the "handoff").
+import asyncio                          # For handling thousands of connections on one thread
+import argparse                         # For reading command line options
+import itertools                        # For generating match ids
+import os                               # For the worker's pid in session tokens
+import json                             # For spectator snapshots
+import math                             # For checking ratings
+import signal                           # For a clean exit on SIGTERM and draining on SIGUSR1
+import socket                           # For sizing the spectators' send buffers and passing connections between workers
+import sys                              # For printing lobby stats
+import time                             # For timing message handling
+from array import array                 # For passing a socket to another worker
+from threading import Thread            # For receiving handed-off connections
+from game import TicTacToeGame, WIN, DRAW, other
+import protocol
+import ai
+from event_log import EventLog
+from history import MatchHistory
+from leaderboard import Leaderboard, CHECKPOINT_INTERVAL, SETTLE_TIME
+from lobby import Lobby, BUCKET_WIDTH, WAIT_TIMEOUT, WIDEN_INTERVAL
+from session import new_token, parse_resume, resync_payload, RESUME_WINDOW
+from rate_limit import ChatGate, CHAT_RATE, CHAT_BURST
+import metrics
+from protocol import FrameDecoder, ProtocolError
+
+# Default host and port (same as the Tk peers)
+HOST = '127.0.0.1'
+PORT = 5000
+TURN_TIME = 60                          # Seconds a player has to make a move
+BACKLOG = 4096                          # Pending connections the OS may queue for us
+EVENT_LOG_PATH = "match_events.log"     # Chat and game events of every match
+HISTORY_PATH = "match_history.db"       # Every finished game of every match
+LEADERBOARD_PATH = "leaderboard.json"   # Checkpoint of the Elo ratings
+WATCH_HIGH_WATER = 256 * 1024           # Unsent bytes at which a spectator stops getting live updates
+WATCH_LOW_WATER = 16 * 1024             # Unsent bytes at which it catches up with a fresh snapshot
+WATCH_LAG_LIMIT = 30                    # Seconds a spectator may stay behind before it is dropped
+WATCH_SEND_BUFFER = 64 * 1024           # Kernel send buffer per spectator (bounds memory with thousands of them)
+DRAIN_TIMEOUT = 120                     # Seconds a draining worker waits for its matches to end
+HANDOFF_RETRIES = 200                   # Tries 5 ms apart while another worker's handoff queue is full
+RATINGS_INTERVAL = 5                    # Seconds between reading new results from a shared history
+
+
+# One connected client
+class Player:
+    def __init__(self, reader, writer, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST):
+        self.reader = reader
+        self.writer = writer
+        self.name = "Player"            # Replaced by the NAME the client sends
+        self.rating = None              # Optional RATING used by the lobby
+        self.token = None               # Session token, lets the player take their seat back after a drop
+        self.away = None                # Pending leave() while the player is disconnected
+        self.symbol = None              # "X" or "O" once paired
+        self.match = None               # Match the player is in, None while waiting
+        self.decoder = FrameDecoder()
+        self.outbox = bytearray()       # Frames queued during the current loop iteration
+        self.chat = ChatGate(chat_rate, chat_burst)     # Flood control: chat beyond the rate is held back and coalesced
+
+    # Queue a message for the client. Everything queued during one pass of the event loop
+    # is written with a single write() call, so a MOVE and the WINNER it causes share a syscall.
+    def send(self, msg_type, value=None):
+        if self.writer.is_closing():
+            return
+        if not self.outbox:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.outbox += protocol.encode(msg_type, value)
+
+    def flush(self):
+        if self.outbox and not self.writer.is_closing():
+            self.writer.write(bytes(self.outbox))
+        self.outbox.clear()
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+# A connection watching a match. It gets one SNAPSHOT and then the same frames as every other
+# spectator of the match. A spectator that cannot keep up is skipped ahead instead of queued for:
+# once its socket buffer passes WATCH_HIGH_WATER it gets nothing until the buffer has drained,
+# then one new SNAPSHOT replaces everything it missed. Players never wait for spectators.
+class Spectator:
+    def __init__(self, writer):
+        self.writer = writer
+        self.transport = writer.transport
+        self.match = None
+        self.behind_since = None        # loop.time() when it fell behind, None while it keeps up
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, WATCH_SEND_BUFFER)
+            except OSError:
+                pass
+
+    # Hand over the frames of one loop pass (already encoded, shared by all spectators)
+    def deliver(self, data, snapshot):
+        if self.writer.is_closing():
+            return
+        buffered = self.transport.get_write_buffer_size()
+        if self.behind_since is not None:
+            if buffered > WATCH_LOW_WATER:
+                if asyncio.get_running_loop().time() - self.behind_since > WATCH_LAG_LIMIT:
+                    self.close()        # Too slow for too long: drop it
+                return
+            self.behind_since = None
+            self.writer.write(snapshot())    # Skip ahead to the current state
+            return
+        self.writer.write(data)
+        if buffered + len(data) > WATCH_HIGH_WATER:
+            self.behind_since = asyncio.get_running_loop().time()
+
+    def close(self):
+        if self.match is not None:
+            self.match.spectators.discard(self)
+            self.match = None
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+# Built-in AI opponent (--vs-bot). It takes a seat in a match like a connected client, but answers
+# from the precomputed 3x3 table, so each bot move is one lookup and thousands of bot games run at once.
+class BotPlayer:
+    def __init__(self, name="Bot"):
+        self.name = name
+        self.symbol = None
+        self.match = None
+        self.token = None               # Never disconnects, so needs no session
+        self.away = None
+        self.ai = ai.AIPlayer()
+        self.scheduled = False          # A move is already queued on the event loop
+
+    # Messages that may make it our turn schedule a move; the rest need no answer
+    def send(self, msg_type, value=None):
+        if msg_type in (protocol.START, protocol.MOVE, protocol.RESET) and not self.scheduled:
+            self.scheduled = True
+            asyncio.get_running_loop().call_soon(self.move)
+
+    # Play if the game is still on and it is our turn (call_soon keeps match.move from recursing)
+    def move(self):
+        self.scheduled = False
+        match = self.match
+        if match is None or match.game.over or match.game.current != self.symbol:
+            return
+        match.move(self, self.ai.choose(match.game))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.match = None
+
+
+# One game between two players; the server is the referee and enforces the rules
+class Match:
+    def __init__(self, match_id, player_x, player_o, server):
+        self.match_id = match_id
+        self.server = server
+        self.game = TicTacToeGame()
+        self.players = {"X": player_x, "O": player_o}
+        self.turn_handle = None         # Pending turn timeout callback
+        self.games = 1                  # Games played in this match, counting the current one
+        self.started = time.time()      # When the current game started (for the history)
+        self.spectators = set()
+        self.feed = bytearray()         # Frames for the spectators, sent together at the end of the loop pass
+
+    # Tell both players who they play against and which symbol they have
+    def start(self):
+        for symbol, player in self.players.items():
+            player.symbol = symbol
+            player.match = self
+            player.send(protocol.NAME, self.players[other(symbol)].name)
+            player.send(protocol.START, symbol)
+            if isinstance(player, Player):
+                player.token = self.server.new_token()
+                self.server.sessions[player.token] = player
+                player.send(protocol.TOKEN, player.token)
+        self.log("start", x=self.players["X"].name, o=self.players["O"].name)
+        self.started = time.time()
+        self.start_turn_timer()
+
+    # Dispatch one message received from a player
+    def handle(self, player, msg_type, value):
+        if msg_type == protocol.MOVE:
+            self.move(player, value)
+        elif msg_type == protocol.CHAT:
+            now = asyncio.get_running_loop().time()
+            text = player.chat.offer(value, now)
+            if text is not None:
+                self.chat(player, text)
+            else:                       # Too fast: held back (or dropped) by the player's token bucket
+                self.hold_chat(player, now)
+        elif msg_type == protocol.RESET:
+            self.reset(player)
+        elif msg_type == protocol.LEFT:  # Leaving on purpose: no need to hold the seat
+            self.leave(player)
+
+    # Chat goes to the opponent, the spectators and the log
+    def chat(self, player, text):
+        self.players[other(player.symbol)].send(protocol.CHAT, text)
+        self.publish(protocol.CHAT, f"{player.name}: {text}")
+        self.log("chat", sender=player.name, text=text)
+
+    # Send what the player's gate holds, as one message, once its bucket has a token again
+    def hold_chat(self, player, now):
+        delay = player.chat.due(now)
+        if delay is not None:
+            asyncio.get_running_loop().call_later(delay, self.release_chat, player)
+
+    def release_chat(self, player):
+        now = asyncio.get_running_loop().time()
+        text = player.chat.release(now)
+        if player.match is not self:    # The match ended meanwhile
+            return
+        if text is not None:
+            self.chat(player, text)
+        self.hold_chat(player, now)
+
+    # Validate and apply a move, then notify the opponent
+    def move(self, player, i):
+        if not self.game.is_valid_move(i, player.symbol):
+            player.send(protocol.INVALID)
+            return
+        result = self.game.play(i, player.symbol)
+        self.players[other(player.symbol)].send(protocol.MOVE, i)
+        self.publish(protocol.MOVE, i)
+        self.log("move", symbol=player.symbol, cell=i)
+        if result == WIN:
+            self.broadcast(protocol.WINNER, player.name)
+            self.stop_turn_timer()
+            self.log("win", winner=player.name)
+            self.record(player.symbol, "line")
+        elif result == DRAW:
+            self.broadcast(protocol.DRAW)
+            self.stop_turn_timer()
+            self.log("draw")
+            self.record("draw", "full")
+        else:
+            self.start_turn_timer()
+
+    # Restart the game on request of either player
+    def reset(self, player):
+        self.log("reset", by=player.name)
+        self.game.reset()
+        self.games += 1
+        self.started = time.time()
+        self.players[other(player.symbol)].send(protocol.RESET)
+        self.publish(protocol.RESET)
+        self.start_turn_timer()
+
+    # (Re)arm the timeout for the player whose turn it is
+    def start_turn_timer(self):
+        self.stop_turn_timer()
+        loop = asyncio.get_running_loop()
+        self.turn_handle = loop.call_later(self.server.turn_time, self.timeout)
+
+    def stop_turn_timer(self):
+        if self.turn_handle is not None:
+            self.turn_handle.cancel()
+            self.turn_handle = None
+
+    # The current player ran out of time and loses
+    def timeout(self):
+        self.turn_handle = None
+        loser = self.game.current
+        self.game.forfeit(loser)
+        self.broadcast(protocol.TIMEOUT, self.players[loser].name)
+        self.log("timeout", loser=self.players[loser].name)
+        self.record(other(loser), "timeout")
+
+    # A player's connection dropped: keep the seat for a while, the game goes on (turn timer included)
+    def hold(self, player):
+        self.log("disconnect", player=player.name)
+        player.away = asyncio.get_running_loop().call_later(self.server.resume_window, self.leave, player)
+
+    # The player is back on a new connection: send the moves they missed
+    def resume(self, player, game, seen):
+        if player.away is not None:
+            player.away.cancel()
+            player.away = None
+        player.send(protocol.RESYNC, resync_payload(self.games, self.game, game, seen))
+        self.log("resume", player=player.name, seen=seen)
+
+    # A player left for good: end the match and let the opponent go
+    def leave(self, player):
+        if self.server.matches.pop(self.match_id, None) is None:
+            return                      # Already ended
+        self.stop_turn_timer()
+        self.log("left", player=player.name)
+        if self.game.moves and not self.game.over:      # Leaving a game in progress loses it
+            self.record(other(player.symbol), "left")
+        for seated in self.players.values():
+            if seated.away is not None:
+                seated.away.cancel()
+                seated.away = None
+            self.server.sessions.pop(seated.token, None)
+        player.match = None
+        opponent = self.players[other(player.symbol)]
+        opponent.match = None
+        opponent.send(protocol.LEFT)
+        opponent.flush()
+        opponent.close()
+        self.publish(protocol.LEFT)
+        self.fan_out()
+        for spectator in list(self.spectators):
+            spectator.close()
+
+    # Results go to both players and to the spectators
+    def broadcast(self, msg_type, value=None):
+        for player in self.players.values():
+            player.send(msg_type, value)
+        self.publish(msg_type, value)
+
+    # Add a spectator: it gets the current state now and every update after it.
+    # Updates already queued this loop pass are in the snapshot, so they go out to the others first.
+    def watch(self, spectator):
+        self.fan_out()
+        spectator.match = self
+        self.spectators.add(spectator)
+        spectator.writer.write(self.snapshot())
+
+    # State of the match as one SNAPSHOT frame; the moves are replayed on the spectator's own board
+    def snapshot(self):
+        game = self.game
+        state = {"match": self.match_id, "game": self.games, "x": self.players["X"].name,
+                 "o": self.players["O"].name, "size": game.size, "k": game.k, "moves": game.moves,
+                 "over": game.over, "winner": game.winner}
+        return protocol.encode(protocol.SNAPSHOT, json.dumps(state))
+
+    # Encode an update once for all spectators; the frames of one loop pass are written together
+    def publish(self, msg_type, value=None):
+        if not self.spectators:
+            return
+        if not self.feed:
+            asyncio.get_running_loop().call_soon(self.fan_out)
+        self.feed += protocol.encode(msg_type, value)
+
+    def fan_out(self):
+        if not self.feed:
+            return
+        started = time.perf_counter_ns()
+        data = bytes(self.feed)
+        self.feed.clear()
+        snapshot = []                   # Built at most once, only if a lagging spectator catches up
+
+        def current_snapshot():
+            if not snapshot:
+                snapshot.append(self.snapshot())
+            return snapshot[0]
+
+        for spectator in list(self.spectators):
+            spectator.deliver(data, current_snapshot)
+        self.server.fan_out_time.since(started)
+
+    # Queue an event for the log writer thread (never blocks the event loop)
+    def log(self, event, **fields):
+        if self.server.events is not None:
+            self.server.events.log(f"{self.match_id}.{self.games}", event, **fields)
+
+    # Update the ratings and queue the finished game for the history writer thread (never blocks the event loop)
+    def record(self, result, reason):
+        ended = time.time()
+        self.server.games_finished.inc()
+        if self.server.leaderboard is not None and self.server.ratings_history is None:
+            self.server.leaderboard.update(self.players["X"].name, self.players["O"].name, result, ended)
+        if self.server.history is not None:
+            self.server.history.record(f"{self.match_id}.{self.games}", self.players["X"].name,
+                                       self.players["O"].name, self.game, result, reason, self.started, ended)
+
+
+# The MatchServer accepts connections and pairs them into matches
+class MatchServer:
+    def __init__(self, host=HOST, port=PORT, turn_time=TURN_TIME, events=None, vs_bot=False, lobby=None,
+                 stats_interval=0, resume_window=RESUME_WINDOW, history=None, leaderboard=None, leaderboard_path=None,
+                 reuse_port=False, handoff_dir=None, report_interval=0, drain_timeout=DRAIN_TIMEOUT,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST, ratings_history=None):
+        self.host = host
+        self.port = port
+        self.turn_time = turn_time
+        self.events = events            # EventLog for chat and game events, None to disable logging
+        self.history = history          # MatchHistory for finished games, None to disable it
+        self.leaderboard = leaderboard  # Elo ratings updated after every game, None to disable them
+        self.leaderboard_path = leaderboard_path    # Checkpoint file of the ratings (None = never written)
+        self.vs_bot = vs_bot            # Pair every player with the built-in AI instead of another player
+        self.lobby = lobby if lobby is not None else Lobby()    # Players waiting for an opponent (an empty one is falsy)
+        self.stats_interval = stats_interval    # Seconds between lobby stats lines on stderr (0 = never)
+        self.resume_window = resume_window      # Seconds a dropped player's seat is kept (0 = end the match at once)
+        self.sessions = {}              # Session token -> Player, for every player seated in a match
+        self.chat_rate = chat_rate      # Chat messages per second each connection may send (more are coalesced)
+        self.chat_burst = chat_burst
+        # Sharding (supervisor.py)
+        self.reuse_port = reuse_port    # Share the port with the other workers
+        self.handoff_dir = handoff_dir  # Directory of the workers' handoff sockets, None when running alone
+        self.report_interval = report_interval  # Seconds between stats lines on stdout for the supervisor (0 = never)
+        self.drain_timeout = drain_timeout      # Seconds a draining worker waits for its matches to end
+        self.ratings_history = ratings_history  # Shared history the ratings are read from instead of updated here
+        self.replaying = False          # A replay of that history is running on a thread
+        self.draining = False           # Set by SIGUSR1: accept no one new, exit when the matches are over
+        # Metrics (see metrics.py): messages and handling time per type, plus live gauges
+        self.messages = metrics.REGISTRY.per_type("match", protocol.NAMES)
+        self.bytes_in = metrics.counter("match_bytes_in", "bytes received from clients")
+        self.games_finished = metrics.counter("match_games", "games finished")
+        self.handed_off = metrics.counter("match_handed_off", "reconnecting players passed to the worker holding their seat")
+        self.fan_out_time = metrics.histogram("match_fan_out_us", "time to send one batch to a match's spectators")
+        self.loop_lag = metrics.histogram("match_loop_lag_us", "how late the once-a-second sweep ran")
+        metrics.gauge("match_connections", lambda: self.connections, "open client connections")
+        metrics.gauge("match_matches", lambda: len(self.matches), "live matches")
+        metrics.gauge("match_lobby_waiting", lambda: len(self.lobby), "players waiting for an opponent")
+        metrics.gauge("match_lobby_expired", lambda: self.lobby.expired, "players who gave up waiting")
+        metrics.gauge("match_spectators", lambda: sum(len(m.spectators) for m in list(self.matches.values())),
+                      "connected spectators")
+        metrics.gauge("match_players_away", lambda: sum(p.away is not None for p in list(self.sessions.values())),
+                      "dropped players whose seat is held")
+        self.matches = {}               # Live matches by id
+        self.match_ids = itertools.count(1)
+        self.connections = 0            # Number of open client connections
+
+    # Handle one client connection from NAME until it disconnects (data: bytes already received, when handed off)
+    async def handle_client(self, reader, writer, data=b""):
+        player = Player(reader, writer, self.chat_rate, self.chat_burst)
+        spectator = None                # Set once the connection asks to WATCH instead of play
+        self.connections += 1
+        try:
+            while True:
+                if not data:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                self.bytes_in.value += len(data)
+                messages = player.decoder.feed(data)
+                data = b""
+                for n, (msg_type, value) in enumerate(messages):
+                    if spectator is not None:
+                        continue        # Spectators only listen
+                    if player.match is not None:
+                        started = time.perf_counter_ns()
+                        player.match.handle(player, msg_type, value)
+                        self.messages.observe(msg_type, started)
+                        continue
+                    self.messages.count(msg_type)
+                    if msg_type == protocol.NAME and player not in self.lobby:
+                        player.name = value or player.name
+                        self.pair(player)
+                    elif msg_type == protocol.RATING and player not in self.lobby:
+                        try:
+                            player.rating = float(value)
+                        except ValueError:
+                            player.rating = math.nan
+                        if not math.isfinite(player.rating):    # "nan" and "inf" parse, but fit no bucket
+                            player.send(protocol.INVALID)
+                            return
+                    elif msg_type == protocol.WATCH and player not in self.lobby:
+                        spectator = self.watch(writer, value)
+                        if spectator is None:
+                            player.send(protocol.INVALID)   # No such match
+                            return
+                    elif msg_type == protocol.RESUME and player not in self.lobby:
+                        resumed = self.resume(player, value)
+                        if resumed is None and await self.hand_off(player, value, messages[n + 1:]):
+                            return      # The worker holding the seat carries on with this connection
+                        if resumed is None:
+                            player.send(protocol.INVALID)   # Unknown or expired session
+                            return
+                        player = resumed        # This connection now carries the seated player
+        except (ConnectionError, ProtocolError):
+            pass                        # Connection reset or a malformed frame: drop the player
+        except asyncio.CancelledError:
+            pass                        # The server is shutting down
+        finally:
+            self.connections -= 1
+            self.lobby.leave(player)
+            if spectator is not None:
+                spectator.close()
+            if player.writer is not writer:
+                writer.close()          # The player resumed on a newer connection, which carries on
+            else:
+                if player.match is not None:
+                    if self.resume_window and player.token:
+                        player.match.hold(player)
+                    else:
+                        player.match.leave(player)
+                player.flush()
+                player.close()
+
+    # Seat a reconnecting player on this connection; None if the token is unknown
+    def resume(self, connection, payload):
+        token, game, seen = parse_resume(payload)
+        player = self.sessions.get(token)
+        if player is None or player.match is None:
+            return None
+        old_writer = player.writer
+        player.reader, player.writer, player.decoder = connection.reader, connection.writer, connection.decoder
+        player.outbox.clear()           # Anything queued for the dead connection is covered by RESYNC
+        if not old_writer.is_closing():
+            old_writer.close()          # Half-open old connection: the new one takes over
+        player.match.resume(player, game, seen)
+        return player
+
+    # Session token; with a handoff directory it starts with our pid, so other workers know where to send the player
+    def new_token(self):
+        if self.handoff_dir is None:
+            return new_token()
+        return f"{os.getpid()}.{new_token()}"
+
+    # Pass a connection that wants to RESUME a seat held by another worker to that worker,
+    # with everything it sent so far. False if the token is not another worker's.
+    # Reading stops first: what the client sends while we wait for the owner's queue stays in the socket,
+    # which the owner then reads. Bytes the stream reader already holds go along with the decoder's.
+    async def hand_off(self, player, payload, rest):
+        owner = payload.split(".", 1)[0]
+        if self.handoff_dir is None or not owner.isdecimal() or int(owner) == os.getpid():
+            return False
+        transport = player.writer.transport
+        transport.pause_reading()
+        data = protocol.encode(protocol.RESUME, payload) + b"".join(protocol.encode(*m) for m in rest)
+        data += bytes(player.decoder.buffer) + bytes(player.reader._buffer)    # (StreamReader has no public peek)
+        fds = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array("i", [player.writer.get_extra_info("socket").fileno()]))]
+        path = os.path.join(self.handoff_dir, f"{owner}.sock")
+        for _ in range(HANDOFF_RETRIES):
+            try:
+                self.handoff_out.sendmsg([data], fds, 0, path)     # (socket.send_fds ignores the address)
+            except BlockingIOError:     # Its queue is full (only a few datagrams by default): try again shortly
+                await asyncio.sleep(0.005)
+                continue
+            except OSError:             # That worker is gone
+                break
+            self.handed_off.inc()
+            return True                 # Closing our copy of the socket leaves the owner's open
+        transport.resume_reading()      # Not handed off: the buffered bytes are still ours to read
+        return False
+
+    # Receive connections handed to us by the other workers (a thread blocks on the Unix socket)
+    def start_handoff(self):
+        loop = asyncio.get_running_loop()
+        path = os.path.join(self.handoff_dir, f"{os.getpid()}.sock")
+        if os.path.exists(path):        # Left behind by a crashed worker that had our pid
+            os.unlink(path)
+        self.handoff_in = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.handoff_in.bind(path)
+        self.handoff_out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.handoff_out.setblocking(False)     # Never wait on a stuck worker
+
+        def receive():
+            while True:
+                try:
+                    data, fds, _, _ = socket.recv_fds(self.handoff_in, 65536, 1)
+                except OSError:
+                    return
+                for fd in fds:          # Bind data too: the next datagram may arrive before this runs
+                    loop.call_soon_threadsafe(lambda fd=fd, data=data: asyncio.ensure_future(self.adopt(fd, data)))
+
+        Thread(target=receive, name="handoff", daemon=True).start()
+
+    async def adopt(self, fd, data):
+        reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=fd))
+        await self.handle_client(reader, writer, data)
+
+    # Stop taking new players (the other workers get them) and exit once the running matches end
+    def drain(self):
+        if self.draining:
+            return
+        self.draining = True
+        self.drain_deadline = asyncio.get_running_loop().time() + self.drain_timeout
+        self.listener.close()
+        for player in self.lobby.clear():       # Nobody new will come here to play them
+            player.send(protocol.EXPIRED)
+            player.flush()
+            player.close()
+
+    # Numbers for the supervisor, which adds them up over all workers
+    def report(self):
+        return {"pid": os.getpid(), "connections": self.connections, "matches": len(self.matches),
+                "waiting": len(self.lobby), "games": self.games_finished.value,
+                "messages": sum(c.value for c in self.messages.counters.values()), "bytes_in": self.bytes_in.value,
+                "handed_off": self.handed_off.value, "draining": self.draining,
+                "loop_lag_p99_us": self.loop_lag.percentile(99)}
+
+    # Attach a spectator to the match with the given id ("" = the newest match); None if there is none
+    def watch(self, writer, match_id):
+        if match_id:
+            match = self.matches.get(int(match_id)) if match_id.isdecimal() else None
+        else:
+            match = next(reversed(self.matches.values()), None)
+        if match is None:
+            return None
+        spectator = Spectator(writer)
+        match.watch(spectator)
+        return spectator
+
+    # Pair the player through the lobby, or make them wait; whoever waited longer plays X
+    def pair(self, player):
+        if self.vs_bot:                 # The player moves first, the AI answers
+            match = Match(next(self.match_ids), player, BotPlayer(), self)
+            self.matches[match.match_id] = match
+            match.start()
+            return
+        rating = player.rating
+        if rating is not None and self.leaderboard is not None:     # Rated play: known players are matched
+            rating = self.leaderboard.get(player.name, rating)      # by their earned rating, not the one they sent
+        opponent = self.lobby.join(player, rating)
+        if opponent is None:
+            player.send(protocol.WAIT)
+            return
+        self.start_match(opponent, player)
+
+    def start_match(self, player_x, player_o):
+        match = Match(next(self.match_ids), player_x, player_o, self)
+        self.matches[match.match_id] = match
+        match.start()
+
+    # Once a second: pair players whose rating range has widened, send away players who waited too long,
+    # and print the lobby stats when due.
+    # How late it runs is the event loop lag (time the loop spent on something else).
+    def sweep(self):
+        loop = asyncio.get_running_loop()
+        if self.next_sweep is not None:     # A busy loop runs us late
+            self.loop_lag.record(max(0, loop.time() - self.next_sweep) * 1000000)
+        self.next_sweep = loop.time() + 1
+        for player_x, player_o in self.lobby.widen():
+            self.start_match(player_x, player_o)
+        for player in self.lobby.expire():
+            player.send(protocol.EXPIRED)
+            player.flush()
+            player.close()
+        if self.stats_interval and loop.time() >= self.next_stats:
+            self.next_stats = loop.time() + self.stats_interval
+            stats = dict(self.lobby.stats(), matches=len(self.matches), connections=self.connections)
+            print(json.dumps(stats), file=sys.stderr, flush=True)
+        if self.ratings_history and not self.replaying and loop.time() >= self.next_ratings:
+            self.next_ratings = loop.time() + RATINGS_INTERVAL
+            self.replaying = True
+            replay = loop.run_in_executor(None, self.leaderboard.replay, self.ratings_history, time.time() - SETTLE_TIME)
+            replay.add_done_callback(self.replayed)
+        if self.leaderboard_path and self.leaderboard.dirty and loop.time() >= self.next_checkpoint:
+            self.next_checkpoint = loop.time() + CHECKPOINT_INTERVAL
+            self.leaderboard.checkpoint(self.leaderboard_path, background=True)
+        if self.report_interval and loop.time() >= self.next_report:
+            self.next_report = loop.time() + self.report_interval
+            try:
+                print(json.dumps(self.report()), flush=True)
+            except OSError:             # The supervisor is gone: finish the matches and exit
+                self.report_interval = 0
+                self.drain()
+        if self.draining and (not self.matches or loop.time() >= self.drain_deadline):
+            self.stopped.set()
+        loop.call_at(self.next_sweep, self.sweep)
+
+    # Every worker's games are applied in one order, off the event loop: the database query and the Elo
+    # updates of thousands of games would stall every match. The thread is the only one changing the
+    # ratings here (record() leaves them alone), and the loop only looks up single ratings (dict reads).
+    def replayed(self, replay):
+        self.replaying = False
+        if not replay.cancelled() and replay.exception() is not None:
+            print(f"ratings replay failed: {replay.exception()!r}", file=sys.stderr, flush=True)
+
+    # Serve until drained (SIGUSR1) or interrupted
+    async def serve_forever(self):
+        raise_fd_limit()
+        loop = asyncio.get_running_loop()
+        self.next_stats = loop.time() + self.stats_interval
+        self.next_checkpoint = loop.time() + CHECKPOINT_INTERVAL
+        self.next_ratings = loop.time() + RATINGS_INTERVAL
+        self.next_report = loop.time()
+        self.next_sweep = None
+        self.stopped = asyncio.Event()
+        self.listener = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=BACKLOG,
+                                                   reuse_port=self.reuse_port or None)
+        if self.handoff_dir is not None:
+            self.start_handoff()
+        if hasattr(signal, "SIGUSR1"):  # Not on Windows
+            loop.add_signal_handler(signal.SIGUSR1, self.drain)
+        self.sweep()
+        try:
+            await self.stopped.wait()
+        finally:
+            self.listener.close()
+            if self.handoff_dir is not None:
+                self.handoff_in.close()
+                os.unlink(os.path.join(self.handoff_dir, f"{os.getpid()}.sock"))
+
+
+# Allow as many open sockets as the OS permits (the default soft limit is often 1024)
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:                 # Not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):   # Some systems refuse an unlimited soft limit
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Tic Tac Toe match server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--turn-time", type=float, default=TURN_TIME, help="seconds per move")
+    parser.add_argument("--log", default=EVENT_LOG_PATH, help="event log file ('' to disable)")
+    parser.add_argument("--log-max-mb", type=float, default=10, help="rotate the event log at this size")
+    parser.add_argument("--log-compress", action="store_true", help="gzip rotated event logs")
+    parser.add_argument("--history", default=HISTORY_PATH, help="SQLite match history ('' to disable)")
+    parser.add_argument("--leaderboard", default=LEADERBOARD_PATH, help="Elo ratings checkpoint ('' to disable ratings)")
+    parser.add_argument("--vs-bot", action="store_true", help="pair every player with the built-in AI")
+    parser.add_argument("--bucket-width", type=float, default=BUCKET_WIDTH,
+                        help="rating points per matchmaking bucket (0 = ignore ratings)")
+    parser.add_argument("--wait-timeout", type=float, default=WAIT_TIMEOUT,
+                        help="seconds a player may wait for an opponent (0 = forever)")
+    parser.add_argument("--widen-interval", type=float, default=WIDEN_INTERVAL,
+                        help="seconds of waiting after which a rated player accepts one more bucket each way (0 = never)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print lobby stats every n seconds")
+    parser.add_argument("--resume-window", type=float, default=RESUME_WINDOW,
+                        help="seconds a dropped player may reconnect (0 = end the match at once)")
+    parser.add_argument("--chat-rate", type=float, default=CHAT_RATE,
+                        help="chat messages per second a player may send; faster ones are sent together")
+    parser.add_argument("--chat-burst", type=int, default=CHAT_BURST, help="chat messages a player may send at once")
+    parser.add_argument("--metrics-port", type=int, help="serve metrics and the profiler on this local port")
+    parser.add_argument("--metrics-dump", help="write all metrics to this JSON file on exit")
+    # Set by supervisor.py for its workers
+    parser.add_argument("--reuse-port", action="store_true", help="share the port with other processes (SO_REUSEPORT)")
+    parser.add_argument("--handoff-dir", help="directory of the workers' handoff sockets")
+    parser.add_argument("--ratings-from-history", action="store_true",
+                        help="read the ratings from the --leaderboard checkpoint and the shared --history, never write them")
+    parser.add_argument("--report-interval", type=float, default=0, help="print a JSON stats line on stdout every n seconds")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="seconds to wait for running matches after SIGUSR1 before exiting")
+    args = parser.parse_args(argv)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_dump:
+        metrics.dump_on_exit(args.metrics_dump)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Exit on kill like on Ctrl+C (flush, checkpoint, dump)
+    events = None
+    if args.log:
+        events = EventLog(args.log, max_bytes=int(args.log_max_mb * 1024 * 1024), compress=args.log_compress)
+    history = MatchHistory(args.history) if args.history else None
+    shared = args.ratings_from_history and args.history     # supervisor.py keeps the checkpoint
+    leaderboard = None
+    if args.leaderboard:
+        leaderboard = Leaderboard.load(args.leaderboard, args.history, until=time.time() - SETTLE_TIME if shared else None)
+    leaderboard_path = None if shared else args.leaderboard
+    lobby = Lobby(args.bucket_width, args.wait_timeout, args.widen_interval)
+    server = MatchServer(args.host, args.port, args.turn_time, events, args.vs_bot, lobby, args.stats_interval,
+                         args.resume_window, history, leaderboard, leaderboard_path,
+                         args.reuse_port, args.handoff_dir, args.report_interval, args.drain_timeout,
+                         args.chat_rate, args.chat_burst, args.history if shared else None)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if events is not None:
+            events.close()
+        if history is not None:
+            history.close()
+        if leaderboard is not None and leaderboard_path:
+            leaderboard.checkpoint(leaderboard_path)
+
+
+# Run the headless server
+if __name__ == "__main__":
+    main()
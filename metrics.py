@@ -0,0 +1,371 @@
+# Runtime metrics for the servers and the Tk peers
+# Counters, gauges and latency histograms live in one process-wide registry (like the scheduler).
+# Recording is a couple of integer operations, so the hot paths can stay instrumented all the time.
+# Histograms are HDR-style: exact below 128, then 64 buckets per power of two, so any value from
+# microseconds to minutes is kept to within about 1.5% in a few hundred buckets.
+# serve() exposes everything on a local HTTP endpoint:
+#   /metrics          text, one "name value" per line (Prometheus style)
+#   /metrics.json     the same as JSON
+#   /profile/start    switch the sampling profiler on (?interval=0.005 seconds; 400 if not a positive number)
+#   /profile/stop     switch it off
+#   /profile          functions seen most often in the samples (top of stack and anywhere on it)
+#   /profile/stacks   collapsed stacks, the input format of flamegraph tools
+# Updates are not locked: under heavy contention between threads a counter may miss an increment.
+import atexit
+import functools
+import json
+import math
+import sys
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from threading import Event, Lock, Thread, get_ident, active_count
+from urllib.parse import urlparse, parse_qs
+
+SUB_BITS = 7                            # Histogram precision: 2**(SUB_BITS-1) buckets per power of two
+SUB_COUNT = 1 << SUB_BITS
+QUANTILES = (50, 90, 99, 99.9)          # Percentiles shown for every histogram
+PROFILE_INTERVAL = 0.005                # Seconds between profiler samples
+PROFILE_TOP = 40                        # Functions listed in the profile report
+
+
+class Counter:
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def get(self):
+        return self.value
+
+
+# A value that is set, or read from a function when the metrics are collected
+class Gauge:
+    def __init__(self, name, fn=None, help=""):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:               # A broken gauge must not break the endpoint
+            return None
+
+
+# Latency histogram in whole units (microseconds unless the name says otherwise)
+class Histogram:
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self.buckets = {}               # Bucket index -> count (sparse)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        if value < SUB_COUNT:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BITS
+            index = (shift << SUB_BITS) + (value >> shift)
+        buckets = self.buckets
+        buckets[index] = buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # Record the time since started (a time.perf_counter_ns() value) in microseconds
+    def since(self, started):
+        self.record((time.perf_counter_ns() - started) // 1000)
+
+    # with histogram.time(): ...
+    @contextmanager
+    def time(self):
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.since(started)
+
+    # Middle of the bucket an index stands for
+    @staticmethod
+    def _value(index):
+        if index < SUB_COUNT:
+            return index
+        shift, top = index >> SUB_BITS, index & (SUB_COUNT - 1)
+        return (top << shift) + (1 << shift) // 2
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, int(p / 100 * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def get(self):
+        result = {"count": self.count, "sum": self.total, "max": self.max}
+        for p in QUANTILES:
+            result[f"p{p:g}"] = self.percentile(p)
+        return result
+
+
+# Counter plus latency histogram per message type, e.g. match_messages_MOVE / match_handle_us_MOVE
+class PerType:
+    def __init__(self, registry, prefix, names):
+        self.registry = registry
+        self.prefix = prefix
+        self.names = names              # Message type -> name
+        self.counters = {}
+        self.histograms = {}
+
+    # Run handler(msg_type, *args) and observe it
+    def call(self, handler, msg_type, *args):
+        started = time.perf_counter_ns()
+        try:
+            return handler(msg_type, *args)
+        finally:
+            self.observe(msg_type, started)
+
+    def count(self, msg_type):
+        counter = self.counters.get(msg_type)
+        if counter is None:
+            name = self.names.get(msg_type, str(msg_type))
+            counter = self.counters[msg_type] = self.registry.counter(f"{self.prefix}_messages_{name}")
+        counter.value += 1
+
+    # Count a message and record how long handling it took since started (perf_counter_ns)
+    def observe(self, msg_type, started):
+        self.count(msg_type)
+        histogram = self.histograms.get(msg_type)
+        if histogram is None:
+            name = self.names.get(msg_type, str(msg_type))
+            histogram = self.histograms[msg_type] = self.registry.histogram(f"{self.prefix}_handle_us_{name}")
+        histogram.since(started)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}               # Name -> metric, in creation order
+        self.lock = Lock()              # Guards creation only
+
+    def _get(self, cls, name, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = cls(name, *args)
+        return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    # A gauge with fn is read from fn(); registering the same name again replaces the function
+    def gauge(self, name, fn=None, help=""):
+        gauge = self._get(Gauge, name, fn, help)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help=""):
+        return self._get(Histogram, name, help)
+
+    def per_type(self, prefix, names):
+        return PerType(self, prefix, names)
+
+    def snapshot(self):
+        return {name: metric.get() for name, metric in list(self.metrics.items())}
+
+    # Text format: counters and gauges as "name value", histograms as name_count, name_sum, name{quantile=...}.
+    # A value that is missing (empty histogram, broken gauge) is written as NaN, like Prometheus does.
+    def render(self):
+        lines = []
+        for name, metric in list(self.metrics.items()):
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {name} summary")
+                for p in QUANTILES:
+                    lines.append(f'{name}{{quantile="{p / 100:g}"}} {_sample(metric.percentile(p))}')
+                lines.append(f"{name}_count {metric.count}")
+                lines.append(f"{name}_sum {metric.total}")
+                lines.append(f"{name}_max {metric.max}")
+            else:
+                lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'gauge'}")
+                lines.append(f"{name} {_sample(metric.get())}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "metrics": self.snapshot()}, f, indent=2)
+
+
+def _sample(value):
+    return "NaN" if value is None else value
+
+
+# Statistical profiler: a thread that looks at the stacks of all other threads every interval.
+# It costs nothing while stopped and can be switched on and off while the server runs.
+class SamplingProfiler:
+    def __init__(self):
+        self.stacks = Tally()           # Collapsed stack "outer;...;inner" -> samples
+        self.samples = 0
+        self.running = False
+        self.thread = None
+        self.stopping = None            # Event that ends the current run's thread
+        self.interval = PROFILE_INTERVAL
+        self.lock = Lock()              # Start and stop may come from several HTTP threads at once
+
+    def start(self, interval=PROFILE_INTERVAL):
+        with self.lock:
+            if self.running:
+                return False
+            if self.thread is not None:
+                self.thread.join()      # The previous run's thread wakes up at stop(), so this is quick
+            self.stacks.clear()
+            self.samples = 0
+            self.interval = interval
+            self.running = True
+            self.stopping = Event()
+            self.thread = Thread(target=self._run, args=(self.stopping,), name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            if self.stopping is not None:
+                self.stopping.set()
+            return self.samples
+
+    def _run(self, stopping):
+        me = get_ident()
+        while not stopping.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+            stopping.wait(self.interval)
+
+    # Functions by samples on top of the stack (self) and anywhere on it (total)
+    def report(self, top=PROFILE_TOP):
+        own = Tally()
+        total = Tally()
+        for stack, n in self.stacks.items():
+            names = stack.split(";")
+            own[names[-1]] += n
+            for name in set(names):
+                total[name] += n
+        state = "running" if self.running else "stopped"
+        lines = [f"profiler {state}, {self.samples} samples every {self.interval * 1000:g} ms", "",
+                 "   self  total  function"]
+        for name, n in own.most_common(top):
+            lines.append(f"{n:7d} {total[name]:6d}  {name}")
+        return "\n".join(lines) + "\n"
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+REGISTRY = Registry()
+PROFILER = SamplingProfiler()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+gauge("process_threads", active_count, "live threads in this process")
+
+
+# Decorator: record every call's duration in microseconds in the histogram name
+def timed(name):
+    histogram = REGISTRY.histogram(name)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.since(started)
+        return wrapper
+    return decorate
+
+
+# Body of the endpoint at url, or None for an unknown path; ValueError for a bad query
+def _respond(url):
+    query = parse_qs(url.query)
+    if url.path == "/metrics":
+        return REGISTRY.render()
+    elif url.path == "/metrics.json":
+        return json.dumps(REGISTRY.snapshot(), indent=2)
+    elif url.path == "/profile/start":
+        interval = float(query.get("interval", [PROFILE_INTERVAL])[0])
+        if not (math.isfinite(interval) and interval > 0):
+            raise ValueError(f"interval must be a positive number of seconds, not {interval}")
+        return "started\n" if PROFILER.start(interval) else "already running\n"
+    elif url.path == "/profile/stop":
+        return f"stopped after {PROFILER.stop()} samples\n"
+    elif url.path == "/profile":
+        return PROFILER.report(int(query.get("top", [PROFILE_TOP])[0]))
+    elif url.path == "/profile/stacks":
+        return PROFILER.collapsed()
+    return None
+
+
+# Serve the endpoint from a background thread; returns the HTTP server (its port is server_address[1]).
+# http.server is imported only here: it takes longer to import than everything else a client needs.
+def serve(port, host="127.0.0.1"):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                body = _respond(url)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json" if url.path.endswith(".json") else "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):      # Keep scrapes out of the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# Write all metrics to path as JSON when the process exits
+def dump_on_exit(path):
+    atexit.register(REGISTRY.dump, path)
@@ -0,0 +1,159 @@
+# Wire protocol shared by the Tk peers and the headless match server
+#
+# Every message is one frame:  [length: 2 bytes][type: 1 byte][payload]
+# The length counts the type byte plus the payload (big-endian). Moves carry the
+# cell index as 2 bytes, text messages (names, chat) carry UTF-8, the rest carry nothing.
+# A MOVE therefore costs 5 bytes on the wire instead of a separate recv() per command.
+import struct                           # For packing binary headers
+from threading import Lock              # For sharing one sender between the GUI and network threads
+from contextlib import contextmanager
+from collections import deque
+
+# Message types
+NAME = 1
+MOVE = 2
+CHAT = 3
+RESET = 4
+WINNER = 5
+DRAW = 6
+TIMEOUT = 7
+START = 8                               # Payload is the symbol ("X" or "O") the player was given
+WAIT = 9                                # Waiting for an opponent
+INVALID = 10                            # The last move was rejected
+LEFT = 11                               # The opponent disconnected (sent by a client: it is leaving for good)
+WATCH = 12                              # Spectate a match; payload is the match id ("" = the newest match)
+SNAPSHOT = 13                           # Match state sent to a spectator before the live updates (JSON text)
+RATING = 14                             # Optional, before NAME: the rating to be matched on (text)
+EXPIRED = 15                            # Nobody to play against in time; the server closes the connection
+TOKEN = 16                              # Session token for reconnecting (see session.py)
+RESUME = 17                             # Reconnect: "<token> <game> <moves seen>"
+RESYNC = 18                             # Answer to RESUME: the moves the player missed
+
+# Message names for logs and metrics
+NAMES = {NAME: "NAME", MOVE: "MOVE", CHAT: "CHAT", RESET: "RESET", WINNER: "WINNER", DRAW: "DRAW",
+         TIMEOUT: "TIMEOUT", START: "START", WAIT: "WAIT", INVALID: "INVALID", LEFT: "LEFT", WATCH: "WATCH",
+         SNAPSHOT: "SNAPSHOT", RATING: "RATING", EXPIRED: "EXPIRED", TOKEN: "TOKEN", RESUME: "RESUME",
+         RESYNC: "RESYNC"}
+
+# Messages whose payload is text
+TEXT_TYPES = {NAME, CHAT, WINNER, TIMEOUT, START, WATCH, SNAPSHOT, RATING, TOKEN, RESUME, RESYNC}
+
+HEADER = struct.Struct("!HB")           # Length + type
+CELL = struct.Struct("!H")              # Move payload
+MAX_FRAME = 4096                        # Longest frame we accept (protects against garbage lengths)
+MAX_TEXT = MAX_FRAME - HEADER.size      # Longest text payload in bytes
+
+
+# Raised when the peer sends something that is not a valid frame
+class ProtocolError(Exception):
+    pass
+
+
+# Build one frame from a message type and an optional value (int for MOVE, str for text)
+def encode(msg_type, value=None):
+    if msg_type == MOVE:
+        payload = CELL.pack(value)
+    elif msg_type in TEXT_TYPES:
+        payload = (value or "").encode()[:MAX_TEXT]
+    else:
+        payload = b""
+    return HEADER.pack(len(payload) + 1, msg_type) + payload
+
+
+# Turn a frame body back into (type, value)
+def decode_body(msg_type, payload):
+    if msg_type == MOVE:
+        if len(payload) != CELL.size:
+            raise ProtocolError("bad MOVE payload")
+        return msg_type, CELL.unpack(payload)[0]
+    if msg_type in TEXT_TYPES:
+        return msg_type, payload.decode(errors="replace")
+    return msg_type, None
+
+
+# Streaming decoder: feed it whatever recv() returned and get back every complete message.
+# Partial frames stay buffered until the rest arrives, merged frames are split apart.
+class FrameDecoder:
+    def __init__(self, max_frame=MAX_FRAME):
+        self.buffer = bytearray()
+        self.max_frame = max_frame
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        messages = []
+        pos = 0
+        end = len(buf)
+        while end - pos >= HEADER.size:
+            length, msg_type = HEADER.unpack_from(buf, pos)
+            if length == 0 or length > self.max_frame:
+                raise ProtocolError(f"bad frame length {length}")
+            if end - pos < 2 + length:  # The rest of the frame has not arrived yet
+                break
+            start = pos + HEADER.size
+            pos += 2 + length
+            messages.append(decode_body(msg_type, bytes(buf[start:pos])))
+        if pos:
+            del buf[:pos]               # Drop everything that was consumed in one go
+        return messages
+
+
+# Coalescing sender for blocking sockets: frames sent inside a batch() go out in one sendall.
+# Once the connection fails, further frames are dropped instead of raising in the GUI thread;
+# the reconnect (RESUME/RESYNC) recovers the moves.
+class FrameWriter:
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = bytearray()
+        self.depth = 0                  # How many batch() blocks we are inside
+        self.lock = Lock()
+        self.broken = False             # Set when a send failed
+
+    # Queue a message, sending it right away unless a batch is open
+    def send(self, msg_type, value=None):
+        with self.lock:
+            self.pending += encode(msg_type, value)
+            if self.depth == 0:
+                self._flush()
+
+    # Group several sends (e.g. a MOVE and the WINNER it caused) into a single syscall
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            self.depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.depth -= 1
+                if self.depth == 0:
+                    self._flush()
+
+    def _flush(self):
+        if self.pending:
+            data = bytes(self.pending)
+            self.pending.clear()
+            if self.broken:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.broken = True
+
+
+# Blocking reader for the Tk peers: wraps a socket and hands out one message at a time
+class FrameReader:
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.backlog = deque()          # Messages decoded but not handed out yet
+
+    # Block until one complete message arrives
+    def recv(self):
+        while not self.backlog:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("connection closed")
+            self.backlog.extend(self.decoder.feed(data))
+        return self.backlog.popleft()
+
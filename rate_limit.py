@@ -0,0 +1,87 @@
+# Chat flood control for the hosts (match_server.py and the Tk host)
+# Each connection gets a token bucket: CHAT_RATE messages a second on average, bursts of up to CHAT_BURST.
+# Chat sent faster than that is not passed on one message at a time: it is held back and goes out as one
+# coalesced CHAT (the lines joined by newlines) as soon as the bucket has a token again. What a connection
+# may hold is capped at HELD_BYTES, and anything beyond that is dropped. A flooding peer therefore costs
+# the other side at most CHAT_RATE small frames a second, and the host a few kilobytes of memory, while
+# moves are never held back.
+import metrics
+
+CHAT_RATE = 5                           # Chat messages a connection may send per second, on average
+CHAT_BURST = 10                         # Messages it may send at once before the rate applies
+HELD_BYTES = 2048                       # Most chat text held back per connection (fits one frame)
+
+held_count = metrics.counter("chat_held", "chat messages held back by flood control and sent coalesced")
+dropped_count = metrics.counter("chat_dropped", "chat messages dropped by flood control")
+
+
+# Classic token bucket; now is any monotonic clock in seconds (time.monotonic(), loop.time())
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def _refill(self, now):
+        if now > self.stamp:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    # Take one token if there is one
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    # Seconds until the next token
+    def wait(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+# The chat of one connection. Not thread-safe: the Tk host guards it with a lock.
+#   text = gate.offer(value, now)     the text to pass on now, or None if it was held back or dropped
+#   delay = gate.due(now)             after a None: seconds until release() should be called, or None
+#                                     if a release is already scheduled
+#   text = gate.release(now)          everything held, joined, or None; then ask due() again
+class ChatGate:
+    __slots__ = ("bucket", "held", "held_bytes", "max_held", "scheduled")
+
+    def __init__(self, rate=CHAT_RATE, burst=CHAT_BURST, max_held=HELD_BYTES, now=0.0):
+        self.bucket = TokenBucket(rate, burst, now)
+        self.held = []
+        self.held_bytes = 0
+        self.max_held = max_held
+        self.scheduled = False          # A release() is due
+
+    def offer(self, text, now):
+        if not self.held and self.bucket.take(now):
+            return text
+        size = len(text.encode()) + 1   # + the newline joining it to the others
+        if self.held_bytes + size > self.max_held:
+            dropped_count.inc()
+            return None
+        self.held.append(text)
+        self.held_bytes += size
+        held_count.inc()
+        return None
+
+    def due(self, now):
+        if not self.held or self.scheduled:
+            return None
+        self.scheduled = True
+        return self.bucket.wait(now)
+
+    def release(self, now):
+        self.scheduled = False
+        if not self.held or not self.bucket.take(now):
+            return None
+        text = "\n".join(self.held)
+        self.held.clear()
+        self.held_bytes = 0
+        return text
@@ -0,0 +1,125 @@
+# One timer scheduler per process: every turn deadline and game clock is an entry in a heap
+# that a single thread sleeps on, instead of one sleeping thread per timer.
+# The thread waits exactly until the earliest deadline, so timers fire with millisecond
+# precision and an idle process does not wake up at all. Arming and cancelling are cheap:
+# cancelled entries are skipped when they reach the top and purged when they pile up.
+import heapq
+import itertools
+import time
+import traceback
+from threading import Thread, Condition, Lock
+import metrics
+
+
+# A scheduled callback; keep it to cancel the timer later
+class Timer:
+    __slots__ = ("deadline", "interval", "callback", "args", "cancelled", "scheduler")
+
+    def __init__(self, scheduler, deadline, interval, callback, args):
+        self.scheduler = scheduler
+        self.deadline = deadline        # time.monotonic() value at which the callback runs
+        self.interval = interval        # Seconds between runs for repeating timers, None for one-shot
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self.scheduler._cancelled_one()
+
+
+# The Scheduler owns the heap and the thread that fires due timers
+class Scheduler:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.heap = []                  # (deadline, sequence, timer)
+        self.sequence = itertools.count()   # Keeps timers with the same deadline in arming order
+        self.cancelled = 0              # Cancelled timers still sitting in the heap
+        self.condition = Condition()
+        self.thread = None
+
+    # Run callback(*args) once, delay seconds from now
+    def call_later(self, delay, callback, *args):
+        return self._push(Timer(self, self.clock() + delay, None, callback, args))
+
+    # Run callback(*args) every interval seconds until the timer is cancelled
+    def call_every(self, interval, callback, *args):
+        return self._push(Timer(self, self.clock() + interval, interval, callback, args))
+
+    # Number of timers that are armed and not cancelled
+    def pending(self):
+        with self.condition:
+            return len(self.heap) - self.cancelled
+
+    def _push(self, timer):
+        with self.condition:
+            heapq.heappush(self.heap, (timer.deadline, next(self.sequence), timer))
+            if self.heap[0][2] is timer:        # New earliest deadline: wake the thread to re-plan its sleep
+                self.condition.notify()
+        return timer
+
+    def _cancelled_one(self):
+        with self.condition:
+            self.cancelled += 1
+            if self.cancelled > 64 and self.cancelled * 2 > len(self.heap):
+                self.heap = [entry for entry in self.heap if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled = 0
+
+    # Fire every timer that is due; return the seconds until the next one (None if there is none)
+    def run_due(self):
+        while True:
+            with self.condition:
+                now = self.clock()
+                while self.heap and self.heap[0][2].cancelled:
+                    heapq.heappop(self.heap)
+                    self.cancelled -= 1
+                if not self.heap:
+                    return None
+                deadline, _, timer = self.heap[0]
+                if deadline > now:
+                    return deadline - now
+                heapq.heappop(self.heap)
+                if timer.interval is not None:  # Re-arm repeating timers from their own deadline (no drift)
+                    timer.deadline = max(deadline + timer.interval, now)
+                    heapq.heappush(self.heap, (timer.deadline, next(self.sequence), timer))
+                else:
+                    timer.cancelled = True      # Fired: a later cancel() has nothing to remove
+            try:
+                timer.callback(*timer.args)
+            except Exception:           # A failing callback must not stop every other timer
+                traceback.print_exc()
+
+    # Start the timer thread (safe to call more than once)
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="scheduler", daemon=True)
+                self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self.run_due()
+            with self.condition:
+                wait = None             # Nothing armed: sleep until a timer is pushed
+                if self.heap:           # Re-read the top: timers may have been armed while callbacks ran
+                    wait = self.heap[0][0] - self.clock()
+                    if wait <= 0:
+                        continue
+                self.condition.wait(wait)
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+
+# The process-wide scheduler, started on first use
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler().start()
+            metrics.gauge("scheduler_pending_timers", _scheduler.pending, "timers waiting on the scheduler thread")
+    return _scheduler
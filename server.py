@@ -1,42 +1,124 @@
 # Importing required libraries
 import socket                           # For network communication
-import tkinter as tk                    # For creating the graphical user interface (GUI)
-from tkinter import simpledialog        # For showing simple input dialog boxes
-from threading import Thread            # For handling multiple threads (e.g., receiving data while playing)
+import sys                              # For reading command line arguments
+import argparse                         # For the --host/--port/--bot options
+from threading import Event, Lock, Thread   # For handling multiple threads (e.g., receiving data while playing)
 import time                             # For handling time-related operations
-from datetime import datetime           # For working with date and time
+import math                             # For rounding the time left up to whole seconds
+import uuid                             # For giving every game an id in the event log
+from game import TicTacToeGame          # Shared board, turn and win logic
+from scheduler import get_scheduler     # One timer thread for every turn deadline and clock
+from ui_pump import UIPump              # Runs widget updates from other threads on the Tk thread
+from event_log import EventLog          # Background writer for the chat and game event log
+from chat_view import ChatView          # Chat widget kept to a fixed number of lines, older ones paged back from the log
+from rate_limit import ChatGate         # Token bucket and coalescing for the client's chat
+from history import MatchHistory        # Finished games in SQLite, written by its own thread
+from leaderboard import Leaderboard     # Elo ratings of everyone who played here
+from protocol import FrameReader, FrameWriter, ProtocolError, NAME, MOVE, CHAT, RESET, WINNER, DRAW, TIMEOUT, TOKEN, RESUME, RESYNC   # Framed wire protocol
+from session import new_token, parse_resume, resync_payload, RESUME_WINDOW     # Reconnecting a dropped client
+import metrics                          # Counters and latency histograms (--metrics-port)
+import protocol
 
 # Define host and port for the server
-HOST = '127.0.0.1'                      # Localhost, meaning this will run only on this machine
-PORT = 5000                             # Port number to listen for incoming connections
+HOST = '127.0.0.1'                      # Default address: localhost, meaning only this machine (--host)
+PORT = 5000                             # Default port to listen for incoming connections (--port)
+TURN_TIME = 60                          # Default seconds each player has for a move
+EVENT_LOG_PATH = "server_events.log"    # Chat and game events of this player (one JSON object per line)
+HISTORY_PATH = "match_history.db"       # Every finished game (python3 history.py --player <name>)
+LEADERBOARD_PATH = "leaderboard.json"   # Checkpoint of the Elo ratings (python3 leaderboard.py)
+tk = None                               # tkinter (GUI) and its dialogs, imported when the window is opened
+simpledialog = None
+
+# Import tkinter only for the GUI, so --headless starts quickly and runs without a display
+def load_tk():
+    global tk, simpledialog
+    import tkinter as tk
+    from tkinter import simpledialog
 
 # The TicTacToeServer class handles all the server-side logic
 class TicTacToeServer:
-    def __init__(self):                 # Initialize the server and set up GUI
+    def __init__(self, turn_time=TURN_TIME, bot=False, host=HOST, port=PORT, name=None):  # Initialize the server and set up GUI (bot: play the built-in AI)
+        self.turn_time = turn_time                  # Seconds allowed per move
+        self.scheduler = get_scheduler()            # Drives the turn deadline and the clocks
+        self.turn_timer = None                      # Pending turn deadline on the scheduler
+        self.turn_deadline = None                   # time.monotonic() at which the current turn expires
+        self.clock_timer = None                     # Once-a-second clock refresh on the scheduler
+        self.ready = Event()                        # The window is up and the player has a name
+        self.history = None                         # Match history and ratings, opened by the network thread
+        self.leaderboard = None
+        self.chat_gate = ChatGate()                 # Flood control for the client's chat (network and scheduler threads)
+        self.chat_lock = Lock()
+
+        # Set up the socket for network communication; the client is accepted while the window is built
+        if bot:                                                                 # Single player: the AI sits on the other end of a socket pair
+            import ai
+            self.sock = None                                                    # Nothing to reconnect to
+            self.conn, bot_end = socket.socketpair()
+            ai.BotPeer(bot_end, "O", move_time=min(ai.MOVE_TIME, turn_time / 2)).start()
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)       # Create a TCP socket
+            self.sock.bind((host, port))                                        # Bind the socket to the address (host, port)
+            self.sock.listen(1)                                                 # Allow the server to listen for 1 incoming connection
+        Thread(target=self.start_session, daemon=True).start()
+
         # Initialize tkinter window
+        load_tk()
         self.window = tk.Tk()
         self.window.title("Server - Tic Tac Toe (X)")                               # Set the window title
-        self.player_name = simpledialog.askstring("Name", "Enter your name:")       # Ask the server player for their name
+        self.player_name = name or simpledialog.askstring("Name", "Enter your name:")   # Ask the server player for their name
         self.client_name = "Client"                                                 # Set default name for client
+        self.game = TicTacToeGame()                                                 # Board, turn and win logic (no GUI)
         self.create_widgets()                                                       # Create the game board and UI elements
+        self.ui = UIPump(self.window)                                               # Other threads post widget updates here
+        self.messages = metrics.REGISTRY.per_type("server", protocol.NAMES)         # Count and time received messages by type
+        self.games = 0                                                              # Games started, counted like the client does (for resume)
+        self.token = new_token()                                                    # The client must show this to take its seat back
 
-        # Set up the socket for network communication
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)           # Create a TCP socket
-        self.sock.bind((HOST, PORT))                                            # Bind the socket to the address (host, port)
-        self.sock.listen(1)                                                     # Allow the server to listen for 1 incoming connection
-        self.conn, _ = self.sock.accept()                                       # Accept the incoming connection and create a new socket connection
-        self.conn.sendall(f"NAME {self.player_name}".encode())                  # Send the player's name to the client
+        # Set up the chat and game event log (written by its own thread)
+        self.events = EventLog(EVENT_LOG_PATH)
+        self.chat = ChatView(self.chat_log, self.ui, EVENT_LOG_PATH, self.player_name, self.older_button)
+        if self.sock is not None:
+            self.window.title(f"Server - Tic Tac Toe (X) - waiting for a player on port {port}")
+        self.status.config(text="Waiting for a player to join", fg="red")
+        for btn in self.buttons:                    # Nothing to play until the client is here
+            btn.config(state="disabled")
+        self.ready.set()                            # The network thread may greet the client now
 
-        self.client_name = self.conn.recv(1024).decode().split("NAME ")[-1]     # Receive the client's name
+        self.window.mainloop()                      # Start the tkinter event loop to run the GUI
+        self.events.close()                         # Write out any events still queued
+        if self.history is not None:
+            self.history.close()                    # Store any games still queued
+        if self.leaderboard is not None:
+            self.leaderboard.checkpoint(LEADERBOARD_PATH)   # Save the ratings for the next start
 
-        # Set up the chat log file
-        self.chat_log_path = "chatlog.txt"
-        self.reset_game()                           # Reset the game to the initial state
-        self.start_game_timer()                     # Start the game timer
-        # Start the thread to handle incoming data from the client
-        Thread(target=self.receive_data).start()
+    # Runs on the network thread: open the history, accept the client and exchange names, then receive
+    def start_session(self):
+        self.history = MatchHistory(HISTORY_PATH)   # The host records the games of both players
+        self.leaderboard = Leaderboard.load(LEADERBOARD_PATH, HISTORY_PATH)    # Checkpoint plus any games stored after it
+        if self.sock is not None:
+            self.conn, _ = self.sock.accept()                                   # Accept the incoming connection and create a new socket connection
+        self.ready.wait()                                                       # We need our name before we can greet the client
+        self.reader = FrameReader(self.conn)                                    # Splits the byte stream back into messages
+        self.writer = FrameWriter(self.conn)                                    # Frames outgoing messages and batches them
+        self.writer.send(NAME, self.player_name)                                # Send the player's name to the client
+        try:
+            msg_type, name = self.reader.recv()                                 # Receive the client's name
+        except (ConnectionError, OSError, ProtocolError):
+            self.ui.post(self.window.title, "Server - Tic Tac Toe (X) - the client left before the game started")
+            return
+        if msg_type == NAME:
+            self.client_name = name
+        if self.sock is not None:
+            self.writer.send(TOKEN, self.token)                                 # Lets the client resume after a dropped connection
+        self.ui.post(self.begin)
+        self.receive_data()                                                     # Handle incoming data from the client
 
-        self.window.mainloop()                      # Start the tkinter event loop to run the GUI
+    # The client is here: start the first game (runs on the Tk thread)
+    def begin(self):
+        self.window.title("Server - Tic Tac Toe (X)")
+        self.send_button.config(state="normal")
+        self.reset_button.config(state="normal")
+        self.reset_game()                           # Reset the game to the initial state (also starts the game timer)
 
     def create_widgets(self):                       # Create the widgets for the GUI
         self.window.configure(bg="#f0f0f0")         # Set the background color of the window
@@ -56,13 +138,17 @@ class TicTacToeServer:
         self.status.pack()                                          # Add the status label to the window
 
         # Create a label to show the remaining time
-        self.timer_label = tk.Label(self.window, text="Time left: 60", font=("Arial", 12), bg="#f0f0f0")
+        self.timer_label = tk.Label(self.window, text=f"Time left: {math.ceil(self.turn_time)}", font=("Arial", 12), bg="#f0f0f0")
         self.timer_label.pack()                                     # Add the timer label to the window
 
         # Create a label to show the total game time elapsed
         self.game_time_label = tk.Label(self.window, text="Game time: 0s", font=("Arial", 12), bg="#f0f0f0")
         self.game_time_label.pack()                                 # Add the game time label to the window
 
+        # Create a button that brings back older chat lines (the chat log keeps only the newest)
+        self.older_button = tk.Button(self.window, text="Older messages", command=lambda: self.chat.older(), state="disabled")
+        self.older_button.pack()
+
         # Create a chat log area to display messages between the server and client
         self.chat_log = tk.Text(self.window, height=10, width=50, state='disabled', bg="#e6f2ff")
         self.chat_log.pack(pady=5)                                  # Add the chat log area to the window
@@ -71,139 +157,259 @@ class TicTacToeServer:
         self.chat_entry = tk.Entry(self.window, width=40)
         self.chat_entry.pack(side=tk.LEFT, padx=5)
         # Create a button to send messages
-        self.send_button = tk.Button(self.window, text="Send Msg", command=self.send_chat)
+        self.send_button = tk.Button(self.window, text="Send Msg", command=self.send_chat, state="disabled")
         self.send_button.pack(side=tk.LEFT)                         # Add the send button to the window
 
         # Create a reset button to restart the game
-        self.reset_button = tk.Button(self.window, text="Reset Game", command=self.send_reset)
+        self.reset_button = tk.Button(self.window, text="Reset Game", command=self.send_reset, state="disabled")
         self.reset_button.pack(pady=5)                              # Add the reset button to the window
 
     # Reset the game to the initial state
-        self.timer_thread = None  # NEW: Thread reference for timer
-        self.timer_running = False  # NEW: Control flag for timer
-
     def reset_game(self):  
-        self.board = [""] * 9                   # Initialize the game board with empty spaces
+        self.game.reset()                       # Initialize the game board with empty spaces
+        self.games += 1                         # Number of this game (the move log of a resume refers to it)
         self.turn = True                        # Set the server (X) to start the game
-        self.time_left = 60                     # Set the initial time to 60 seconds
         self.game_start_time = time.time()      # Record the game start time
+        self.game_id = uuid.uuid4().hex[:8]     # Id of this game in the event log
+        self.log_event("start", player=self.player_name, opponent=self.client_name)
         self.stop_timers = False                # Flag to stop the timers when the game ends
         # Reset the buttons to be enabled and empty
         for btn in self.buttons:
             btn.config(text="", state="normal")
         self.status.config(text="Your turn", fg="blue")     # Set the status to indicate it's the server's turn
-        self.chat_log.config(state='normal')                # Enable chat log for clearing
-        self.chat_log.delete("1.0", tk.END)                 # Clear the chat log
-        self.chat_log.config(state='disabled')              # Disable chat log to prevent editing
+        self.chat.clear(self.game_id)                       # Clear the chat log
 
         # Start the turn timer only for your turn
         if self.turn:
-            self.timer_running = True
-            self.timer_thread = Thread(target=self.start_turn_timer)
-            self.timer_thread.start()
+            self.start_turn_timer()
         # Start the game timer
         self.start_game_timer()
 
     # Handle the player's move
+    @metrics.timed("server_make_move_us")
     def make_move(self, i):                                     
-        if self.turn and self.board[i] == "":                                   # If it's the player's turn and the spot is empty
-            self.board[i] = "X"                                                 # Mark the spot with an X
+        if self.turn and self.game.is_valid_move(i, "X"):                       # If it's the player's turn and the spot is empty
+            self.game.play(i, "X")                                              # Mark the spot with an X
             self.buttons[i].config(text="X", state="disabled")                  # Disable the button to prevent further clicks
-            self.conn.sendall(f"MOVE {i}".encode())                             # Send the move to the client
-            self.turn = False                                                   # It's now the client's turn
-            self.timer_running = False                                      # Stop timer after move
-            self.status.config(text="Waiting for opponent move", fg="red")      # Update the status
-            self.check_winner("X")                                              # Check if the server (X) has won
+            with self.writer.batch():                                           # Send the move and any result in one packet
+                self.writer.send(MOVE, i)                                       # Send the move to the client
+                self.log_event("move", symbol="X", cell=i)                      # Record the move
+                self.turn = False                                               # It's now the client's turn
+                self.stop_turn_timer()                                          # Stop timer after move
+                self.status.config(text="Waiting for opponent move", fg="red")  # Update the status
+                self.check_winner("X")                                          # Check if the server (X) has won
 
      # Continuously receive data from the client
     def receive_data(self): 
         while True:
             try:
-                data = self.conn.recv(1024).decode()                    # Receive data from the client
-                if data.startswith("MOVE"):                             # If the message is a move
-                    i = int(data.split()[1])                            # Extract the move index
-                    self.board[i] = "O"                                 # Mark the spot with an O
-                    self.buttons[i].config(text="O", state="disabled")  # Disable the button
-                    self.turn = True                                    # It's now the server's turn
-                    self.timer_running = True                             # Start timer
-                    self.timer_thread = Thread(target=self.start_turn_timer)
-                    self.timer_thread.start()
-                    self.status.config(text="Your turn", fg="blue")     # Update the status
-                    self.check_winner("O")                              # Check if the client (O) has won
-                    self.time_left = 60                                 # Reset the time for the next turn
-                elif data.startswith("CHAT"):                           # If the message is a chat message
-                    msg = data[5:]                                      # Extract the chat message
-                    self.append_chat(f"{self.client_name}: {msg}")      # Append the client's message to the chat log
-                elif data.startswith("RESET"):                          # If the message is a reset command
-                    self.reset_game()                                   # Reset the game
-                elif data.startswith("NAME"):                           # If the message contains the client's name
-                    self.client_name = data[5:]                         # Update the client's name
-            except:
-                break                                                   # Break out of the loop if there is an error (e.g., connection lost)
+                msg_type, value = self.reader.recv()                    # Wait for the next complete message from the client
+            except (ConnectionError, OSError, ProtocolError):           # Connection lost: keep the game and wait for the client
+                if not self.wait_for_resume():
+                    break                                               # It did not come back in time
+                continue
+            if msg_type == CHAT:
+                value = self.admit_chat(value)                          # Flood control: None if held back for later
+                if value is None:
+                    continue
+            self.ui.post(self.messages.call, self.handle_message, msg_type, value)          # Apply it on the Tk thread, never from this one
+
+    # The client's chat text to show now, or None if it came too fast and is held back (runs on the receiver thread).
+    # Held lines are shown together, as one message, once the client's token bucket allows it.
+    def admit_chat(self, text):
+        with self.chat_lock:
+            now = time.monotonic()
+            text = self.chat_gate.offer(text, now)
+            delay = self.chat_gate.due(now) if text is None else None
+        if delay is not None:
+            self.scheduler.call_later(delay, self.release_chat)
+        return text
+
+    # Posted by the scheduler when the held chat may go out
+    def release_chat(self):
+        with self.chat_lock:
+            now = time.monotonic()
+            text = self.chat_gate.release(now)
+            delay = self.chat_gate.due(now)
+        if text is not None:
+            self.ui.post(self.messages.call, self.handle_message, CHAT, text)
+        if delay is not None:
+            self.scheduler.call_later(delay, self.release_chat)
+
+    # Accept reconnects until one shows our session token or RESUME_WINDOW runs out (runs on the receiver thread)
+    def wait_for_resume(self):
+        if self.sock is None:                                           # Game against the built-in AI
+            return False
+        self.ui.post(self.window.title, f"Server - Tic Tac Toe (X) - {self.client_name} disconnected, waiting...")
+        self.log_event("disconnect", player=self.client_name)
+        deadline = time.monotonic() + RESUME_WINDOW
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            self.sock.settimeout(left)
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:                                             # Includes the timeout
+                break
+            reader = FrameReader(conn)
+            try:
+                conn.settimeout(5)                                      # The RESUME must come right away
+                msg_type, value = reader.recv()
+                token, game, seen = parse_resume(value) if msg_type == RESUME else (None, 0, 0)
+                conn.settimeout(None)
+            except (ConnectionError, OSError, ProtocolError):
+                token = None
+            if token != self.token:                                     # Not our client
+                conn.close()
+                continue
+            self.conn = conn
+            self.reader = reader
+            self.writer = FrameWriter(conn)
+            self.ui.post(self.resume_session, game, seen)
+            return True
+        self.ui.post(self.window.title, f"Server - Tic Tac Toe (X) - {self.client_name} left")
+        return False
+
+    # Send the returning client what it missed (runs on the Tk thread)
+    def resume_session(self, game, seen):
+        self.writer.send(RESYNC, resync_payload(self.games, self.game, game, seen))
+        self.window.title("Server - Tic Tac Toe (X)")
+        self.log_event("resume", player=self.client_name, seen=seen)
+
+    def handle_message(self, msg_type, value):                          # Apply one message from the client (runs on the Tk thread)
+        if msg_type == MOVE:                                            # If the message is a move
+            i = value                                                   # Extract the move index
+            if not self.game.is_valid_move(i, "O"):                     # Ignore moves the rules do not allow
+                return
+            self.game.play(i, "O")                                      # Mark the spot with an O
+            self.log_event("move", symbol="O", cell=i)                  # Record the move
+            self.buttons[i].config(text="O", state="disabled")          # Disable the button
+            self.turn = True                                            # It's now the server's turn
+            self.start_turn_timer()                                     # Start timer
+            self.status.config(text="Your turn", fg="blue")             # Update the status
+            self.check_winner("O")                                      # Check if the client (O) has won
+        elif msg_type == CHAT:                                          # If the message is a chat message
+            msg = value                                                 # Extract the chat message
+            self.log_event("chat", sender=self.client_name, text=msg)   # Record the message once, as it arrives
+            self.append_chat(f"{self.client_name}: {msg}")              # Append the client's message to the chat log
+        elif msg_type == RESET:                                         # If the message is a reset command
+            self.log_event("reset", by=self.client_name)                # Record who reset the game
+            self.reset_game()                                           # Reset the game
+        elif msg_type == TIMEOUT:                                       # The client ran out of time
+            if not self.stop_timers:
+                self.stop_turn_timer()
+                self.status.config(text=f"{self.player_name} wins! ({value} timed out)", fg="orange")
+                for btn in self.buttons:                                # Disable all buttons
+                    btn.config(state="disabled")
+                self.stop_timers = True                                 # Stop the timers
+                self.log_event("timeout", loser=value)                  # Record the result
+                self.record_result("X", "timeout")
+        elif msg_type == NAME:                                          # If the message contains the client's name
+            self.client_name = value                                    # Update the client's name
 
+    @metrics.timed("server_check_winner_us")
     def check_winner(self, symbol):                                     # Check if the current player (X or O) has won
-        wins = [(0, 1, 2), (3, 4, 5), (6, 7, 8),(0, 3, 6), (1, 4, 7), (2, 5, 8),(0, 4, 8), (2, 4, 6)]       # List of all possible winning combinations
-        for a, b, c in wins:
-            if self.board[a] == self.board[b] == self.board[c] == symbol:           # If any combination is a win
-                winner = self.player_name if symbol == "X" else self.client_name    # Determine the winner
-                self.status.config(text=f"{winner} wins!", fg="green")              # Update the status to show the winner
-                self.conn.sendall(f"WINNER {winner}".encode())                      # Notify the client of the winner
-                for btn in self.buttons:
-                    btn.config(state="disabled")                                    # Disable all buttons since the game is over
-                self.stop_timers = True                                             # Stop the timers
-                self.save_chat()                                                    # Save the chat log
-                return                                                              # End the function
-        if "" not in self.board:                                                    # If there are no empty spots, it's a draw
+        if self.game.winner == symbol:                                              # If the last move completed a line
+            winner = self.player_name if symbol == "X" else self.client_name        # Determine the winner
+            self.status.config(text=f"{winner} wins!", fg="green")                  # Update the status to show the winner
+            self.writer.send(WINNER, winner)                                        # Notify the client of the winner
+            for btn in self.buttons:
+                btn.config(state="disabled")                                        # Disable all buttons since the game is over
+            self.stop_timers = True                                                 # Stop the timers
+            self.log_event("win", winner=winner)                                    # Record the result
+            self.record_result(symbol, "line")
+            return                                                                  # End the function
+        if self.game.is_full():                                                     # If there are no empty spots, it's a draw
             self.status.config(text="Draw!", fg="purple")                           # Update the status to show it's a draw
-            self.conn.sendall("DRAW".encode())                                      # Notify the client of the draw
+            self.writer.send(DRAW)                                                  # Notify the client of the draw
             self.stop_timers = True                                                 # Stop the timers
-            self.save_chat()                                                        # Save the chat log
+            self.log_event("draw")                                                  # Record the result
+            self.record_result("draw", "full")
 
     def send_chat(self):                                        # Send a chat message to the client
         msg = self.chat_entry.get()                             # Get the message from the chat entry
         if msg:                                                 # If the message is not empty
-            self.conn.sendall(f"CHAT {msg}".encode())           # Send the message to the client
+            self.writer.send(CHAT, msg)                         # Send the message to the client
+            self.log_event("chat", sender=self.player_name, text=msg)   # Record the message once
             self.append_chat(f"You: {msg}")                     # Append the message to the chat log
             self.chat_entry.delete(0, tk.END)                   # Clear the chat entry
 
-    def append_chat(self, msg):                                 # Add a message to the chat log
-        self.chat_log.config(state='normal')                    # Enable chat log for editing
-        self.chat_log.insert(tk.END, msg + "\n")                # Insert the message at the end of the log
-        self.chat_log.config(state='disabled')                  # Disable chat log to prevent further editing
+    def append_chat(self, msg, logged=True):                    # Add a message to the chat log (logged: it is in the event log)
+        self.chat.add(msg, logged)                              # Lines arriving in the same tick are inserted together
 
     def send_reset(self):                               # Send a reset command to the client
-        self.conn.sendall("RESET".encode())             # Notify the client to reset the game
-        self.save_chat()                                # Save the chat log
+        self.writer.send(RESET)                         # Notify the client to reset the game
+        self.log_event("reset", by=self.player_name)    # Record who reset the game
         self.reset_game()                               # Reset the game
 
-    def save_chat(self):                                                                    # Save the chat log to a file
-        with open(self.chat_log_path, "a") as f:                                            # Open the chat log file in append mode
-            f.write(f"\n--- Chat at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")  # Add timestamp
-            chat_text = self.chat_log.get("1.0", tk.END).strip()                            # Get the chat log text
-            f.write(chat_text + "\n")                                                       # Write the chat text to the file
+    def log_event(self, event, **fields):                       # Queue an event for the log writer (never blocks on disk)
+        self.events.log(self.game_id, event, **fields)
+
+    def record_result(self, result, reason):                    # Update the ratings and queue the game for the match history (never blocks on disk)
+        ended = time.time()
+        rating_x, rating_o = self.leaderboard.update(self.player_name, self.client_name, result, ended)
+        self.history.record(self.game_id, self.player_name, self.client_name, self.game, result, reason, self.game_start_time, ended)
+        self.append_chat(f"Ratings: {self.player_name} {rating_x:.0f}, {self.client_name} {rating_o:.0f}", logged=False)
 
     def start_turn_timer(self):                                                 # Start the timer for each player's turn
-        while self.time_left > 0 and not self.stop_timers and self.timer_running:                      # While there's time left and the game is not over
-            self.timer_label.config(text=f"Time left: {self.time_left}")        # Update the timer label
-            time.sleep(1)                                                       # Wait for 1 second
-            self.time_left -= 1                                                 # Decrease the time left
-        if self.time_left == 0 and not self.stop_timers:                        # If time runs out
+        self.stop_turn_timer()                                                  # Replace any deadline still armed
+        self.turn_deadline = time.monotonic() + self.turn_time                  # When the turn runs out
+        self.turn_timer = self.scheduler.call_later(self.turn_time, self.ui.post, self.turn_timed_out)
+        self.timer_label.config(text=f"Time left: {math.ceil(self.turn_time)}") # Show the full time right away
+
+    def stop_turn_timer(self):                                                  # Cancel the pending turn deadline
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        self.turn_deadline = None
+
+    def turn_timed_out(self):                                                   # Posted by the scheduler when the turn expires
+        if self.turn_deadline is None or time.monotonic() < self.turn_deadline:
+            return                                                              # A move was made or the timer re-armed meanwhile
+        self.turn_timer = None
+        self.turn_deadline = None
+        if not self.stop_timers:                                                # If time runs out while the game is on
+            self.timer_label.config(text="Time left: 0")                        # Update the timer label
             self.status.config(text="Time up! You lose.", fg="red")             # Notify the server player that they lose
-            self.conn.sendall(f"TIMEOUT {self.player_name}".encode())           # Notify the client about the timeout
+            self.writer.send(TIMEOUT, self.player_name)                         # Notify the client about the timeout
             self.stop_timers = True                                             # Stop the timers
             for btn in self.buttons:                                            # Disable all buttons
                 btn.config(state="disabled")
-            self.save_chat()                                                    # Save the chat log
+            self.log_event("timeout", loser=self.player_name)                   # Record the result
+            self.record_result("O", "timeout")
 
     def start_game_timer(self):                                                 # Start the overall game timer
-        def update_game_timer():
-            while not self.stop_timers:                                         # While the game is still ongoing
-                elapsed = int(time.time() - self.game_start_time)               # Calculate the elapsed game time
-                self.game_time_label.config(text=f"Game time: {elapsed}s")      # Update the game time label
-                time.sleep(1)                                                   # Wait for 1 second
-        # Start the game timer in a separate thread
-        Thread(target=update_game_timer, daemon=True).start()
+        if self.clock_timer is None:                                            # One repeating timer refreshes both clocks
+            self.clock_timer = self.scheduler.call_every(1, self.ui.post_latest, "clocks", self.update_clocks)
+
+    def update_clocks(self):                                                    # Posted by the scheduler once a second
+        if self.stop_timers:                                                    # The game is over: freeze the clocks
+            return
+        elapsed = int(time.time() - self.game_start_time)                       # Calculate the elapsed game time
+        self.game_time_label.config(text=f"Game time: {elapsed}s")              # Update the game time label
+        deadline = self.turn_deadline
+        if deadline is not None:                                                # Only the player on turn counts down
+            time_left = max(0, math.ceil(deadline - time.monotonic()))
+            self.timer_label.config(text=f"Time left: {time_left}")             # Update the timer label
 
 # Run the server
 if __name__ == "__main__":
-    TicTacToeServer()
+    if "--headless" in sys.argv[1:]:                # Run the asyncio match server without a GUI
+        import match_server
+        match_server.main([arg for arg in sys.argv[1:] if arg != "--headless"])
+    else:
+        parser = argparse.ArgumentParser(description="Tic Tac Toe server (plays X)")
+        parser.add_argument("--name", help="player name (asked in a dialog if not given)")
+        parser.add_argument("--host", default=HOST, help="address to listen on")
+        parser.add_argument("--port", type=int, default=PORT)
+        parser.add_argument("--turn-time", type=float, default=TURN_TIME, help="seconds per move")
+        parser.add_argument("--bot", action="store_true", help="play against the built-in AI instead of a client")
+        parser.add_argument("--metrics-port", type=int, help="serve metrics and the profiler on this local port")
+        parser.add_argument("--metrics-dump", help="write all metrics to this JSON file on exit")
+        args = parser.parse_args()
+        if args.metrics_port is not None:
+            metrics.serve(args.metrics_port)
+        if args.metrics_dump:
+            metrics.dump_on_exit(args.metrics_dump)
+        TicTacToeServer(args.turn_time, args.bot, args.host, args.port, args.name)
@@ -0,0 +1,61 @@
+# Session resume for players whose connection drops
+# When a match starts, each player gets a session TOKEN. A player who loses the connection keeps their
+# seat for RESUME_WINDOW seconds. To reconnect, they send RESUME with the token, the number of the game
+# they were in and how many moves of it they saw. The other side answers with RESYNC. If both are in the
+# same game, RESYNC carries only the moves the player missed. If a reset happened meanwhile, it carries
+# the whole move list of the current game (the snapshot, at most one byte per cell).
+# Either way it is a few bytes; chat history is never resent.
+# The move log is the game's own list of moves, so nothing extra is stored per match.
+import secrets
+from protocol import ProtocolError
+
+RESUME_WINDOW = 60                      # Seconds a dropped player's seat is kept
+RECONNECT_INTERVAL = 1.0                # Seconds between reconnect attempts
+
+RUNNING, DRAWN = ".", "="               # Result field of RESYNC besides "X" / "O" for the winner
+
+
+def new_token():
+    return secrets.token_hex(8)
+
+
+# RESUME payload: "<token> <game number> <moves seen>"
+def resume_payload(token, game, seen):
+    return f"{token} {game} {seen}"
+
+
+def parse_resume(text):
+    try:
+        token, game, seen = text.split()
+        game, seen = int(game), int(seen)
+    except ValueError:
+        raise ProtocolError("bad RESUME payload")
+    if seen < 0:                        # Would slice the missed moves from the end of the list
+        raise ProtocolError("bad RESUME payload")
+    return token, game, seen
+
+
+# RESYNC payload for a peer in game peer_game that saw peer_seen moves:
+# "<game number> <moves we have> <result> <cells the peer is missing, comma separated>"
+def resync_payload(game_number, game, peer_game, peer_seen):
+    moves = game.moves
+    if peer_game != game_number:
+        missed = moves if peer_game < game_number else []   # Newer game: send it all (snapshot)
+    else:
+        missed = moves[peer_seen:]
+    if not game.over:
+        result = RUNNING
+    else:
+        result = game.winner or DRAWN
+    return f"{game_number} {len(moves)} {result} {','.join(map(str, missed))}"
+
+
+# Returns (game number, moves the sender has, result, missed cells)
+def parse_resync(text):
+    try:
+        parts = text.split(" ")
+        game, have, result = int(parts[0]), int(parts[1]), parts[2]
+        cells = [int(c) for c in parts[3].split(",")] if len(parts) > 3 and parts[3] else []
+        return game, have, result, cells
+    except (ValueError, IndexError):
+        raise ProtocolError("bad RESYNC payload")
@@ -0,0 +1,241 @@
+# Runs the headless match server on every core
+# One Python process uses one core (the GIL), so the supervisor starts several match_server.py workers
+# that all listen on the same port (SO_REUSEPORT): the kernel spreads new connections over them and
+# each runs its own lobby and matches. A player who reconnects to the wrong worker is passed to the
+# right one (see match_server.py), so resuming still works.
+# A worker that crashes is started again, waiting longer after each crash in a row.
+# SIGHUP replaces the workers one by one without dropping a game: the new worker starts first, then
+# the old one drains (accepts no one new and exits when its matches are over). SIGTERM / Ctrl+C drains all.
+# Every worker reports its numbers once a second; the supervisor adds them up.
+#   python3 supervisor.py --workers 4 --port 5000 --stats-interval 10
+# Options it does not know are passed to every worker, e.g. --turn-time 30 --wait-timeout 60.
+# Each worker process writes its own event log (name.<shard>.ext). A worker started by a reload gets a new
+# shard number, so it never shares a file with the worker it replaces while that one drains.
+# The match history is shared. The supervisor alone writes the leaderboard checkpoint, built from that
+# history, and the workers read their ratings from the same history, so every process agrees on them.
+import argparse
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+import metrics
+from match_server import EVENT_LOG_PATH, HISTORY_PATH, LEADERBOARD_PATH, DRAIN_TIMEOUT
+from leaderboard import Leaderboard, CHECKPOINT_INTERVAL, SETTLE_TIME
+
+POLL_INTERVAL = 0.5                     # Seconds between checks on the workers
+REPORT_INTERVAL = 1                     # Seconds between the workers' stats lines
+RESTART_DELAY = 1                       # Seconds before restarting a crashed worker, doubled for every crash in a row
+MAX_RESTART_DELAY = 30
+STABLE_TIME = 10                        # A worker that ran this long before crashing restarts right away
+TOTALS = ("connections", "matches", "waiting", "games", "messages", "bytes_in", "handed_off")
+
+
+# name.ext -> name.<shard>.ext ('' stays '', which disables the file)
+def shard_path(path, shard):
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{shard}{ext}"
+
+
+# One worker process and its latest report
+class Worker:
+    def __init__(self, index, argv):
+        self.index = index
+        self.argv = argv
+        self.process = None
+        self.report = {}
+        self.started = None
+        self.crashes = 0                # Crashes in a row
+        self.restart_at = None          # time.monotonic() of the next restart after a crash
+
+    def start(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.process = subprocess.Popen([sys.executable, os.path.join(here, "match_server.py")] + self.argv,
+                                        stdout=subprocess.PIPE, text=True,
+                                        start_new_session=True)    # Ctrl+C reaches only us; we drain the workers
+        self.started = time.monotonic()
+        self.restart_at = None
+        self.report = {}
+        Thread(target=self.read_reports, args=(self.process,), name=f"worker-{self.index}", daemon=True).start()
+
+    # One JSON line per report on the worker's stdout
+    def read_reports(self, process):
+        for line in process.stdout:
+            try:
+                report = json.loads(line)
+            except ValueError:
+                continue
+            if process is self.process:
+                self.report = report
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    # Ask the worker to finish its matches and exit
+    def drain(self):
+        if self.alive():
+            self.process.send_signal(signal.SIGUSR1)
+
+
+class Supervisor:
+    def __init__(self, workers, server_args, log=EVENT_LOG_PATH, leaderboard=LEADERBOARD_PATH,
+                 drain_timeout=DRAIN_TIMEOUT, stats_interval=0, history=HISTORY_PATH):
+        self.server_args = server_args
+        self.log = log
+        self.history = history
+        self.leaderboard = leaderboard
+        self.drain_timeout = drain_timeout
+        self.stats_interval = stats_interval
+        self.handoff_dir = tempfile.mkdtemp(prefix="tictactoe-handoff-")
+        self.shards = itertools.count()     # Event log number of every worker process started, never reused
+        # The one leaderboard, built from the history all workers share (ratings need that history)
+        self.board = None
+        if leaderboard and history:
+            self.board = Leaderboard.load(leaderboard, history, until=time.time() - SETTLE_TIME)
+        self.workers = [Worker(i, self.worker_args()) for i in range(workers)]
+        self.retiring = []              # Replaced workers that are still draining
+        self.stopping = False
+        self.reload_requested = False
+        self.restarts = 0
+        for key in TOTALS:
+            metrics.gauge(f"cluster_{key}", lambda key=key: self.totals()[key])
+        metrics.gauge("cluster_workers", lambda: sum(w.alive() for w in self.workers), "live workers")
+        metrics.gauge("cluster_restarts", lambda: self.restarts, "workers restarted after a crash")
+
+    def worker_args(self):
+        ratings = ["--leaderboard", ""]         # Workers without a shared history keep no ratings
+        if self.board is not None:
+            ratings = ["--leaderboard", self.leaderboard, "--ratings-from-history"]
+        return self.server_args + ["--reuse-port", "--handoff-dir", self.handoff_dir,
+                                   "--report-interval", str(REPORT_INTERVAL),
+                                   "--drain-timeout", str(self.drain_timeout),
+                                   "--log", shard_path(self.log, next(self.shards)),
+                                   "--history", self.history] + ratings
+
+    # Sums over the workers that are up (draining ones included), plus the busiest event loop
+    def totals(self):
+        reports = [w.report for w in self.workers + self.retiring if w.alive() and w.report]
+        totals = {key: sum(r.get(key, 0) for r in reports) for key in TOTALS}
+        lags = [r["loop_lag_p99_us"] for r in reports if r.get("loop_lag_p99_us") is not None]
+        totals["loop_lag_p99_us_max"] = max(lags) if lags else None
+        return totals
+
+    def stats(self):
+        return dict(self.totals(), workers=sum(w.alive() for w in self.workers), retiring=len(self.retiring),
+                    restarts=self.restarts,
+                    per_worker=[dict(w.report, index=w.index) for w in self.workers if w.report])
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.request_reload)
+        for worker in self.workers:
+            worker.start()
+        next_stats = time.monotonic() + self.stats_interval
+        next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+        while not self.stopping:
+            time.sleep(POLL_INTERVAL)
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self.check_workers()
+            if self.stats_interval and time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + self.stats_interval
+                print(json.dumps(self.stats()), file=sys.stderr, flush=True)
+            if self.board is not None and time.monotonic() >= next_checkpoint:
+                next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+                self.update_ratings(time.time() - SETTLE_TIME)
+        self.shutdown()
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def request_reload(self, signum, frame):
+        self.reload_requested = True
+
+    # Restart crashed workers (with back-off) and forget retired ones that have finished
+    def check_workers(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.alive():
+                continue
+            if worker.restart_at is None:       # Just found it dead
+                ran = now - worker.started
+                worker.crashes = 0 if ran >= STABLE_TIME else worker.crashes + 1
+                delay = 0 if worker.crashes == 0 else min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** (worker.crashes - 1))
+                worker.restart_at = now + delay
+                print(f"worker {worker.index} (pid {worker.process.pid}) exited with code {worker.process.returncode}, "
+                      f"restarting in {delay:g}s", file=sys.stderr, flush=True)
+            if now >= worker.restart_at:
+                worker.start()
+                self.restarts += 1
+        self.retiring = [w for w in self.retiring if w.alive()]
+
+    # Apply the games the workers stored in the history since the last time, and checkpoint the ratings
+    def update_ratings(self, until=None):
+        self.board.replay(self.history, until)
+        if self.board.dirty:
+            self.board.checkpoint(self.leaderboard)
+
+    # Rolling restart: start a fresh worker next to each old one, then drain the old one
+    def reload(self):
+        for i, old in enumerate(self.workers):
+            new = Worker(old.index, self.worker_args())     # Its own event log: the old one still writes to its
+            new.start()
+            self.workers[i] = new
+            old.drain()
+            self.retiring.append(old)
+        print(f"reloading: {len(self.retiring)} workers draining", file=sys.stderr, flush=True)
+
+    # Drain every worker, then stop the ones still running after the drain timeout
+    def shutdown(self):
+        workers = self.workers + self.retiring
+        for worker in workers:
+            worker.drain()
+        deadline = time.monotonic() + self.drain_timeout + 5
+        while any(w.alive() for w in workers) and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+        for worker in workers:
+            if worker.alive():
+                worker.process.kill()
+            if worker.process is not None:
+                worker.process.wait()
+        if self.board is not None:      # Every worker has stored its last games
+            self.update_ratings()
+        try:
+            os.rmdir(self.handoff_dir)
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one headless match server per core on a shared port",
+                                     epilog="Other options are passed to every match_server.py worker.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print the added up stats every n seconds")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="seconds a draining worker may take to finish its matches")
+    parser.add_argument("--log", default=EVENT_LOG_PATH, help="event log file, one per worker ('' to disable)")
+    parser.add_argument("--history", default=HISTORY_PATH, help="SQLite match history shared by the workers ('' to disable)")
+    parser.add_argument("--leaderboard", default=LEADERBOARD_PATH,
+                        help="ratings checkpoint, kept by the supervisor from the history ('' to disable)")
+    parser.add_argument("--metrics-port", type=int, help="serve the added up stats on this local port")
+    args, server_args = parser.parse_known_args(argv)
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "recv_fds"):
+        parser.error("needs SO_REUSEPORT and Unix sockets (Linux or BSD)")
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    Supervisor(args.workers, server_args, args.log, args.leaderboard, args.drain_timeout, args.stats_interval,
+               args.history).run()
+
+
+if __name__ == "__main__":
+    main()
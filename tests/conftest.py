@@ -0,0 +1,20 @@
+# The modules live in the repository root (run the tests from there: python -m pytest)
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# A clock that only moves when a test sets now (for Scheduler and Lobby)
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,98 @@
+# AI: the 3x3 book against plain minimax, the board symmetries, and the search on large boards
+from ai import SYMMETRIES, TRANSFORM, INVERSE, SearchAI, perfect_move
+from game import TicTacToeGame, WIN, DRAW
+
+
+# Outcome for the player to move with perfect play: 1 win, 0 draw, -1 loss (no symmetry, no table)
+def minimax(game, memo):
+    key = (game.bits["X"], game.bits["O"])
+    if key not in memo:
+        best = -1
+        for cell in range(9):
+            if game.is_valid_move(cell, game.current):
+                best = max(best, outcome_of(game, cell, memo))
+        memo[key] = best
+    return memo[key]
+
+
+def outcome_of(game, cell, memo):
+    child = TicTacToeGame()
+    for i in game.moves + [cell]:
+        result = child.play(i, child.current)
+    if result == WIN:
+        return 1
+    if result == DRAW:
+        return 0
+    return -minimax(child, memo)
+
+
+def reachable(game, seen):
+    key = (game.bits["X"], game.bits["O"])
+    if game.over or key in seen:
+        return
+    seen[key] = list(game.moves)
+    for cell in range(9):
+        if game.is_valid_move(cell, game.current):
+            game.play(cell, game.current)
+            reachable(game, seen)
+            undo(game)
+
+
+def undo(game):
+    moves = game.moves[:-1]
+    game.reset()
+    for i in moves:
+        game.play(i, game.current)
+
+
+def test_book_plays_perfectly_everywhere():
+    positions = {}
+    reachable(TicTacToeGame(), positions)
+    assert len(positions) == 4520       # Every non-final position reachable from the empty board
+    memo = {}
+    for moves in positions.values():
+        game = TicTacToeGame()
+        for i in moves:
+            game.play(i, game.current)
+        cell = perfect_move(game)
+        assert game.is_valid_move(cell, game.current)
+        assert outcome_of(game, cell, memo) == minimax(game, memo), moves
+
+
+def test_symmetries_are_inverted():
+    assert len(SYMMETRIES) == 8 and len({tuple(s) for s in SYMMETRIES}) == 8
+    for perm, inverse, table in zip(SYMMETRIES, INVERSE, TRANSFORM):
+        assert [perm[inverse[cell]] for cell in range(9)] == list(range(9))
+        assert [inverse[perm[cell]] for cell in range(9)] == list(range(9))
+        assert all(table[1 << cell] == 1 << perm[cell] for cell in range(9))
+
+
+def test_transposition_table_stays_within_its_size():
+    search = SearchAI(7, 4, table_size=50)
+    game = TicTacToeGame(7, 4)
+    for cell in (24, 25, 17):
+        game.play(cell, game.current)
+    search.choose(game, budget=0.3)
+    assert search.nodes > 50
+    assert len(search.table) == 50
+
+
+def play(size, k, moves):
+    game = TicTacToeGame(size, k)
+    for i in moves:
+        game.play(i, game.current)
+    return game
+
+
+# 15x15 five in a row; row 7 holds cells 105..119
+def test_search_takes_an_immediate_win():
+    game = play(15, 5, [108, 0, 109, 14, 110, 210, 111, 224])
+    assert game.current == "X"
+    assert SearchAI(15, 5).choose(game, budget=1) in (107, 112)
+
+
+def test_search_blocks_an_immediate_loss():
+    game = play(15, 5, [108, 107, 109, 0, 110, 14, 111, 210, 220])
+    assert game.current == "O"
+    assert SearchAI(15, 5).choose(game, budget=1) == 112
+
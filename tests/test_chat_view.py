@@ -0,0 +1,70 @@
+# Bounded chat view: trimming, paging older lines back from the event log, and log rotation
+import json
+import os
+from chat_view import ChatView
+
+
+class Text:                             # Just enough of tk.Text: whole lines only
+    def __init__(self):
+        self.lines = []
+
+    def config(self, **options):
+        pass
+
+    def insert(self, index, text):
+        lines = text.splitlines()
+        self.lines = lines + self.lines if index == "1.0" else self.lines + lines
+
+    def delete(self, start, end):
+        self.lines = [] if end == "end" else self.lines[int(end.split(".")[0]) - 1:]
+
+
+class UI:
+    def post_latest(self, key, fn):
+        fn()
+
+
+def log_chat(path, first, stop, game="g"):
+    with open(path, "a") as f:
+        for i in range(first, stop):
+            f.write(json.dumps({"game": game, "event": "chat", "sender": "siva", "text": str(i)}) + "\n")
+
+
+def make(tmp_path):
+    path = str(tmp_path / "events.log")
+    log_chat(path, 0, 3, game="earlier")
+    text = Text()
+    view = ChatView(text, UI(), path, "me", max_lines=10, page_lines=5)
+    view.clear("g")
+    return view, text, path
+
+
+def show(view, path, first, stop):
+    log_chat(path, first, stop)
+    for i in range(first, stop):
+        view.add(f"siva: {i}")
+
+
+def test_keeps_the_newest_lines(tmp_path):
+    view, text, path = make(tmp_path)
+    show(view, path, 0, 25)
+    assert text.lines == [f"siva: {i}" for i in range(15, 25)]
+    assert view.hidden == 15
+
+
+def test_older_pages_back_from_the_log(tmp_path):
+    view, text, path = make(tmp_path)
+    show(view, path, 0, 25)
+    view.older()
+    assert text.lines[:6] == [f"siva: {i}" for i in range(10, 16)]
+    assert view.hidden == 10
+
+
+def test_older_after_the_log_rotated(tmp_path):
+    view, text, path = make(tmp_path)
+    show(view, path, 0, 20)
+    os.replace(path, f"{path}.1")       # What EventLog does when the file grows too big
+    show(view, path, 20, 30)
+    assert [r["text"] for r in view.read_chat(18, 22)] == ["18", "19", "20", "21"]
+    view.older()
+    assert text.lines[:5] == [f"siva: {i}" for i in range(15, 20)]
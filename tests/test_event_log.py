@@ -0,0 +1,64 @@
+# Event log writer: records, rotation into compressed segments, and surviving write errors
+import gzip
+import json
+import os
+import time
+from event_log import EventLog
+
+
+def read_records(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records(tmp_path):
+    path = str(tmp_path / "events.log")
+    log = EventLog(path, flush_interval=0.01)
+    log.log("g1", "chat", sender="siva", text="héllo")
+    log.log("g1", "move", symbol="X", cell=4)
+    log.close()
+    records = read_records(path)
+    assert [r["event"] for r in records] == ["chat", "move"]
+    assert records[0]["sender"] == "siva" and records[0]["text"] == "héllo" and records[0]["game"] == "g1"
+    assert records[1]["cell"] == 4 and "ts" in records[1]
+
+
+def test_rotation_compresses_the_old_segment(tmp_path):
+    path = str(tmp_path / "events.log")
+    log = EventLog(path, max_bytes=2000, backups=3, compress=True, flush_interval=0.01)
+    for i in range(30):                 # About 100 bytes each: at least one rotation
+        log.log("g", "chat", sender="a", text=f"{i:04d}" + "x" * 40)
+    log.close()
+    segments = sorted(name for name in os.listdir(tmp_path) if name.endswith(".gz"))
+    assert segments and segments[0] == "events.log.1.gz"
+    assert len(segments) <= 3
+    texts = []
+    for name in reversed(segments):     # Oldest first
+        texts += [r["text"][:4] for r in read_records(str(tmp_path / name))]
+    texts += [r["text"][:4] for r in read_records(path)] if os.path.exists(path) else []
+    assert texts == [f"{i:04d}" for i in range(30)]
+
+
+def test_write_errors_do_not_stop_the_writer(tmp_path, capsys):
+    path = str(tmp_path / "missing" / "events.log")    # The directory does not exist
+    log = EventLog(path, flush_interval=0.01)
+    dropped = log.dropped.value
+    log.log("g", "chat", sender="a", text="lost")
+    log.close()
+    assert not log.thread.is_alive()    # It stopped because it was told to, not because it crashed
+    assert log.dropped.value == dropped + 1
+    assert "dropping events" in capsys.readouterr().err
+
+
+def test_recovers_after_a_write_error(tmp_path):
+    directory = tmp_path / "later"
+    path = str(directory / "events.log")
+    log = EventLog(path, flush_interval=0.01)
+    log.log("g", "chat", sender="a", text="lost")
+    while log.failing is None:
+        time.sleep(0.01)
+    directory.mkdir()
+    log.log("g", "chat", sender="a", text="kept")
+    log.close()
+    assert [r["text"] for r in read_records(path)] == ["kept"]
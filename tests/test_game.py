@@ -0,0 +1,74 @@
+# Game rules: wins, draws, invalid moves and larger boards (with and without the win table)
+import pytest
+from game import TicTacToeGame, CONTINUE, WIN, DRAW
+
+
+def play_all(game, cells):
+    result = None
+    for i in cells:
+        result = game.play(i, game.current)
+    return result
+
+
+def test_row_wins():
+    game = TicTacToeGame()
+    assert play_all(game, [0, 3, 1, 4]) == CONTINUE
+    assert game.play(2, "X") == WIN
+    assert game.over and game.winner == "X"
+    assert game.board[:3] == ["X", "X", "X"]
+
+
+def test_diagonal_wins_for_o():
+    game = TicTacToeGame()
+    assert play_all(game, [1, 2, 3, 4, 8, 6]) == WIN
+    assert game.winner == "O"
+
+
+def test_full_board_is_a_draw():
+    game = TicTacToeGame()
+    assert play_all(game, [0, 1, 2, 4, 3, 5, 7, 6, 8]) == DRAW
+    assert game.over and game.winner is None and game.is_full()
+
+
+def test_invalid_moves():
+    game = TicTacToeGame()
+    game.play(4, "X")
+    assert not game.is_valid_move(4, "O")           # Taken
+    assert not game.is_valid_move(0, "X")           # Not X's turn
+    assert not game.is_valid_move(9, "O")           # Off the board
+    with pytest.raises(ValueError):
+        game.play(4, "O")
+    play_all(game, [0, 1, 2, 7])
+    assert game.over
+    assert not game.is_valid_move(8, game.current)  # Game over
+
+
+def test_reset():
+    game = TicTacToeGame()
+    play_all(game, [0, 3, 1, 4, 2])
+    game.reset()
+    assert game.moves == [] and game.current == "X" and not game.over and game.board == [""] * 9
+
+
+def test_forfeit():
+    game = TicTacToeGame()
+    game.play(0, "X")
+    game.forfeit("O")
+    assert game.over and game.winner == "X"
+
+
+@pytest.mark.parametrize("size, k", [(4, 3), (5, 4), (15, 5)])
+def test_larger_boards(size, k):
+    game = TicTacToeGame(size, k)
+    assert (game.win_table is not None) == (size * size <= 16)
+    # X plays down the last column, O along the first row, never completing a line
+    for step in range(k - 1):
+        game.play(step * size + size - 1, "X")
+        game.play(step + size * (size - 1), "O")
+    assert game.play((k - 1) * size + size - 1, "X") == WIN
+    assert game.check_winner("X") and not game.check_winner("O")
+
+
+def test_impossible_size():
+    with pytest.raises(ValueError):
+        TicTacToeGame(3, 4)
@@ -0,0 +1,69 @@
+# Match history: storing games, last games of a player, head-to-head queries and the moves blob
+import pytest
+from game import TicTacToeGame
+from history import MatchHistory, pack_moves, unpack_moves
+
+
+def game_with(cells, size=3, k=3):
+    game = TicTacToeGame(size, k)
+    for i in cells:
+        game.play(i, game.current)
+    return game
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = MatchHistory(str(tmp_path / "history.db"), flush_interval=0.01)
+    yield history
+    history.close()
+
+
+def record(history, ended, x, o, result, moves=(4, 0, 8)):
+    history.record(f"g{ended}", x, o, game_with(moves), result, "line", started=ended - 1, ended=float(ended))
+
+
+def test_game_round_trip(history):
+    record(history, 10, "siva", "manoj", "X", moves=[4, 0, 2, 6, 3, 5, 1, 7, 8])
+    assert history.flush()
+    game, = history.last_games("siva")
+    assert (game["game_id"], game["player_x"], game["player_o"], game["result"], game["reason"]) == \
+        ("g10", "siva", "manoj", "X", "line")
+    assert (game["started"], game["ended"], game["duration"], game["size"]) == (9.0, 10.0, 1.0, 3)
+    assert game["moves"] == [4, 0, 2, 6, 3, 5, 1, 7, 8]
+
+
+def test_last_games_newest_first_from_either_side(history):
+    record(history, 1, "a", "b", "X")
+    record(history, 2, "c", "a", "O")
+    record(history, 3, "b", "c", "draw")
+    record(history, 4, "a", "c", "draw")
+    history.flush()
+    assert [g["ended"] for g in history.last_games("a")] == [4.0, 2.0, 1.0]
+    assert [g["ended"] for g in history.last_games("a", n=2)] == [4.0, 2.0]
+    assert history.last_games("nobody") == []
+
+
+def test_head_to_head(history):
+    record(history, 1, "a", "b", "X")
+    record(history, 2, "b", "a", "X")
+    record(history, 3, "a", "c", "X")
+    record(history, 4, "b", "a", "draw")
+    record(history, 5, "a", "b", "O")
+    history.flush()
+    assert [g["ended"] for g in history.head_to_head("a", "b")] == [5.0, 4.0, 2.0, 1.0]
+    assert [g["ended"] for g in history.head_to_head("b", "a", n=3)] == [5.0, 4.0, 2.0]
+    assert history.head_to_head_score("a", "b") == {"a": 1, "b": 2, "draw": 1}
+    assert history.head_to_head_score("b", "c") == {"b": 0, "c": 0, "draw": 0}
+
+
+def test_closed_history_ignores_games(history):
+    history.close()
+    record(history, 1, "a", "b", "X")
+
+
+@pytest.mark.parametrize("cells", [9, 256, 257, 15 * 15, 20 * 20])
+def test_pack_round_trip(cells):
+    moves = list(range(cells))[::-1]
+    blob = pack_moves(moves, cells)
+    assert len(blob) == cells * (1 if cells <= 256 else 2)
+    assert unpack_moves(blob, cells) == moves
@@ -0,0 +1,112 @@
+# Elo leaderboard: rating order and ranks, checkpoint and reload, replaying the match history
+import pytest
+from game import TicTacToeGame
+from history import MatchHistory
+from leaderboard import Leaderboard, INITIAL_RATING, K_FACTOR
+
+# (X, O, result) of the games in the test history; game i ends at time i (from 1)
+GAMES = [("a", "b", "X"), ("b", "c", "O"), ("c", "a", "draw"), ("a", "c", "X"), ("b", "a", "X")]
+
+
+def test_winner_gains_what_loser_loses():
+    board = Leaderboard()
+    rating_x, rating_o = board.update("siva", "manoj", "X", ended=1.0)
+    assert rating_x == INITIAL_RATING + K_FACTOR / 2
+    assert rating_o == INITIAL_RATING - K_FACTOR / 2
+    assert board.records == {"siva": (1, 0, 0), "manoj": (0, 0, 1)}
+
+
+def test_top_and_rank_order_ties_by_name():
+    board = Leaderboard()
+    board.update("b", "a", "draw", ended=1.0)   # a and b stay level
+    board.update("c", "d", "X", ended=2.0)
+    assert [(rank, name) for rank, name, _, _ in board.top()] == [(1, "c"), (2, "a"), (3, "b"), (4, "d")]
+    assert [board.rank(name) for name in "abcd"] == [2, 3, 1, 4]
+    assert board.top(1)[0][3] == (1, 0, 0)
+    assert board.rank("nobody") is None
+
+
+def test_rank_follows_a_rating_change():
+    board = Leaderboard()
+    board.update("a", "b", "X", ended=1.0)
+    board.update("b", "a", "X", ended=2.0)
+    board.update("b", "a", "X", ended=3.0)
+    assert board.rank("b") == 1 and board.rank("a") == 2
+    assert [name for _, name, _, _ in board.top()] == ["b", "a"]
+
+
+def test_playing_yourself_changes_nothing():
+    board = Leaderboard()
+    board.update("a", "a", "X", ended=1.0)
+    assert len(board) == 0
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "leaderboard.json")
+    board = Leaderboard(k_factor=24, initial=1500)
+    board.update("a", "b", "X", ended=5.0)
+    board.update("c", "a", "draw", ended=7.5)
+    board.checkpoint(path)
+    assert not board.dirty
+    loaded = Leaderboard.load(path)
+    assert (loaded.k_factor, loaded.initial, loaded.last_ended) == (24, 1500, 7.5)
+    assert loaded.ratings == board.ratings
+    assert loaded.records == board.records
+    assert loaded.top() == board.top()
+
+
+def test_background_checkpoint(tmp_path):
+    path = str(tmp_path / "leaderboard.json")
+    board = Leaderboard()
+    board.update("a", "b", "O", ended=1.0)
+    board.checkpoint(path, background=True)
+    board.update("a", "b", "O", ended=2.0)
+    board.checkpoint(path, background=True)     # Waits for the first write
+    board.writer.join()
+    assert Leaderboard.load(path).ratings == board.ratings
+
+
+@pytest.fixture
+def history_path(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = MatchHistory(path)
+    for ended, (x, o, result) in enumerate(GAMES, 1):
+        history.record(f"g{ended}", x, o, TicTacToeGame(), result, "line", started=ended - 0.5, ended=float(ended))
+    history.flush()
+    history.close()
+    return path
+
+
+def games_up_to(until):
+    board = Leaderboard()
+    for ended, (x, o, result) in enumerate(GAMES[:until], 1):
+        board.update(x, o, result, float(ended))
+    return board
+
+
+def test_replay_stops_at_until(history_path):
+    board = Leaderboard()
+    assert board.replay(history_path, until=3.0) == 3
+    assert board.last_ended == 3.0
+    assert board.ratings == games_up_to(3).ratings
+
+
+def test_replay_skips_games_already_applied(history_path):
+    board = games_up_to(2)
+    assert board.replay(history_path) == 3    # ended == last_ended is not applied twice
+    assert board.ratings == games_up_to(5).ratings
+    assert board.records == games_up_to(5).records
+    assert board.replay(history_path) == 0
+
+
+def test_load_replays_after_the_checkpoint(tmp_path, history_path):
+    path = str(tmp_path / "leaderboard.json")
+    games_up_to(3).checkpoint(path)
+    board = Leaderboard.load(path, history_path, until=4.0)
+    assert board.last_ended == 4.0
+    assert board.ratings == games_up_to(4).ratings
+    assert not board.dirty
+
+
+def test_replay_of_a_new_history(tmp_path):
+    assert Leaderboard().replay(str(tmp_path / "empty.db")) == 0
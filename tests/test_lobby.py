@@ -0,0 +1,106 @@
+# Lobby pairing, buckets, widening and expiry, on a fake clock
+import pytest
+from lobby import Lobby
+
+
+@pytest.fixture
+def make(clock):
+    def make(**kwargs):
+        return Lobby(clock=clock, **kwargs), clock
+    return make
+
+
+def test_pairs_with_the_longest_waiting(make):
+    lobby, clock = make(bucket_width=0)
+    assert lobby.join("a") is None
+    clock.now = 1
+    assert lobby.join("b") == "a"
+    assert lobby.join("c") is None
+    assert len(lobby) == 1 and "c" in lobby and "a" not in lobby
+    stats = lobby.stats()
+    assert stats["paired"] == 2 and stats["wait_max_ms"] == 1000.0
+
+
+def test_rated_players_stay_in_range(make):
+    lobby, _ = make(bucket_width=200, widen_interval=0)
+    assert lobby.join("low", 1000) is None          # Bucket 5
+    assert lobby.join("high", 1700) is None         # Bucket 8: too far
+    assert lobby.join("mid", 1500) == "high"        # Bucket 7: the neighbour
+    assert lobby.join("near", 1190) == "low"        # Bucket 5, same bucket first
+    assert len(lobby) == 0
+
+
+def test_leave(make):
+    lobby, _ = make()
+    lobby.join("a", 1200)
+    assert lobby.leave("a") and not lobby.leave("a")
+    assert lobby.join("b", 1200) is None
+
+
+def test_expire_oldest_only(make):
+    lobby, clock = make(wait_timeout=10, bucket_width=0)
+    lobby.join("a")
+    lobby.leave("a")
+    lobby.join("b")
+    clock.now = 5
+    lobby.leave("b")
+    lobby.join("c")
+    clock.now = 12
+    assert lobby.expire() == []                     # c joined at 5
+    clock.now = 15
+    assert lobby.expire() == ["c"]
+    assert lobby.stats()["expired"] == 1 and len(lobby) == 0
+
+
+def test_no_timeout(make):
+    lobby, clock = make(wait_timeout=0)
+    lobby.join("a")
+    clock.now = 10 ** 6
+    assert lobby.expire() == []
+
+
+def test_widening_pairs_sparse_buckets(make):
+    lobby, clock = make(bucket_width=100, widen_interval=10)
+    lobby.join("a", 1000)                           # Bucket 10
+    clock.now = 5
+    lobby.join("b", 1300)                           # Bucket 13, three away
+    lobby.join("far", 3000)                         # Bucket 30
+    assert lobby.widen() == []
+    clock.now = 20                                  # a waited 20 s: reaches 3 buckets
+    assert lobby.widen() == [("a", "b")]            # Whoever waited longer plays X
+    assert list(lobby.bucket_of) == ["far"]
+    assert lobby.stats()["paired"] == 2
+
+
+def test_widening_off(make):
+    lobby, clock = make(bucket_width=100, widen_interval=0)
+    lobby.join("a", 1000)
+    lobby.join("b", 1300)
+    clock.now = 1000
+    assert lobby.widen() == []
+
+
+def test_clear(make):
+    lobby, _ = make()
+    lobby.join("a", 1000)
+    lobby.join("b", 2000)
+    assert sorted(lobby.clear()) == ["a", "b"] and len(lobby) == 0
+
+
+def test_unrated_player_takes_the_longest_waiting_rated_one(make):
+    lobby, clock = make(bucket_width=100)
+    lobby.join("late", 3000)
+    lobby.leave("late")
+    lobby.join("old", 1000)
+    clock.now = 1
+    lobby.join("new", 2000)
+    assert lobby.join("unrated") == "old"
+    assert lobby.join("unrated2") == "new"
+    assert len(lobby) == 0
+
+
+def test_rated_player_takes_a_waiting_unrated_one(make):
+    lobby, _ = make(bucket_width=100)
+    lobby.join("unrated")
+    assert lobby.join("rated", 1500) == "unrated"
+    assert len(lobby) == 0
@@ -0,0 +1,55 @@
+# Framing: frames split across reads, several frames in one read, and garbage lengths
+import pytest
+import protocol
+from protocol import FrameDecoder, ProtocolError
+
+
+def test_round_trip():
+    data = protocol.encode(protocol.MOVE, 4) + protocol.encode(protocol.CHAT, "héllo") + protocol.encode(protocol.RESET)
+    assert FrameDecoder().feed(data) == [(protocol.MOVE, 4), (protocol.CHAT, "héllo"), (protocol.RESET, None)]
+
+
+def test_move_is_five_bytes():
+    assert len(protocol.encode(protocol.MOVE, 8)) == 5
+
+
+def test_partial_frames_are_buffered():
+    data = protocol.encode(protocol.NAME, "siva") + protocol.encode(protocol.MOVE, 2)
+    decoder = FrameDecoder()
+    messages = []
+    for i in range(len(data)):          # One byte per read
+        messages += decoder.feed(data[i:i + 1])
+    assert messages == [(protocol.NAME, "siva"), (protocol.MOVE, 2)]
+    assert not decoder.buffer
+
+
+def test_split_inside_header():
+    data = protocol.encode(protocol.CHAT, "hi")
+    decoder = FrameDecoder()
+    assert decoder.feed(data[:1]) == []
+    assert decoder.feed(data[1:3]) == []
+    assert decoder.feed(data[3:]) == [(protocol.CHAT, "hi")]
+
+
+def test_merged_frames_with_a_partial_tail():
+    first, second = protocol.encode(protocol.MOVE, 0), protocol.encode(protocol.CHAT, "tail")
+    decoder = FrameDecoder()
+    assert decoder.feed(first + second[:4]) == [(protocol.MOVE, 0)]
+    assert decoder.feed(second[4:]) == [(protocol.CHAT, "tail")]
+
+
+def test_long_text_is_truncated_to_one_frame():
+    frame = protocol.encode(protocol.CHAT, "x" * 10000)
+    assert len(frame) <= protocol.MAX_FRAME
+    assert FrameDecoder().feed(frame) == [(protocol.CHAT, "x" * protocol.MAX_TEXT)]
+
+
+@pytest.mark.parametrize("header", [b"\x00\x00\x03", b"\xff\xff\x03"])
+def test_bad_length(header):
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(header)
+
+
+def test_bad_move_payload():
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(protocol.HEADER.pack(2, protocol.MOVE) + b"\x01")
@@ -0,0 +1,71 @@
+# Token bucket and chat gate: bursts, refill, holding back, coalescing and dropping
+from rate_limit import TokenBucket, ChatGate
+
+
+def test_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take(0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait(0) == 0.5
+    assert not bucket.take(0.4)
+    assert bucket.take(0.5)
+    assert not bucket.take(0.5)
+
+
+def test_bucket_refill_is_capped_at_the_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.take(0)
+    bucket.take(0)
+    assert sum(bucket.take(100) for _ in range(5)) == 2
+
+
+def test_bucket_ignores_a_clock_going_back():
+    bucket = TokenBucket(rate=1, burst=1, now=10)
+    assert bucket.take(10)
+    assert not bucket.take(5)
+    assert bucket.take(11)
+
+
+def test_gate_passes_chat_within_the_limit():
+    gate = ChatGate(rate=1, burst=2)
+    assert gate.offer("a", 0) == "a"
+    assert gate.offer("b", 0) == "b"
+    assert gate.due(0) is None          # Nothing held
+
+
+def test_gate_holds_back_and_coalesces():
+    gate = ChatGate(rate=1, burst=1)
+    assert gate.offer("a", 0) == "a"
+    assert gate.offer("b", 0) is None
+    assert gate.offer("c", 0.5) is None
+    assert gate.due(0.5) == 0.5
+    assert gate.due(0.5) is None        # Release already scheduled
+    assert gate.release(1.0) == "b\nc"
+    assert gate.due(1.0) is None
+
+
+def test_gate_keeps_order_while_holding():
+    gate = ChatGate(rate=1, burst=1)
+    gate.offer("a", 0)
+    gate.offer("b", 0)
+    assert gate.offer("c", 5) is None   # A token is back, but "b" is still waiting
+    assert gate.release(5) == "b\nc"
+
+
+def test_gate_drops_beyond_max_held():
+    gate = ChatGate(rate=1, burst=1, max_held=10)
+    gate.offer("first", 0)
+    assert gate.offer("1234", 0) is None
+    assert gate.offer("5678", 0) is None
+    assert gate.offer("dropped", 0) is None
+    gate.due(0)
+    assert gate.release(1) == "1234\n5678"
+
+
+def test_early_release_keeps_the_text():
+    gate = ChatGate(rate=1, burst=1)
+    gate.offer("a", 0)
+    gate.offer("b", 0)
+    gate.due(0)
+    assert gate.release(0.2) is None    # Too early: still held
+    assert gate.due(0.2) is not None
+    assert gate.release(1) == "b"
@@ -0,0 +1,59 @@
+# Timer heap driven by a fake clock: order, cancelling and repeating timers
+from scheduler import Scheduler
+
+
+def test_fires_in_deadline_order(clock):
+    scheduler = Scheduler(clock)
+    fired = []
+    scheduler.call_later(2, fired.append, "b")
+    scheduler.call_later(1, fired.append, "a")
+    scheduler.call_later(2, fired.append, "c")      # Same deadline: arming order
+    assert scheduler.run_due() == 1
+    clock.now = 2
+    assert scheduler.run_due() is None
+    assert fired == ["a", "b", "c"]
+
+
+def test_cancel(clock):
+    scheduler = Scheduler(clock)
+    fired = []
+    timer = scheduler.call_later(1, fired.append, "x")
+    timer.cancel()
+    timer.cancel()                      # Twice is harmless
+    assert scheduler.pending() == 0
+    clock.now = 5
+    scheduler.run_due()
+    assert fired == []
+
+
+def test_repeating_timer_does_not_drift(clock):
+    scheduler = Scheduler(clock)
+    fired = []
+    timer = scheduler.call_every(1, lambda: fired.append(clock.now))
+    for now in (1.2, 2.1, 3.5):
+        clock.now = now
+        scheduler.run_due()
+    assert fired == [1.2, 2.1, 3.5]
+    assert timer.deadline == 4
+    timer.cancel()
+    assert scheduler.pending() == 0
+
+
+def test_failing_callback_does_not_stop_the_others(clock, capsys):
+    scheduler = Scheduler(clock)
+    fired = []
+    scheduler.call_later(1, lambda: 1 / 0)
+    scheduler.call_later(1, fired.append, "ok")
+    clock.now = 1
+    scheduler.run_due()
+    assert fired == ["ok"]
+    assert "ZeroDivisionError" in capsys.readouterr().err
+
+
+def test_many_cancelled_timers_are_purged(clock):
+    scheduler = Scheduler(clock)
+    timers = [scheduler.call_later(i + 1, print) for i in range(200)]
+    for timer in timers[:150]:
+        timer.cancel()
+    assert scheduler.pending() == 50
+    assert len(scheduler.heap) < 200
@@ -0,0 +1,55 @@
+# RESUME / RESYNC payloads: only the missed moves, the whole game after a reset, and results
+import pytest
+from game import TicTacToeGame
+from protocol import ProtocolError
+from session import resume_payload, parse_resume, resync_payload, parse_resync, RUNNING, DRAWN
+
+
+def game_with(cells):
+    game = TicTacToeGame()
+    for i in cells:
+        game.play(i, game.current)
+    return game
+
+
+def test_resume_round_trip():
+    assert parse_resume(resume_payload("abc123", 2, 5)) == ("abc123", 2, 5)
+
+
+@pytest.mark.parametrize("text", ["", "abc", "abc 1", "abc x 2", "abc 1 2 3", "abc 1 -1"])
+def test_bad_resume(text):
+    with pytest.raises(ProtocolError):
+        parse_resume(text)
+
+
+def test_same_game_sends_only_missed_moves():
+    game = game_with([4, 0, 8])
+    assert parse_resync(resync_payload(1, game, 1, 1)) == (1, 3, RUNNING, [0, 8])
+
+
+def test_nothing_missed():
+    game = game_with([4, 0])
+    assert parse_resync(resync_payload(1, game, 1, 2)) == (1, 2, RUNNING, [])
+
+
+def test_reset_meanwhile_sends_the_whole_game():
+    game = game_with([2, 5])
+    assert parse_resync(resync_payload(3, game, 2, 7)) == (3, 2, RUNNING, [2, 5])
+
+
+def test_peer_in_a_newer_game_gets_no_moves():
+    game = game_with([2])
+    assert parse_resync(resync_payload(1, game, 2, 0)) == (1, 1, RUNNING, [])
+
+
+def test_results():
+    won = game_with([0, 3, 1, 4, 2])
+    assert parse_resync(resync_payload(1, won, 1, 4))[2:] == ("X", [2])
+    drawn = game_with([0, 1, 2, 4, 3, 5, 7, 6, 8])
+    assert parse_resync(resync_payload(1, drawn, 1, 9))[2] == DRAWN
+
+
+@pytest.mark.parametrize("text", ["", "1", "1 x .", "1 2 . a,b"])
+def test_bad_resync(text):
+    with pytest.raises(ProtocolError):
+        parse_resync(text)
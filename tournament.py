@@ -0,0 +1,252 @@
+# Self-play tournament for comparing bot strategies
+# Every strategy plays every strategy (itself included) as X and as O, with the same rules as the Tk
+# peers and the match server (game.py). The games are split into batches that run on a process pool.
+# Each batch returns its results and, in compact counters, every position reached and every move
+# played, keyed by the position's index in the 3^9 table (digit i = cell i: 0 empty, 1 X, 2 O).
+# --analyze then scores all of it as NumPy arrays: the whole 3^9 table is solved in a few array
+# operations (the best result and the result of every move in every position), which gives each
+# strategy's accuracy and blunders, plus statistics of the openings. NumPy is only needed for --analyze.
+#   python3 tournament.py --strategies random,greedy,center,ai --games 100000 --analyze
+#   python3 tournament.py --games 1000000 --processes 8 --out tournament.json
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from game import TicTacToeGame, win_masks
+from bot_client import random_strategy, scripted_strategy, ai_strategy
+
+BATCH = 20000                           # Games per task sent to a worker process
+POW3 = [3 ** i for i in range(9)]       # Weight of each cell in a position index
+X_WON, O_WON, DRAWN = 0, 1, 2           # Outcome codes in the position counters
+OUTCOMES = ("x_won", "o_won", "drawn")
+
+
+# Win if we can, block if we must, otherwise a random cell
+def greedy_strategy(rng):
+    lines = win_masks(3, 3)[0]
+    fallback = random_strategy(rng)
+
+    def choose(game):
+        me = game.current
+        for bits in (game.bits[me], game.bits["O" if me == "X" else "X"]):
+            for mask in lines:
+                missing = mask & ~bits
+                if missing & (missing - 1) == 0 and not missing & game.occupied:    # One cell short, and it is empty
+                    return missing.bit_length() - 1
+        return fallback(game)
+    return choose
+
+
+STRATEGIES = {
+    "random": random_strategy,
+    "first": lambda rng: scripted_strategy(range(9), rng),                  # First empty cell
+    "center": lambda rng: scripted_strategy([4, 0, 2, 6, 8, 1, 3, 5, 7], rng),  # Centre, corners, edges
+    "greedy": greedy_strategy,
+    "ai": lambda rng: ai_strategy(),    # Perfect play (ai.py)
+}
+
+
+# Play games between strategy x_name (X) and o_name (O). Returns the result counts, and counters of
+# the positions reached (index * 3 + outcome) and of the moves X and O made (index * 9 + cell).
+# Games are counted by their move sequence first, so each distinct game is taken apart only once.
+def play_batch(x_name, o_name, games, seed):
+    rng = random.Random(seed)
+    players = {"X": STRATEGIES[x_name](rng), "O": STRATEGIES[o_name](rng)}
+    played = Counter()
+    game = TicTacToeGame()
+    for _ in range(games):
+        game.reset()
+        while not game.over:
+            symbol = game.current
+            game.play(players[symbol](game), symbol)
+        outcome = DRAWN if game.winner is None else X_WON if game.winner == "X" else O_WON
+        played[tuple(game.moves), outcome] += 1
+    results = [0, 0, 0]
+    positions = Counter()
+    moves = (Counter(), Counter())      # X's, O's
+    for (sequence, outcome), n in played.items():
+        results[outcome] += n
+        index = 0
+        for ply, cell in enumerate(sequence):
+            positions[index * 3 + outcome] += n
+            moves[ply & 1][index * 9 + cell] += n
+            index += POW3[cell] * (1 + (ply & 1))
+        positions[index * 3 + outcome] += n
+    return x_name, o_name, results, positions, moves[0], moves[1]
+
+
+# Round robin: games per ordered pair of strategies, in batches on processes worker processes
+def run(strategies, games, processes, seed=1):
+    tasks = []
+    for x_name in strategies:
+        for o_name in strategies:
+            for start in range(0, games, BATCH):
+                tasks.append((x_name, o_name, min(BATCH, games - start), f"{seed}-{x_name}-{o_name}-{start}"))
+    pairs = {}
+    positions = Counter()
+    moves = {name: {"X": Counter(), "O": Counter()} for name in strategies}
+    if processes == 1:
+        done = (play_batch(*task) for task in tasks)
+    else:
+        pool = ProcessPoolExecutor(processes)
+        done = pool.map(play_batch, *zip(*tasks))
+    for x_name, o_name, results, batch_positions, x_moves, o_moves in done:
+        pair = pairs.setdefault((x_name, o_name), [0, 0, 0])
+        for outcome in range(3):
+            pair[outcome] += results[outcome]
+        positions.update(batch_positions)
+        moves[x_name]["X"].update(x_moves)
+        moves[o_name]["O"].update(o_moves)
+    if processes != 1:
+        pool.shutdown()
+    return pairs, positions, moves
+
+
+# Wins, draws and losses of every strategy over all its games, best score first
+def standings(pairs):
+    table = {}
+    for (x_name, o_name), (x_won, o_won, drawn) in pairs.items():
+        for name, won, lost in ((x_name, x_won, o_won), (o_name, o_won, x_won)):
+            row = table.setdefault(name, {"won": 0, "drawn": 0, "lost": 0})
+            row["won"] += won
+            row["drawn"] += drawn
+            row["lost"] += lost
+    for row in table.values():
+        row["score"] = round((row["won"] + row["drawn"] / 2) / (row["won"] + row["drawn"] + row["lost"]), 4)
+    return dict(sorted(table.items(), key=lambda item: -item[1]["score"]))
+
+
+# The 3^9 table solved with array operations: for every index the position's value for X
+# (1 X wins, 0 draw, -1 O wins with best play), the value after each move (NaN where the cell is
+# taken or the game is over), which indexes are reachable positions and which of those end the game
+def solve_table(np):
+    index = np.arange(3 ** 9)
+    weights = np.array(POW3)
+    digits = index[:, None] // weights % 3                          # (19683, 9): 0 empty, 1 X, 2 O
+    stones = (digits > 0).sum(1)
+    lines = np.array([[i for i in range(9) if mask >> i & 1] for mask in win_masks(3, 3)[0]])
+    x_line = (digits[:, lines] == 1).all(2).any(1)
+    o_line = (digits[:, lines] == 2).all(2).any(1)
+    x_to_move = (digits == 1).sum(1) == (digits == 2).sum(1)
+    terminal = x_line | o_line | (stones == 9)
+    children = index[:, None] + np.where(x_to_move, 1, 2)[:, None] * weights   # Index after playing each cell
+    empty = digits == 0
+    reachable = np.zeros(3 ** 9, dtype=bool)
+    reachable[0] = True
+    for n in range(9):                  # Forward: every move from every reachable position that is still going
+        layer = np.nonzero(reachable & ~terminal & (stones == n))[0]
+        reachable[children[layer][empty[layer]]] = True
+    value = np.where(x_line, 1.0, np.where(o_line, -1.0, 0.0))
+    move_value = np.full((3 ** 9, 9), np.nan)
+    for n in range(8, -1, -1):          # Backward: children have one stone more, so they are solved first
+        layer = np.nonzero(reachable & ~terminal & (stones == n))[0]
+        values = np.where(empty[layer], value[np.where(empty[layer], children[layer], 0)], np.nan)
+        move_value[layer] = values
+        value[layer] = np.where(x_to_move[layer], np.nanmax(values, 1), np.nanmin(values, 1))
+    return value, move_value, reachable, terminal
+
+
+def render(np, index):
+    digits = index // np.array(POW3) % 3
+    return "".join(".XO"[d] for d in digits)
+
+
+# Score everything the tournament recorded against the solved table
+def analyze(positions, moves, top=5):
+    import numpy as np
+    started = time.perf_counter()
+    value, move_value, reachable, terminal = solve_table(np)
+    solved_ms = (time.perf_counter() - started) * 1000
+
+    def counts(counter, width):
+        keys = np.fromiter(counter.keys(), dtype=np.int64, count=len(counter))
+        table = np.zeros(3 ** 9 * width, dtype=np.int64)
+        table[keys] = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+        return table.reshape(3 ** 9, width)
+
+    reached = counts(positions, 3)                                  # (19683, 3) games per outcome
+    result = {
+        "table": {"positions": int(reachable.sum()), "terminal": int((reachable & terminal).sum()),
+                  "x_wins": int((reachable & (value == 1)).sum()), "o_wins": int((reachable & (value == -1)).sum()),
+                  "draws": int((reachable & (value == 0)).sum()), "empty_board": int(value[0]),
+                  "reached": int((reached.sum(1) > 0).sum()), "solve_ms": round(solved_ms, 1)},
+        "strategies": {},
+        "openings": {},
+    }
+    for name, sides in moves.items():
+        total = mistakes = lost = 0
+        cost = np.zeros((3 ** 9, 9))
+        for symbol, sign in (("X", 1), ("O", -1)):
+            if not sides[symbol]:
+                continue
+            made = counts(sides[symbol], 9)                         # (19683, 9) times each move was made
+            loss = sign * (value[:, None] - move_value)             # How much each move gives away (0, 1 or 2)
+            loss = np.where(made > 0, np.nan_to_num(loss), 0)
+            total += made.sum()
+            mistakes += (made * (loss > 0)).sum()
+            lost += (made * loss).sum()
+            cost += made * loss
+        worst = np.argsort(cost.ravel())[::-1][:top]
+        result["strategies"][name] = {
+            "moves": int(total), "accuracy": round(1 - mistakes / total, 4) if total else None,
+            "mistakes_per_1000": round(1000 * mistakes / total, 2) if total else None,
+            "value_lost_per_1000": round(1000 * lost / total, 2) if total else None,
+            "worst": [{"position": render(np, i // 9), "cell": int(i % 9), "cost": int(cost.ravel()[i])}
+                      for i in worst if cost.ravel()[i] > 0]}
+    first = reached[np.array(POW3)]                                 # Positions with one X: X's opening move
+    for cell in range(9):
+        games = int(first[cell].sum())
+        result["openings"][cell] = {
+            "games": games, "value": int(move_value[0, cell]),
+            **{name: round(int(first[cell, k]) / games, 4) if games else None for k, name in enumerate(OUTCOMES)}}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-robin self-play tournament of bot strategies")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help=f"comma separated, from {', '.join(STRATEGIES)}")
+    parser.add_argument("--games", type=int, default=10000, help="games per ordered pair of strategies")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (1 = run here)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--analyze", action="store_true", help="score every position and move with NumPy")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+    strategies = args.strategies.split(",")
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategy {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    pairs, positions, moves = run(strategies, args.games, args.processes, args.seed)
+    elapsed = time.perf_counter() - started
+    played = sum(sum(r) for r in pairs.values())
+    result = {
+        "params": {"strategies": strategies, "games": args.games, "processes": args.processes, "seed": args.seed},
+        "elapsed_s": round(elapsed, 3),
+        "games": played,
+        "games_per_s": round(played / elapsed),
+        "standings": standings(pairs),
+        "pairs": {f"{x} vs {o}": dict(zip(OUTCOMES, r)) for (x, o), r in pairs.items()},
+    }
+    print(f"{played} games in {elapsed:.1f}s ({played / elapsed:.0f}/s) on {args.processes} processes")
+    for name, row in result["standings"].items():
+        print(f"  {name:8s} score {row['score']:.3f}  won {row['won']}  drawn {row['drawn']}  lost {row['lost']}")
+    if args.analyze:
+        try:
+            result["analysis"] = analyze(positions, moves)
+        except ImportError:
+            parser.exit(1, "--analyze needs NumPy (pip install numpy)\n")
+        table = result["analysis"]["table"]
+        print(f"3^9 table: {table['positions']} positions, {table['reached']} reached, solved in {table['solve_ms']} ms")
+        for name, row in result["analysis"]["strategies"].items():
+            print(f"  {name:8s} accuracy {row['accuracy']}  mistakes/1000 {row['mistakes_per_1000']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Thread-safe UI update pump for the Tk peers
+# Tk widgets may only be touched from the thread running mainloop(). The network thread and the
+# scheduler thread post their work here instead, and the Tk loop drains the queue on a fixed
+# after() tick. Everything drained in one tick is drawn in a single redraw, because Tk repaints
+# only when the loop goes idle. Keyed posts replace each other, so a burst of clock refreshes
+# costs one update per tick.
+import traceback
+from collections import deque
+from threading import Lock
+import time
+import metrics
+
+TICK_MS = 20                            # How often the queue is drained (50 times a second)
+MAX_PER_TICK = 500                      # Upper bound of queued calls run per tick, keeps the GUI responsive
+
+
+# The UIPump belongs to one Tk window and runs posted callbacks on its thread
+class UIPump:
+    def __init__(self, window, tick_ms=TICK_MS, max_per_tick=MAX_PER_TICK):
+        self.window = window
+        self.tick_ms = tick_ms
+        self.max_per_tick = max_per_tick
+        self.queue = deque()            # (callback, args) in posting order; deque appends are thread-safe
+        self.latest = {}                # key -> (callback, args), only the newest post per key is kept
+        self.lock = Lock()              # Guards self.latest
+        self.tick_time = metrics.histogram("ui_tick_us", "time to run one tick of queued widget updates")
+        metrics.gauge("ui_queued", lambda: len(self.queue), "widget updates waiting for the next tick")
+        self.window.after(self.tick_ms, self.tick)
+
+    # Run callback(*args) on the Tk thread, in order with every other post()
+    def post(self, callback, *args):
+        self.queue.append((callback, args))
+
+    # Run callback(*args) on the Tk thread once per tick, however often it was posted in between
+    def post_latest(self, key, callback, *args):
+        with self.lock:
+            self.latest[key] = (callback, args)
+
+    # Drain the queue; runs on the Tk thread every tick_ms
+    def tick(self):
+        started = time.perf_counter_ns()
+        queue = self.queue
+        for _ in range(min(len(queue), self.max_per_tick)):
+            callback, args = queue.popleft()
+            self._run(callback, args)
+        with self.lock:
+            latest, self.latest = self.latest, {}
+        for callback, args in latest.values():
+            self._run(callback, args)
+        self.tick_time.since(started)
+        self.window.after(self.tick_ms, self.tick)
+
+    def _run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:               # One failing update must not stop the pump
+            traceback.print_exc()